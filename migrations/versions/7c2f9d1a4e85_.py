@@ -0,0 +1,32 @@
+"""hashed password reset tokens, reset lookup indexes
+
+Revision ID: 7c2f9d1a4e85
+Revises: 0e61b7d7b123
+Create Date: 2026-10-19 10:12:44.118203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c2f9d1a4e85'
+down_revision = '0e61b7d7b123'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Stored tokens are now SHA-256 digests; outstanding plaintext tokens can never
+    # match again, so retire them (the expiry sweeper deletes them afterwards)
+    op.execute("UPDATE password_resets SET is_used = true WHERE is_used = false;")
+
+    with op.batch_alter_table('password_resets', schema=None) as batch_op:
+        batch_op.create_index('ix_password_resets_user_id_is_used', ['user_id', 'is_used'], unique=False)
+        batch_op.create_index('ix_password_resets_expires_at', ['expires_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('password_resets', schema=None) as batch_op:
+        batch_op.drop_index('ix_password_resets_expires_at')
+        batch_op.drop_index('ix_password_resets_user_id_is_used')
@@ -0,0 +1,41 @@
+"""user_changes: append-only change log behind the /api/sso/changes feed
+
+Revision ID: a7d4c2e9b813
+Revises: f3c9e1d27a64
+Create Date: 2026-10-19 19:02:37.530148
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a7d4c2e9b813'
+down_revision = 'f3c9e1d27a64'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('user_changes',
+    sa.Column('id', sa.BigInteger().with_variant(sa.Integer(), 'sqlite'), nullable=False),
+    sa.Column('tenant_id', sa.String(length=50), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('op', sa.String(length=10), nullable=False),
+    sa.Column('changes', sa.JSON(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('user_changes', schema=None) as batch_op:
+        batch_op.create_index('ix_user_changes_tenant_id_id', ['tenant_id', 'id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_user_changes_tenant_id'), ['tenant_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_user_changes_created_at'), ['created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('user_changes', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_user_changes_created_at'))
+        batch_op.drop_index(batch_op.f('ix_user_changes_tenant_id'))
+        batch_op.drop_index('ix_user_changes_tenant_id_id')
+
+    op.drop_table('user_changes')
@@ -0,0 +1,33 @@
+"""job_locks table for the maintenance job scheduler
+
+Revision ID: b41e6a0c92d7
+Revises: 7c2f9d1a4e85
+Create Date: 2026-10-19 11:03:27.540918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b41e6a0c92d7'
+down_revision = '7c2f9d1a4e85'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('job_locks',
+        sa.Column('name', sa.String(length=100), nullable=False),
+        sa.Column('locked_by', sa.String(length=100), nullable=True),
+        sa.Column('locked_until', sa.DateTime(), nullable=True),
+        sa.Column('last_run_at', sa.DateTime(), nullable=True),
+        sa.Column('last_status', sa.String(length=20), nullable=True),
+        sa.Column('last_duration_ms', sa.Integer(), nullable=True),
+        sa.Column('last_rows', sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('job_locks')
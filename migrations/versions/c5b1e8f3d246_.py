@@ -0,0 +1,28 @@
+"""company_apps.webhook_url and webhook_events for identity event webhooks
+
+Revision ID: c5b1e8f3d246
+Revises: a7d4c2e9b813
+Create Date: 2026-10-19 20:14:08.661392
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c5b1e8f3d246'
+down_revision = 'a7d4c2e9b813'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('company_apps', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('webhook_url', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('webhook_events', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('company_apps', schema=None) as batch_op:
+        batch_op.drop_column('webhook_events')
+        batch_op.drop_column('webhook_url')
@@ -0,0 +1,28 @@
+"""company_apps.updated_at for conditional requests on the app catalog
+
+Revision ID: d8a35f27c6e1
+Revises: b41e6a0c92d7
+Create Date: 2026-10-19 11:48:09.273615
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8a35f27c6e1'
+down_revision = 'b41e6a0c92d7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('company_apps', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('updated_at', sa.DateTime(), nullable=True))
+
+    op.execute("UPDATE company_apps SET updated_at = created_at WHERE updated_at IS NULL;")
+
+
+def downgrade():
+    with op.batch_alter_table('company_apps', schema=None) as batch_op:
+        batch_op.drop_column('updated_at')
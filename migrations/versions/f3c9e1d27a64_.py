@@ -0,0 +1,41 @@
+"""tenant_id on users, company_apps and audit_logs; emails unique per tenant
+
+Revision ID: f3c9e1d27a64
+Revises: d8a35f27c6e1
+Create Date: 2026-10-19 12:41:52.118305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3c9e1d27a64'
+down_revision = 'd8a35f27c6e1'
+branch_labels = None
+depends_on = None
+
+TENANT_TABLES = ('users', 'company_apps', 'audit_logs')
+
+
+def upgrade():
+    # Existing rows belong to the default tenant
+    for table in TENANT_TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.add_column(sa.Column('tenant_id', sa.String(length=50), nullable=False, server_default='default'))
+            batch_op.create_index(f'ix_{table}_tenant_id', ['tenant_id'], unique=False)
+
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_index('ix_users_email')
+        batch_op.create_index('ix_users_tenant_id_email', ['tenant_id', 'email'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('users', schema=None) as batch_op:
+        batch_op.drop_index('ix_users_tenant_id_email')
+        batch_op.create_index('ix_users_email', ['email'], unique=True)
+
+    for table in reversed(TENANT_TABLES):
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(f'ix_{table}_tenant_id')
+            batch_op.drop_column('tenant_id')
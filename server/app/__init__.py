@@ -1,11 +1,27 @@
 # app/__init__.py
 import os
 from flask import Flask
+from werkzeug.middleware.proxy_fix import ProxyFix
 from dotenv import load_dotenv
 from config import config
-from app.extensions import db, jwt, migrate, cors, limiter
-from app.services.email_service import EmailService
-from app.services.auth_service import AuthService
+from app.extensions import db, jwt, cors, limiter
+from app.bootstrap import run_bootstrap
+from app.commands import register_commands
+from app.services.scheduler import init_scheduler
+from app.services.activity_service import init_activity_buffer
+from app.services.auth_service import init_password_resets
+from app.services.change_feed_service import init_change_feed
+from app.services.webhook_service import init_webhooks
+from app.services.audit_stream_service import init_audit_stream
+from app.services.totp_service import init_totp
+from app.utils.user_status import init_user_status
+from app.utils.metrics import init_metrics
+from app.utils.query_profiler import init_query_profiler
+from app.utils.http_cache import init_http_cache
+from app.utils.compression import init_compression
+from app.utils.tenancy import init_tenancy
+from app.utils.validation import init_validation
+from app.utils.passwords import init_passwords
 
 # Load environment variables from .env
 load_dotenv()
@@ -14,77 +30,56 @@ def create_app(config_name='default'):
     app = Flask(__name__, instance_relative_config=True)
     app.config.from_object(config[config_name])
     os.makedirs(app.instance_path, exist_ok=True)
+    # Client addresses (IP allowlists, rate limits, audit) from the trusted proxies only
+    if app.config['TRUSTED_PROXY_COUNT']:
+        trusted = app.config['TRUSTED_PROXY_COUNT']
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=trusted, x_proto=trusted)
 
     # Initialize extensions
     db.init_app(app)
     jwt.init_app(app)
-    migrate.init_app(app, db)
+    # Flask-Migrate imports alembic (~100 ms); only the `flask` CLI (`flask db ...`) needs it
+    if os.environ.get('FLASK_RUN_FROM_CLI') == 'true':
+        from flask_migrate import Migrate
+        Migrate(app, db)
     cors.init_app(app)
     limiter.init_app(app)
+    init_metrics(app)
+    init_query_profiler(app)
+    init_http_cache(app)
+    init_compression(app)
+    init_tenancy(app)
+    init_validation(app)
+    init_passwords(app)
+    init_totp(app)
 
     # Register blueprints
     from app.routes.auth import auth_bp
     from app.routes.admin import admin_bp
     from app.routes.user import user_bp
     from app.routes.sso import sso_bp
+    from app.routes.metrics import metrics_bp
+    from app.routes.scim import scim_bp
 
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(admin_bp, url_prefix='/api/admin')
     app.register_blueprint(user_bp, url_prefix='/api/user')
     app.register_blueprint(sso_bp, url_prefix='/api/sso')
+    app.register_blueprint(scim_bp, url_prefix='/scim/v2')
+    app.register_blueprint(metrics_bp)
 
-    # Create tables & super admin
-    with app.app_context():
-        from app.models import User
+    register_commands(app)
+    init_scheduler(app)
+    init_activity_buffer(app)
+    init_password_resets(app)
+    init_user_status(app)
+    init_change_feed(app)
+    init_webhooks(app)
+    init_audit_stream(app)
 
-        # Auto-create tables only in DEBUG
-        if app.config.get('DEBUG', False):
-            try:
-                db.create_all()
-                print("Tables created successfully (development mode).")
-            except Exception as e:
-                print(f"Skipping create_all due to migration state: {e}")
-
-        super_admin_email = app.config.get('SUPER_ADMIN_EMAIL')
-        if not super_admin_email:
-            print("⚠️ SUPER_ADMIN_EMAIL not set. Skipping super admin creation.")
-        else:
-            try:
-                # Attempt to access user table – skip if schema is outdated
-                super_admin = User.query.filter_by(email=super_admin_email).first()
-
-                if super_admin:
-                    print(f"Super admin already exists: {super_admin_email}")
-                else:
-                    temp_password = AuthService.generate_temporary_password()
-                    super_admin = User(
-                        email=super_admin_email,
-                        first_name='Super',
-                        last_name='Admin',
-                        role='super_admin',
-                        is_verified=True,
-                        first_login=False,
-                        onboarding_completed=True
-                    )
-                    super_admin.set_password(temp_password)
-                    db.session.add(super_admin)
-                    db.session.commit()
-                    print(f"Super admin created successfully: {super_admin_email}")
-                    print(f"Temporary password: {temp_password}")
-
-                    # Attempt email sending
-                    try:
-                        EmailService.send_temporary_password(
-                            email=super_admin_email,
-                            temporary_password=temp_password,
-                            first_name='Super'
-                        )
-                        print(f"Temporary password sent via email to: {super_admin_email}")
-                    except Exception as e:
-                        print(f"Failed to send temporary password email: {e}")
-
-            except Exception as e:
-                # Prevents crashes during migrations
-                print(f"Skipping super admin creation due to DB not ready: {e}")
+    # Per-worker bootstrap is for local development; deployments run
+    # `flask bootstrap` or let the gunicorn master do it once (gunicorn.conf.py)
+    if app.config.get('BOOTSTRAP_ON_STARTUP'):
+        run_bootstrap(app)
 
     return app
@@ -0,0 +1,385 @@
+# app/asgi.py
+import asyncio
+import base64
+import hmac
+import json
+import time
+import jwt
+from urllib.parse import parse_qs
+from asgiref.sync import sync_to_async
+from asgiref.wsgi import WsgiToAsgi, WsgiToAsgiInstance
+from flask_jwt_extended import decode_token
+from limits import parse_many
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from app.extensions import limiter, DEFAULT_LIMITS
+from app.models import User, CompanyApp, AuditLog
+from app.services.audit_stream_service import AuditStreamService, frame, replay_statement, serialize
+from app.services.change_feed_service import (
+    CursorExpired, changes_statement, check_cursor, cursor_needs_check, oldest_statement, page
+)
+from app.utils.ip_policy import client_address
+from app.utils.tenancy import TENANT_ID_RE
+
+ASYNC_DRIVERS = {
+    'sqlite': 'sqlite+aiosqlite',
+    'postgresql': 'postgresql+asyncpg'
+}
+
+
+class AuthError(Exception):
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class FallbackToFlask(Exception):
+    """Raised by a native handler for requests it cannot serve (tenants on another shard)."""
+
+
+class FlaskToAsgiInstance(WsgiToAsgiInstance):
+    # asgiref runs WSGI apps thread-sensitively, i.e. one at a time on a single shared
+    # thread. Flask is thread-safe, so let fallback requests use the default pool.
+    run_wsgi_app = sync_to_async(vars(WsgiToAsgiInstance)['run_wsgi_app'].func, thread_sensitive=False)
+
+
+class FlaskToAsgi(WsgiToAsgi):
+    async def __call__(self, scope, receive, send):
+        await FlaskToAsgiInstance(self.wsgi_application, self.duplicate_header_limit)(scope, receive, send)
+
+
+class AsgiApp:
+    """ASGI front for the Flask app.
+
+    The routes that hold a request open (change feed long-polls, the audit stream) are
+    served natively, waiting on the event loop instead of a thread. Every other route is
+    passed to Flask through asgiref's WSGI adapter (run in its thread pool), so caching,
+    compression and the rest apply exactly as under gunicorn; so are the native routes
+    for tenants mapped to a shard other than the default database.
+    """
+
+    def __init__(self, flask_app):
+        self.flask_app = flask_app
+        self.wsgi = FlaskToAsgi(flask_app)
+        self.engine = None
+        self.default_limits = parse_many(';'.join(DEFAULT_LIMITS))
+        # Routes with their own limit in Flask
+        self.route_limits = {
+            'user_changes': parse_many(flask_app.config['USER_CHANGES_RATE_LIMIT'])
+        }
+        self.routes = {
+            ('GET', '/api/sso/changes'): self.user_changes,
+            ('GET', '/api/admin/audit-logs/stream'): self.stream_audit_logs
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+
+        handler = None
+        if scope['type'] == 'http' and self.flask_app.config.get('ASGI_NATIVE_ROUTES', True):
+            handler = self.routes.get((scope['method'], scope['path']))
+        if handler is None:
+            return await self.wsgi(scope, receive, send)
+
+        request = AsgiRequest(scope, receive, self.flask_app.config['TRUSTED_PROXY_COUNT'])
+        try:
+            if self.is_rate_limited(request, handler.__name__):
+                status, body = 429, {'error': 'Rate limit exceeded'}
+            else:
+                status, body = await handler(request)
+        except FallbackToFlask:
+            return await self.wsgi(scope, receive, send)
+        except AuthError as e:
+            status, body = e.status, {'msg': e.message}
+        except Exception as e:
+            self.flask_app.logger.error(f'ASGI {handler.__name__} error: {str(e)}')
+            status, body = 500, {'error': 'Internal server error'}
+        if hasattr(body, '__aiter__'):
+            return await send_event_stream(send, body, cors='origin' in request.headers)
+        await send_json(send, status, body, cors='origin' in request.headers)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                if self.engine is not None:
+                    await self.engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    def get_engine(self):
+        # Created lazily so the engine binds to the server's running event loop
+        if self.engine is None:
+            url = make_url(self.flask_app.config['SQLALCHEMY_DATABASE_URI'])
+            driver = ASYNC_DRIVERS.get(url.get_backend_name())
+            if driver is None:
+                raise RuntimeError(f'No async driver configured for {url.get_backend_name()}')
+            options = {}
+            if url.get_backend_name() == 'postgresql':
+                options['pool_size'] = self.flask_app.config['ASGI_DB_POOL_SIZE']
+            self.engine = create_async_engine(url.set(drivername=driver), **options)
+        return self.engine
+
+    def session(self):
+        return AsyncSession(self.get_engine(), expire_on_commit=False)
+
+    def is_rate_limited(self, request, endpoint):
+        # Mirror the Flask default limits; these routes never reach Flask-Limiter
+        if not self.flask_app.config.get('RATELIMIT_ENABLED', True):
+            return False
+        return not all(
+            limiter.limiter.hit(item, 'asgi', endpoint, request.client_ip)
+            for item in self.route_limits.get(endpoint, self.default_limits)
+        )
+
+    def access_claims(self, request):
+        auth_header = request.headers.get('authorization', '')
+        if not auth_header.startswith('Bearer '):
+            raise AuthError('Missing Authorization Header', 401)
+        try:
+            with self.flask_app.app_context():
+                claims = decode_token(auth_header[len('Bearer '):])
+        except jwt.ExpiredSignatureError:
+            raise AuthError('Token has expired', 401)
+        except jwt.InvalidTokenError as e:
+            raise AuthError(str(e), 422)
+        if claims.get('type') != 'access':
+            raise AuthError('Only non-refresh tokens are allowed', 422)
+        return claims
+
+    def resolve_tenant(self, request, claims):
+        # Same rules as app/utils/tenancy.py: the token's tenant, which only a super admin
+        # may override with the tenant header
+        config = self.flask_app.config
+        requested = request.headers.get(config['TENANT_HEADER'].lower())
+        if requested is not None and not TENANT_ID_RE.match(requested):
+            raise AuthError('Invalid tenant id', 400)
+        tenant_id = claims.get('tenant') or config['DEFAULT_TENANT']
+        if requested and requested != tenant_id:
+            if claims.get('role') != 'super_admin':
+                raise AuthError('User claims verification failed', 400)
+            tenant_id = requested
+        if config['TENANT_SHARDS'].get(tenant_id) is not None:
+            raise FallbackToFlask()
+        return tenant_id
+
+    async def log_audit(self, session, request, tenant_id, user_id, action, resource=None, resource_id=None,
+                        details=None):
+        session.add(AuditLog(
+            tenant_id=tenant_id,
+            user_id=user_id,
+            action=action,
+            resource=resource,
+            resource_id=str(resource_id) if resource_id else None,
+            ip_address=request.client_ip,
+            user_agent=request.headers.get('user-agent'),
+            details=details
+        ))
+        try:
+            await session.commit()
+        except Exception as e:
+            await session.rollback()
+            self.flask_app.logger.error(f"[AUDIT] Failed to log action: {str(e)}")
+
+    async def user_changes(self, request):
+        # Long-polls wait on the event loop here instead of holding a worker thread
+        config = self.flask_app.config
+        tenant_id = request.headers.get(config['TENANT_HEADER'].lower()) or config['DEFAULT_TENANT']
+        if not TENANT_ID_RE.match(tenant_id):
+            return 400, {'error': 'Invalid tenant id'}
+        if config['TENANT_SHARDS'].get(tenant_id) is not None:
+            raise FallbackToFlask()
+
+        client_id, client_secret = request.basic_auth()
+        cursor = max(request.arg('cursor', 0, int), 0)
+        limit = min(max(request.arg('limit', 500, int), 1), config['USER_CHANGES_PAGE_SIZE'])
+        deadline = time.monotonic() + min(max(request.arg('wait', 0, float), 0), config['USER_CHANGES_MAX_WAIT'])
+
+        async with self.session() as session:
+            app = await session.scalar(select(CompanyApp).filter_by(client_id=client_id, tenant_id=tenant_id)) \
+                if client_id and client_secret else None
+            if not app or not app.is_active or not hmac.compare_digest(app.client_secret, client_secret):
+                return 401, {'error': 'Invalid client credentials'}
+
+            while True:
+                rows = (await session.execute(
+                    changes_statement(cursor, limit, config['USER_CHANGES_SETTLE_SECONDS'], tenant_id)
+                )).all()
+                try:
+                    if cursor_needs_check(rows, cursor):
+                        check_cursor(cursor, await session.scalar(oldest_statement(tenant_id)),
+                                     config['USER_CHANGES_RETENTION_DAYS'])
+                except CursorExpired:
+                    return 410, {'error': 'Cursor expired: changes after it were deleted, resynchronize'}
+                remaining = deadline - time.monotonic()
+                if rows or remaining <= 0:
+                    break
+                await session.rollback()
+                await asyncio.sleep(min(remaining, config['USER_CHANGES_POLL_INTERVAL']))
+
+        changes, next_cursor, has_more = page(rows, cursor, limit)
+        return 200, {'cursor': str(next_cursor), 'changes': changes, 'has_more': has_more}
+
+    async def stream_audit_logs(self, request):
+        # An idle stream is an asyncio.Event here, not a worker thread, so unlike the Flask
+        # route it has no time limit
+        config = self.flask_app.config
+        claims = self.access_claims(request)
+        tenant_id = self.resolve_tenant(request, claims)
+        # The admin's own row lives in the token's tenant (see role_required)
+        own_tenant = claims.get('tenant') or config['DEFAULT_TENANT']
+        if config['TENANT_SHARDS'].get(own_tenant) is not None:
+            raise FallbackToFlask()
+
+        filters = {
+            'user_id': request.arg('user_id', None, int),
+            'action': request.arg('action', '', str),
+            'status': request.arg('status', '', str)
+        }
+        try:
+            last_event_id = int(request.headers['last-event-id'])
+        except (KeyError, ValueError):
+            last_event_id = None
+
+        async with self.session() as session:
+            user = await session.scalar(select(User).filter_by(id=int(claims['sub']), tenant_id=own_tenant))
+            if not user or not user.is_active:
+                return 404, {'error': 'User not found or inactive'}
+            if user.role not in ('admin', 'super_admin'):
+                return 403, {'error': 'Insufficient permissions'}
+            # resolve_tenant went by the token's role claim: the header override needs the current one
+            if tenant_id != own_tenant and user.role != 'super_admin':
+                return 400, {'msg': 'User claims verification failed'}
+
+            loop = asyncio.get_running_loop()
+            wake = asyncio.Event()
+            subscription = AuditStreamService.subscribe(tenant_id, filters, lambda: loop.call_soon_threadsafe(wake.set))
+            backlog = []
+            limit = config['AUDIT_STREAM_REPLAY_LIMIT']
+            try:
+                if last_event_id is not None:
+                    logs = (await session.scalars(replay_statement(last_event_id, filters, limit, tenant_id))).all()
+                    backlog = [serialize(log) for log in logs]
+                    subscription.replayed.update(audit_event['id'] for audit_event in backlog)
+                else:
+                    await self.log_audit(session, request, tenant_id, user.id, 'view_audit_stream')
+            except Exception:
+                AuditStreamService.unsubscribe(subscription)
+                raise
+
+        return 200, self.audit_events(request, subscription, wake, backlog, len(backlog) >= limit)
+
+    async def audit_events(self, request, subscription, wake, backlog, more):
+        config = self.flask_app.config
+        disconnected = asyncio.ensure_future(request.disconnected(wake))
+        try:
+            yield f"retry: {config['AUDIT_STREAM_RETRY_MS']}\n\n" + ''.join(frame(audit_event) for audit_event in backlog)
+            # A full replay page: reconnecting fetches the next one
+            if more:
+                return
+            while True:
+                try:
+                    await asyncio.wait_for(wake.wait(), config['AUDIT_STREAM_HEARTBEAT'])
+                    woken = True
+                except asyncio.TimeoutError:
+                    woken = False
+                wake.clear()
+                if disconnected.done():
+                    return
+                audit_events = AuditStreamService.read(subscription)
+                if audit_events is None:
+                    return
+                if audit_events:
+                    yield ''.join(frame(audit_event) for audit_event in audit_events)
+                elif not woken:
+                    yield ': keep-alive\n\n'
+        finally:
+            disconnected.cancel()
+            AuditStreamService.unsubscribe(subscription)
+
+
+class AsgiRequest:
+    def __init__(self, scope, receive, trusted_proxies=0):
+        self.scope = scope
+        self.receive = receive
+        self.trusted_proxies = trusted_proxies
+        self.headers = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in scope['headers']}
+
+    def arg(self, name, default, type):
+        # Like request.args.get(name, default, type=type): malformed values fall back to the default
+        values = parse_qs(self.scope.get('query_string', b'').decode('latin-1')).get(name)
+        try:
+            return type(values[0]) if values else default
+        except ValueError:
+            return default
+
+    def basic_auth(self):
+        auth_header = self.headers.get('authorization', '')
+        if not auth_header.lower().startswith('basic '):
+            return None, None
+        try:
+            username, _, password = base64.b64decode(auth_header[6:]).decode('utf-8').partition(':')
+        except ValueError:
+            return None, None
+        return username, password
+
+    @property
+    def client_ip(self):
+        # Same rule as ProxyFix in front of the Flask app
+        client = self.scope.get('client')
+        return client_address(
+            self.headers.get('x-forwarded-for'), client[0] if client else None, self.trusted_proxies
+        )
+
+    async def disconnected(self, wake):
+        # Streaming handlers: wake them up when the client goes away
+        while (await self.receive())['type'] != 'http.disconnect':
+            pass
+        wake.set()
+
+
+async def send_json(send, status, body, cors=False):
+    payload = json.dumps(body).encode('utf-8')
+    headers = [
+        (b'content-type', b'application/json'),
+        (b'content-length', str(len(payload)).encode('latin-1'))
+    ]
+    if cors:
+        # Same as the app-wide flask_cors defaults (any origin)
+        headers.append((b'access-control-allow-origin', b'*'))
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': headers
+    })
+    await send({'type': 'http.response.body', 'body': payload})
+
+
+async def send_event_stream(send, chunks, cors=False):
+    headers = [
+        (b'content-type', b'text/event-stream'),
+        (b'cache-control', b'no-cache'),
+        (b'x-accel-buffering', b'no')
+    ]
+    if cors:
+        headers.append((b'access-control-allow-origin', b'*'))
+    await send({
+        'type': 'http.response.start',
+        'status': 200,
+        'headers': headers
+    })
+    try:
+        async for chunk in chunks:
+            await send({'type': 'http.response.body', 'body': chunk.encode('utf-8'), 'more_body': True})
+    finally:
+        await chunks.aclose()
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+def create_asgi_app(flask_app):
+    return AsgiApp(flask_app)
@@ -0,0 +1,77 @@
+# app/bootstrap.py
+from app.extensions import db
+
+
+def create_tables(app):
+    # Auto-create tables only in DEBUG
+    if not app.config.get('DEBUG', False):
+        return
+    try:
+        db.create_all()
+        # Tenant shards hold the same schema (job_locks only lives on the default database)
+        for bind_key in app.config.get('SQLALCHEMY_BINDS', {}):
+            db.metadata.create_all(db.engines[bind_key])
+        print("Tables created successfully (development mode).")
+    except Exception as e:
+        print(f"Skipping create_all due to migration state: {e}")
+
+
+def ensure_super_admin(app):
+    from app.models import User
+    from app.services.auth_service import AuthService
+    from app.services.email_service import EmailService
+
+    super_admin_email = app.config.get('SUPER_ADMIN_EMAIL')
+    if not super_admin_email:
+        print("⚠️ SUPER_ADMIN_EMAIL not set. Skipping super admin creation.")
+        return
+
+    try:
+        # Attempt to access user table – skip if schema is outdated
+        super_admin = User.query.filter_by(email=super_admin_email).first()
+
+        if super_admin:
+            print(f"Super admin already exists: {super_admin_email}")
+            return
+
+        temp_password = AuthService.generate_temporary_password()
+        super_admin = User(
+            email=super_admin_email,
+            first_name='Super',
+            last_name='Admin',
+            role='super_admin',
+            is_verified=True,
+            first_login=False,
+            onboarding_completed=True
+        )
+        super_admin.set_password(temp_password)
+        db.session.add(super_admin)
+        db.session.commit()
+        print(f"Super admin created successfully: {super_admin_email}")
+        print(f"Temporary password: {temp_password}")
+
+        # Attempt email sending
+        try:
+            EmailService.send_temporary_password(
+                email=super_admin_email,
+                temporary_password=temp_password,
+                first_name='Super'
+            )
+            print(f"Temporary password sent via email to: {super_admin_email}")
+        except Exception as e:
+            print(f"Failed to send temporary password email: {e}")
+
+    except Exception as e:
+        # Prevents crashes during migrations
+        print(f"Skipping super admin creation due to DB not ready: {e}")
+
+
+def run_bootstrap(app):
+    """One-time setup: dev tables and the super admin.
+
+    Run it once per deployment (``flask bootstrap`` or the gunicorn master hook),
+    not in every worker.
+    """
+    with app.app_context():
+        create_tables(app)
+        ensure_super_admin(app)
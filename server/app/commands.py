@@ -0,0 +1,113 @@
+# app/commands.py
+import os
+import click
+from app.bootstrap import run_bootstrap
+
+
+def register_commands(app):
+    @app.cli.command('bootstrap')
+    def bootstrap_command():
+        """Create dev tables and the super admin account."""
+        run_bootstrap(app)
+
+    @app.cli.group('jobs')
+    def jobs_group():
+        """Scheduled maintenance jobs."""
+
+    @jobs_group.command('list')
+    def list_jobs_command():
+        """Show every job with its interval and last run."""
+        from app.models import JobLock
+        from app.services.scheduler import JOBS
+        locks = {lock.name: lock for lock in JobLock.query.all()}
+        for name, job in JOBS.items():
+            lock = locks.get(name)
+            last_run = f"{lock.last_run_at:%Y-%m-%d %H:%M:%S} {lock.last_status} ({lock.last_rows} rows, {lock.last_duration_ms} ms)" \
+                if lock and lock.last_run_at else 'never'
+            print(f"{name:<24} every {job.interval(app):>6}s  last run: {last_run}")
+            print(f"    {job.description}")
+
+    @jobs_group.command('run')
+    @click.argument('name', required=False)
+    @click.option('--force', is_flag=True, help='Run even if the interval has not elapsed')
+    def run_jobs_command(name, force):
+        """Run one job by name, or every job that is due."""
+        from app.services.scheduler import JOBS, run_job
+        if name and name not in JOBS:
+            raise click.BadParameter(f"Unknown job {name}. Choose from: {', '.join(JOBS)}")
+        for job in ([JOBS[name]] if name else JOBS.values()):
+            if not name and job.interval(app) <= 0:
+                continue
+            result = run_job(app, job, force)
+            if result is None:
+                print(f"{job.name}: skipped (not due, or running elsewhere)")
+            else:
+                print(f"{job.name}: {result[0]}, {result[1]} rows")
+
+    @app.cli.group('passwords')
+    def passwords_group():
+        """Password policy data."""
+
+    @passwords_group.command('build-breached')
+    @click.argument('source', type=click.Path(exists=True, dir_okay=False, allow_dash=True))
+    @click.option('--output', help='Filter file to write (default: BREACHED_PASSWORDS_FILE)')
+    @click.option('--fp-rate', type=float, default=0.001, show_default=True,
+                  help='Share of fresh passwords wrongly reported as breached')
+    @click.option('--entries', type=int, help='Lines in SOURCE, if known (skips counting them)')
+    @click.option('--min-count', type=int, default=1, show_default=True,
+                  help='Skip hashes seen fewer times than this (HASH:count dumps)')
+    @click.option('--plaintext', is_flag=True, help='SOURCE lists passwords, not SHA-1 hashes')
+    @click.option('--workers', type=int, default=os.cpu_count() or 1, show_default='CPU count',
+                  help='Build processes (a file SOURCE only)')
+    def build_breached_command(source, output, fp_rate, entries, min_count, plaintext, workers):
+        """Build the breached password filter from a SHA-1 hash dump (HASH or HASH:count lines)."""
+        import sys
+        import time
+        from app.utils.breached_passwords import build_filter, build_filter_from_file, filter_size, read_digests
+        output = output or app.config.get('BREACHED_PASSWORDS_FILE')
+        if not output:
+            raise click.UsageError('Pass --output or set BREACHED_PASSWORDS_FILE')
+        if not 0 < fp_rate < 1:
+            raise click.BadParameter('must be between 0 and 1', param_hint='--fp-rate')
+        if entries is None:
+            if source == '-':
+                raise click.UsageError('Pass --entries when reading from stdin')
+            # One quick pass to size the filter
+            with open(source, 'rb') as f:
+                entries = sum(chunk.count(b'\n') for chunk in iter(lambda: f.read(1 << 24), b''))
+        blocks, k = filter_size(entries, fp_rate)
+        print(f"{entries} entries: {blocks * 64 / 2**20:.1f} MiB, {k} bits set per entry")
+
+        start = time.monotonic()
+        progress = lambda added: print(f"  {added} added ({time.monotonic() - start:.0f}s)")
+        if source == '-':
+            added, blocks, k = build_filter(
+                read_digests(sys.stdin.buffer, plaintext, min_count), entries, output, fp_rate, progress=progress
+            )
+        else:
+            added, blocks, k = build_filter_from_file(
+                source, entries, output, fp_rate, workers, plaintext, min_count, progress=progress
+            )
+        print(f"Wrote {output}: {added} entries in {time.monotonic() - start:.0f}s")
+
+    @passwords_group.command('calibrate')
+    @click.option('--scheme', type=click.Choice(['bcrypt', 'argon2id']), help='Default: PASSWORD_HASH_SCHEME')
+    @click.option('--target-ms', type=float, help='Time one hash may take (default: PASSWORD_HASH_TARGET_MS)')
+    def calibrate_command(scheme, target_ms):
+        """Measure the hashing cost that fits the target time on this machine."""
+        from app.utils.passwords import calibrate, current_policy
+        config = app.config
+        scheme = scheme or config['PASSWORD_HASH_SCHEME']
+        target_ms = target_ms or config['PASSWORD_HASH_TARGET_MS']
+        try:
+            settings, elapsed_ms = calibrate(
+                scheme, target_ms, config['PASSWORD_ARGON2_MEMORY_COST'], config['PASSWORD_ARGON2_PARALLELISM']
+            )
+        except RuntimeError as e:
+            raise click.ClickException(str(e))
+        policy = current_policy()
+        print(f"{scheme}: {elapsed_ms:.0f} ms per hash (target {target_ms:.0f} ms)")
+        print(f"PASSWORD_HASH_SCHEME={scheme}")
+        for name, value in settings.items():
+            current = f"  (now {policy[name]})" if policy['scheme'] == scheme and policy[name] != value else ''
+            print(f"PASSWORD_{name.upper()}={value}{current}")
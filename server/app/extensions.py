@@ -1,14 +1,20 @@
 # app/extensions.py
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import JWTManager
-from flask_migrate import Migrate
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
+from app.utils.metrics import record_rate_limit_breach
+from app.utils.tenancy import TenantSession
 
+DEFAULT_LIMITS = ["200 per day", "50 per hour"]
 
-db = SQLAlchemy()
+# Statements are routed to the current tenant's shard (SQLALCHEMY_BINDS / TENANT_SHARDS)
+db = SQLAlchemy(session_options={'class_': TenantSession})
 jwt = JWTManager()
-migrate = Migrate()
 cors = CORS()
-limiter = Limiter(key_func=get_remote_address, default_limits=["200 per day", "50 per hour"])
\ No newline at end of file
+limiter = Limiter(
+    key_func=get_remote_address,
+    default_limits=DEFAULT_LIMITS,
+    on_breach=record_rate_limit_breach
+)
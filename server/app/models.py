@@ -1,16 +1,26 @@
 # app/models.py
 from datetime import datetime, timedelta
-import bcrypt
 import secrets
 import uuid
 from sqlalchemy import event
 from app.extensions import db
+from app.utils.passwords import hash_password, verify_password
+from app.utils.ip_policy import policy_for
+from app.utils.tenancy import TenantMixin
 
-class User(db.Model):
+# password_hash of an account that has no password yet (SCIM-provisioned users until
+# their welcome email goes out); no password hash looks like this, so nothing matches it
+UNUSABLE_PASSWORD = '!'
+
+class User(TenantMixin, db.Model):
     __tablename__ = 'users'
+    __table_args__ = (
+        # Emails are unique per tenant, not across tenants
+        db.Index('ix_users_tenant_id_email', 'tenant_id', 'email', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
-    email = db.Column(db.String(120), unique=True, nullable=False, index=True)
+    email = db.Column(db.String(120), nullable=False)
     password_hash = db.Column(db.String(255), nullable=False)
     first_name = db.Column(db.String(50), nullable=False)
     last_name = db.Column(db.String(50), nullable=False)
@@ -36,38 +46,39 @@ class User(db.Model):
     onboarding = db.relationship('UserOnboarding', backref='user', uselist=False, lazy=True)
     
     def set_password(self, password):
-        self.password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        self.password_hash = hash_password(password)
         self.password_changed_at = datetime.utcnow()
         self.login_attempts = 0
         self.locked_until = None
     
+    def has_usable_password(self):
+        return self.password_hash != UNUSABLE_PASSWORD
+    
     def check_password(self, password):
         if self.locked_until and self.locked_until > datetime.utcnow():
             return False
+        if self.locked_until:
+            # Lockout expired (the clear_expired_locks job resets the row); start counting afresh
+            self.locked_until = None
+            self.login_attempts = 0
+        if not self.has_usable_password():
+            return False
             
-        is_valid = bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
+        is_valid = verify_password(password, self.password_hash)
         
         if not is_valid:
+            # Not buffered: every worker has to see the lockout. The caller commits
+            # it, together with the audit entry for the failed attempt
             self.login_attempts += 1
             if self.login_attempts >= 5:
                 self.locked_until = datetime.utcnow() + timedelta(minutes=30)
-            db.session.commit()
-        else:
-            if self.login_attempts > 0:
-                self.login_attempts = 0
-                self.locked_until = None
-                db.session.commit()
+        # On success the attempt reset (and any rehash) goes through ActivityService.password_verified
                 
         return is_valid
     
     def is_account_locked(self):
-        if self.locked_until and self.locked_until > datetime.utcnow():
-            return True
-        elif self.locked_until and self.locked_until <= datetime.utcnow():
-            self.locked_until = None
-            self.login_attempts = 0
-            db.session.commit()
-        return False
+        # Read-only: expired lockouts are cleared by the clear_expired_locks job
+        return bool(self.locked_until and self.locked_until > datetime.utcnow())
     
     def get_account_lock_time(self):
         if self.locked_until and self.locked_until > datetime.utcnow():
@@ -77,6 +88,7 @@ class User(db.Model):
     def to_dict(self):
         return {
             'id': self.id,
+            'tenant_id': self.tenant_id,
             'email': self.email,
             'first_name': self.first_name,
             'last_name': self.last_name,
@@ -92,9 +104,15 @@ class User(db.Model):
 
 class PasswordReset(db.Model):
     __tablename__ = 'password_resets'
+    __table_args__ = (
+        # Invalidating a user's outstanding tokens, and the expiry sweep
+        db.Index('ix_password_resets_user_id_is_used', 'user_id', 'is_used'),
+        db.Index('ix_password_resets_expires_at', 'expires_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    # SHA-256 hex digest of the emailed token, never the token itself
     token = db.Column(db.String(100), unique=True, nullable=False, index=True)
     expires_at = db.Column(db.DateTime, nullable=False)
     is_used = db.Column(db.Boolean, default=False)
@@ -109,7 +127,7 @@ class PasswordReset(db.Model):
         self.is_used = True
         db.session.commit()
 
-class AuditLog(db.Model):
+class AuditLog(TenantMixin, db.Model):
     __tablename__ = 'audit_logs'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -141,7 +159,7 @@ class AuditLog(db.Model):
             'method': self.method
         }
 
-class CompanyApp(db.Model):
+class CompanyApp(TenantMixin, db.Model):
     __tablename__ = 'company_apps'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -151,10 +169,14 @@ class CompanyApp(db.Model):
     sso_callback_url = db.Column(db.String(255), nullable=False)
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     client_id = db.Column(db.String(50), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
     client_secret = db.Column(db.String(100), unique=True, nullable=False, default=lambda: secrets.token_urlsafe(32))
     allowed_roles = db.Column(db.JSON, default=list)
     allowed_ips = db.Column(db.JSON, default=list)
+    # Identity event webhooks (app/services/webhook_service.py); no events listed means all
+    webhook_url = db.Column(db.String(255), nullable=True)
+    webhook_events = db.Column(db.JSON, default=list)
     
     def to_dict(self):
         return {
@@ -166,7 +188,9 @@ class CompanyApp(db.Model):
             'is_active': self.is_active,
             'created_at': self.created_at.isoformat(),
             'client_id': self.client_id,
-            'allowed_roles': self.allowed_roles
+            'allowed_roles': self.allowed_roles,
+            'webhook_url': self.webhook_url,
+            'webhook_events': self.webhook_events or []
         }
     
     def is_role_allowed(self, role):
@@ -175,9 +199,8 @@ class CompanyApp(db.Model):
         return role in self.allowed_roles
     
     def is_ip_allowed(self, ip_address):
-        if not self.allowed_ips:
-            return True
-        return ip_address in self.allowed_ips
+        # Addresses, CIDRs and ranges, compiled once per app version
+        return policy_for(self).allows(ip_address)
 
 class UserOnboarding(db.Model):
     __tablename__ = 'user_onboarding'
@@ -188,7 +211,14 @@ class UserOnboarding(db.Model):
     profile_data = db.Column(db.JSON)
     completed_at = db.Column(db.DateTime)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # updated_at doubles as the row version: every UPDATE sets a new one and only applies
+    # if the row still has the one it was loaded with (optimistic concurrency for saves)
+    __mapper_args__ = {
+        'version_id_col': updated_at,
+        'version_id_generator': lambda version: datetime.utcnow()
+    }
     
     def mark_completed(self):
         self.step_completed = 100
@@ -226,10 +256,47 @@ class TokenBlocklist(db.Model):
             'created_at': self.created_at.isoformat()
         }
 
+class UserChange(TenantMixin, db.Model):
+    """Append-only log of user changes that downstream apps follow (/api/sso/changes)."""
+    __tablename__ = 'user_changes'
+    __table_args__ = (
+        # Feed reads: a tenant's changes after a cursor
+        db.Index('ix_user_changes_tenant_id_id', 'tenant_id', 'id'),
+    )
+    
+    # The feed cursor: only ever increases
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False)
+    op = db.Column(db.String(10), nullable=False)
+    # Only the fields that changed (every field for 'create')
+    changes = db.Column(db.JSON, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'op': self.op,
+            'changes': self.changes,
+            'at': self.created_at.isoformat()
+        }
+
+class JobLock(db.Model):
+    """One row per scheduled job; claiming the row is what lets a single worker run it."""
+    __tablename__ = 'job_locks'
+    
+    name = db.Column(db.String(100), primary_key=True)
+    locked_by = db.Column(db.String(100))
+    locked_until = db.Column(db.DateTime)
+    last_run_at = db.Column(db.DateTime)
+    last_status = db.Column(db.String(20))
+    last_duration_ms = db.Column(db.Integer)
+    last_rows = db.Column(db.Integer)
+
 @event.listens_for(User, 'before_update')
 def update_updated_at(mapper, connection, target):
     target.updated_at = datetime.utcnow()
 
-@event.listens_for(UserOnboarding, 'before_update')
-def update_onboarding_updated_at(mapper, connection, target):
-    target.updated_at = datetime.utcnow()
\ No newline at end of file
+@event.listens_for(CompanyApp, 'before_update')
+def update_company_app_updated_at(mapper, connection, target):
+    target.updated_at = datetime.utcnow()
@@ -1,30 +1,65 @@
 # app/routes/admin.py
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, Response, request, jsonify, current_app, g
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models import db, User, AuditLog, CompanyApp
 from app.services.auth_service import AuthService
 from app.services.email_service import EmailService
 from app.services.audit_service import AuditService
+from app.services.webhook_service import WebhookService, EVENT_TYPES
+from app.services.audit_stream_service import AuditStreamService
+from app.schemas.admin_schemas import EnrollUserSchema, UpdateUserSchema, AppWebhookSchema
+from app.utils.query_profiler import query_budget
+from app.utils.http_cache import conditional, apps_version
+from app.utils.fields import requested_fields, pick
 from app.utils.decorators import role_required
+from app.utils.held_requests import hold, busy_response
+from app.utils.validation import validate_body
+from app.utils.tenancy import current_tenant, fan_out, is_cross_tenant_request
+import threading
+from math import ceil
 from sqlalchemy import desc
+from sqlalchemy.orm import load_only
 
 admin_bp = Blueprint('admin', __name__)
 
+# Selectable with ?fields= on the list endpoints
+USER_LIST_FIELDS = (
+    'id', 'tenant_id', 'email', 'first_name', 'last_name', 'role', 'is_active', 'mfa_enabled',
+    'onboarding_completed', 'first_login', 'last_login', 'created_at', 'is_verified'
+)
+AUDIT_LOG_FIELDS = {
+    'id': lambda log: log.id,
+    'tenant_id': lambda log: log.tenant_id,
+    'user_id': lambda log: log.user_id,
+    'action': lambda log: log.action,
+    'resource': lambda log: log.resource,
+    'resource_id': lambda log: log.resource_id,
+    'ip_address': lambda log: log.ip_address,
+    'timestamp': lambda log: log.timestamp.isoformat(),
+    'details': lambda log: log.details
+}
+
 @admin_bp.route('/dashboard', methods=['GET'])
+@query_budget(5)
 @jwt_required()
 @role_required('admin')
 def admin_dashboard():
     try:
-        # Get dashboard statistics
-        total_users = User.query.count()
-        active_users = User.query.filter_by(is_active=True).count()
-        recent_users = User.query.order_by(desc(User.created_at)).limit(5).all()
-        
-        stats = {
-            'total_users': total_users,
-            'active_users': active_users,
-            'recent_users': [user.to_dict() for user in recent_users]
-        }
+        if is_cross_tenant_request():
+            # Super admin without a tenant header: every shard, queried in parallel
+            results, unavailable = fan_out(_dashboard_stats)
+            recent_users = sorted(
+                (user for result in results for user in result['recent_users']),
+                key=lambda user: user['created_at'], reverse=True
+            )
+            stats = {
+                'total_users': sum(result['total_users'] for result in results),
+                'active_users': sum(result['active_users'] for result in results),
+                'recent_users': recent_users[:5],
+                'unavailable_shards': unavailable
+            }
+        else:
+            stats = _dashboard_stats()
         
         AuditService.log(get_jwt_identity(), 'view_admin_dashboard')
         
@@ -34,7 +69,38 @@ def admin_dashboard():
         current_app.logger.error(f'Admin dashboard error: {str(e)}')
         return jsonify({'error': 'Internal server error'}), 500
 
+def _dashboard_stats():
+    total_users = User.query.count()
+    active_users = User.query.filter_by(is_active=True).count()
+    recent_users = User.query.order_by(desc(User.created_at)).limit(5).all()
+    
+    return {
+        'total_users': total_users,
+        'active_users': active_users,
+        'recent_users': [user.to_dict() for user in recent_users]
+    }
+
+def _fanout_page(page, per_page):
+    """``(page, per_page)`` clamped for a cross-tenant list, or an error message when the page
+    is deeper than TENANT_FANOUT_MAX_ROWS: each shard would have to return every row before it."""
+    config = current_app.config
+    page = max(page, 1)
+    per_page = min(max(per_page, 1), config['TENANT_FANOUT_MAX_PAGE_SIZE'])
+    if page * per_page > config['TENANT_FANOUT_MAX_ROWS']:
+        return page, per_page, (
+            f"Cross-tenant lists stop at {config['TENANT_FANOUT_MAX_ROWS']} rows: narrow the filters or pick a tenant"
+        )
+    return page, per_page, None
+
+def _merge_pages(results, key, page, per_page):
+    """Merge per-shard ``(rows, total)`` results, each holding a shard's first ``page * per_page`` rows."""
+    rows = sorted((row for shard_rows, _ in results for row in shard_rows), key=key, reverse=True)
+    total = sum(shard_total for _, shard_total in results)
+    start = (page - 1) * per_page
+    return rows[start:start + per_page], total, ceil(total / per_page) if per_page else 0
+
 @admin_bp.route('/users', methods=['GET'])
+@query_budget(4)
 @jwt_required()
 @role_required('admin')
 def get_users():
@@ -42,53 +108,75 @@ def get_users():
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 10, type=int)
         search = request.args.get('search', '')
-        
-        query = User.query
-        
-        if search:
-            query = query.filter(
-                db.or_(
-                    User.email.ilike(f'%{search}%'),
-                    User.first_name.ilike(f'%{search}%'),
-                    User.last_name.ilike(f'%{search}%')
-                )
+        try:
+            fields = requested_fields(USER_LIST_FIELDS)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        if is_cross_tenant_request():
+            page, per_page, error = _fanout_page(page, per_page)
+            if error:
+                return jsonify({'error': error}), 400
+            
+            def shard_users():
+                query = _users_query(search)
+                top = query.order_by(desc(User.created_at)).limit(page * per_page).all()
+                return [user.to_dict() for user in top], query.order_by(None).count()
+            
+            results, unavailable = fan_out(shard_users)
+            items, total, pages = _merge_pages(results, lambda user: user['created_at'], page, per_page)
+            result = {
+                'users': [pick(user, fields) for user in items],
+                'total': total,
+                'pages': pages,
+                'current_page': page,
+                'unavailable_shards': unavailable
+            }
+        else:
+            users = _users_query(search).order_by(desc(User.created_at)).paginate(
+                page=page, per_page=per_page, error_out=False
             )
-        
-        users = query.order_by(desc(User.created_at)).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+            
+            # Serialize before logging: the audit commit expires the loaded rows
+            # and would reload every user one query at a time
+            result = {
+                'users': [pick(user.to_dict(), fields) for user in users.items],
+                'total': users.total,
+                'pages': users.pages,
+                'current_page': page
+            }
         
         AuditService.log(get_jwt_identity(), 'view_users_list')
         
-        return jsonify({
-            'users': [user.to_dict() for user in users.items],
-            'total': users.total,
-            'pages': users.pages,
-            'current_page': page
-        }), 200
+        return jsonify(result), 200
         
     except Exception as e:
         current_app.logger.error(f'Get users error: {str(e)}')
         return jsonify({'error': 'Internal server error'}), 500
 
+def _users_query(search):
+    query = User.query
+    if search:
+        query = query.filter(
+            db.or_(
+                User.email.ilike(f'%{search}%'),
+                User.first_name.ilike(f'%{search}%'),
+                User.last_name.ilike(f'%{search}%')
+            )
+        )
+    return query
+
 @admin_bp.route('/users/enroll', methods=['POST'])
 @jwt_required()
 @role_required('admin')
+@validate_body(EnrollUserSchema)
 def enroll_user():
     try:
-        data = request.get_json()
-        email = data.get('email')
-        first_name = data.get('first_name')
-        last_name = data.get('last_name')
-        role = data.get('role', 'user')
-        
-        if not all([email, first_name, last_name]):
-            return jsonify({'error': 'Email, first name, and last name are required'}), 400
-        
-        if role not in ['user', 'admin']:
-            return jsonify({'error': 'Invalid role'}), 400
-        
-        email = email.strip().lower()
+        data = g.body
+        email = data['email'].strip().lower()
+        first_name = data['first_name']
+        last_name = data['last_name']
+        role = data['role']
         
         # Check if user already exists
         existing_user = User.query.filter_by(email=email).first()
@@ -135,9 +223,10 @@ def enroll_user():
 @admin_bp.route('/users/<int:user_id>', methods=['PUT'])
 @jwt_required()
 @role_required('admin')
+@validate_body(UpdateUserSchema)
 def update_user(user_id):
     try:
-        data = request.get_json()
+        data = g.body
         user = User.query.get(user_id)
         
         if not user:
@@ -148,7 +237,7 @@ def update_user(user_id):
             user.first_name = data['first_name']
         if 'last_name' in data:
             user.last_name = data['last_name']
-        if 'role' in data and data['role'] in ['user', 'admin']:
+        if 'role' in data:
             user.role = data['role']
         if 'is_active' in data:
             user.is_active = data['is_active']
@@ -174,6 +263,7 @@ def update_user(user_id):
         return jsonify({'error': 'Internal server error'}), 500
 
 @admin_bp.route('/audit-logs', methods=['GET'])
+@query_budget(4)
 @jwt_required()
 @role_required('admin')
 def get_audit_logs():
@@ -182,42 +272,116 @@ def get_audit_logs():
         per_page = request.args.get('per_page', 20, type=int)
         user_id = request.args.get('user_id', type=int)
         action = request.args.get('action', '')
-        
-        query = AuditLog.query
-        
-        if user_id:
-            query = query.filter_by(user_id=user_id)
-        if action:
-            query = query.filter(AuditLog.action.ilike(f'%{action}%'))
-        
-        logs = query.order_by(desc(AuditLog.timestamp)).paginate(
-            page=page, per_page=per_page, error_out=False
-        )
+        try:
+            fields = requested_fields(AUDIT_LOG_FIELDS)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        def serialize(log):
+            return {field: AUDIT_LOG_FIELDS[field](log) for field in fields or AUDIT_LOG_FIELDS}
+        
+        if is_cross_tenant_request():
+            page, per_page, error = _fanout_page(page, per_page)
+            if error:
+                return jsonify({'error': error}), 400
+            
+            def shard_logs():
+                # The timestamp is always loaded: the merge sorts on it
+                query = _audit_logs_query(fields and fields + ['timestamp'], user_id, action)
+                top = query.order_by(desc(AuditLog.timestamp)).limit(page * per_page).all()
+                return [(log.timestamp, serialize(log)) for log in top], query.order_by(None).count()
+            
+            results, unavailable = fan_out(shard_logs)
+            items, total, pages = _merge_pages(results, lambda row: row[0], page, per_page)
+            result = {
+                'logs': [log for _, log in items],
+                'total': total,
+                'pages': pages,
+                'current_page': page,
+                'unavailable_shards': unavailable
+            }
+        else:
+            logs = _audit_logs_query(fields, user_id, action).order_by(desc(AuditLog.timestamp)).paginate(
+                page=page, per_page=per_page, error_out=False
+            )
+            
+            result = {
+                'logs': [serialize(log) for log in logs.items],
+                'total': logs.total,
+                'pages': logs.pages,
+                'current_page': page
+            }
         
         AuditService.log(get_jwt_identity(), 'view_audit_logs')
         
-        return jsonify({
-            'logs': [{
-                'id': log.id,
-                'user_id': log.user_id,
-                'action': log.action,
-                'resource': log.resource,
-                'resource_id': log.resource_id,
-                'ip_address': log.ip_address,
-                'timestamp': log.timestamp.isoformat(),
-                'details': log.details
-            } for log in logs.items],
-            'total': logs.total,
-            'pages': logs.pages,
-            'current_page': page
-        }), 200
+        return jsonify(result), 200
         
     except Exception as e:
         current_app.logger.error(f'Get audit logs error: {str(e)}')
         return jsonify({'error': 'Internal server error'}), 500
 
+def _audit_logs_query(fields, user_id, action):
+    query = AuditLog.query
+    if fields:
+        # Leave unselected columns (the details text in particular) in the database
+        query = query.options(load_only(*[getattr(AuditLog, field) for field in fields]))
+    
+    if user_id:
+        query = query.filter_by(user_id=user_id)
+    if action:
+        query = query.filter(AuditLog.action.ilike(f'%{action}%'))
+    return query
+
+@admin_bp.route('/audit-logs/stream', methods=['GET'])
+@jwt_required()
+@role_required('admin')
+def stream_audit_logs():
+    # Held for the whole stream: given back when the response is closed
+    release = hold()
+    if release is None:
+        return busy_response()
+    try:
+        filters = {
+            'user_id': request.args.get('user_id', type=int),
+            'action': request.args.get('action', ''),
+            'status': request.args.get('status', '')
+        }
+        last_event_id = request.headers.get('Last-Event-ID', type=int)
+
+        # Subscribe before reading the backlog: nothing committed in between is missed
+        wake = threading.Event()
+        subscription = AuditStreamService.subscribe(current_tenant(), filters, wake.set)
+        backlog = []
+        limit = current_app.config['AUDIT_STREAM_REPLAY_LIMIT']
+        try:
+            if last_event_id is not None:
+                backlog = AuditStreamService.replay(subscription, last_event_id, limit)
+            else:
+                # Once per connection, not once per resume
+                AuditService.log(get_jwt_identity(), 'view_audit_stream')
+        except Exception:
+            AuditStreamService.unsubscribe(subscription)
+            raise
+
+        response = Response(
+            AuditStreamService.stream(subscription, wake, backlog, more=len(backlog) >= limit),
+            mimetype='text/event-stream'
+        )
+        response.headers['Cache-Control'] = 'no-cache'
+        # Tell nginx not to buffer the stream
+        response.headers['X-Accel-Buffering'] = 'no'
+        response.call_on_close(release)
+        return response
+
+    except Exception as e:
+        release()
+        current_app.logger.error(f'Audit stream error: {str(e)}')
+        return jsonify({'error': 'Internal server error'}), 500
+
 @admin_bp.route('/apps', methods=['GET'])
+@query_budget(2)
 @jwt_required()
+@conditional(apps_version, cache_control='private, max-age=60')
 def get_company_apps():
     try:
         # Fetch only active apps
@@ -238,3 +402,61 @@ def get_company_apps():
     except Exception as e:
         current_app.logger.error(f'Get company apps error: {str(e)}')
         return jsonify({'error': 'Internal server error'}), 500
+
+@admin_bp.route('/apps/<int:app_id>/webhook', methods=['GET'])
+@jwt_required()
+@role_required('admin')
+def get_app_webhook(app_id):
+    try:
+        company_app = CompanyApp.query.get(app_id)
+
+        if not company_app:
+            return jsonify({'error': 'App not found'}), 404
+
+        return jsonify({
+            'webhook_url': company_app.webhook_url,
+            'webhook_events': company_app.webhook_events or [],
+            'available_events': list(EVENT_TYPES)
+        }), 200
+
+    except Exception as e:
+        current_app.logger.error(f'Get webhook error: {str(e)}')
+        return jsonify({'error': 'Internal server error'}), 500
+
+@admin_bp.route('/apps/<int:app_id>/webhook', methods=['PUT'])
+@jwt_required()
+@role_required('admin')
+@validate_body(AppWebhookSchema)
+def update_app_webhook(app_id):
+    try:
+        data = g.body
+        company_app = CompanyApp.query.get(app_id)
+
+        if not company_app:
+            return jsonify({'error': 'App not found'}), 404
+
+        url = data['webhook_url']
+        events = data['webhook_events'] or []
+
+        company_app.webhook_url = url
+        company_app.webhook_events = sorted(set(events))
+        AuditService.log(
+            get_jwt_identity(),
+            'app_webhook_updated',
+            'company_app',
+            company_app.id,
+            f"Webhook of {company_app.name} set to {url or 'none'}",
+            commit=False
+        )
+        db.session.commit()
+        WebhookService.invalidate(company_app.tenant_id)
+
+        return jsonify({
+            'message': 'Webhook updated successfully',
+            'app': company_app.to_dict()
+        }), 200
+
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Webhook update error: {str(e)}')
+        return jsonify({'error': 'Internal server error'}), 500
@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, g
 from flask_jwt_extended import (
     create_access_token, create_refresh_token, jwt_required,
     get_jwt_identity, unset_jwt_cookies, get_jwt
@@ -8,6 +8,7 @@ from app.services.auth_service import AuthService
 from app.services.mfa_service import MFAService
 from app.services.email_service import EmailService
 from app.services.audit_service import AuditService
+from app.services.activity_service import ActivityService
 from app.schemas.auth_schemas import (
     LoginSchema, MFASchema, ChangePasswordSchema, 
     ForgotPasswordSchema, ResetPasswordSchema,
@@ -18,6 +19,8 @@ from app.utils.decorators import (
     rate_limit_by_token, rate_limit_by_ip, mfa_required, handle_auth_errors
 )
 from app.utils.validators import validate_password_strength
+from app.utils.validation import validate_body
+from app.utils.user_status import user_status
 from datetime import datetime, timedelta
 from app.extensions import limiter
 
@@ -26,9 +29,9 @@ auth_bp = Blueprint('auth', __name__)
 @auth_bp.route('/login', methods=['POST'])
 @rate_limit_by_email(5)  # 5 attempts per minute per email
 @handle_auth_errors
+@validate_body(LoginSchema)
 def login():
-    schema = LoginSchema()
-    data = schema.load(request.get_json(silent=True) or {})
+    data = g.body
     
     email = data['email'].strip().lower()
     password = data['password']
@@ -36,12 +39,18 @@ def login():
     user = User.query.filter_by(email=email, is_active=True).first()
 
     if not user or not user.check_password(password):
-        AuditService.log(
-            None,
-            'login_failed',
-            details=f"Failed login attempt for {email}"
-        )
+        if user:
+            # One commit for the attempt counter and its audit entry
+            AuditService.log(user.id, 'login_failed', details=f"Failed login attempt for {email}", commit=False)
+            db.session.commit()
+        else:
+            AuditService.log(
+                None,
+                'login_failed',
+                details=f"Failed login attempt for {email}"
+            )
         return jsonify({'error': 'Invalid credentials'}), 401
+    ActivityService.password_verified(user, password)
 
     # Check if account is locked
     if user.is_account_locked():
@@ -106,8 +115,8 @@ def login():
         additional_claims=additional_claims
     )
 
-    user.last_login = datetime.utcnow()
-    db.session.commit()
+    # Buffered: no users row write (or updated_at bump) per login
+    ActivityService.logged_in(user)
 
     AuditService.log(user.id, 'login_success')
 
@@ -122,6 +131,7 @@ def login():
 @jwt_required()
 @rate_limit_by_user(10)  # 10 attempts per minute per user
 @handle_auth_errors
+@validate_body(MFASchema)
 def verify_mfa():
     claims = get_jwt()
     current_user_id = get_jwt_identity()
@@ -135,15 +145,14 @@ def verify_mfa():
             "details": "This token is not an MFA session token. Please login again."
         }), 400
 
-    schema = MFASchema()
-    data = schema.load(request.get_json(silent=True) or {})
+    data = g.body
     mfa_code = data['mfa_code']
 
     user = User.query.get(current_user_id)
     if not user or not user.mfa_secret:
         return jsonify({"error": "MFA not configured"}), 400
 
-    if not MFAService.verify_totp(user.mfa_secret, mfa_code):
+    if not MFAService.verify_totp(user.mfa_secret, mfa_code, user.id):
         AuditService.log(user.id, "mfa_verification_failed")
         return jsonify({"error": "Invalid MFA code"}), 401
 
@@ -157,8 +166,8 @@ def verify_mfa():
         additional_claims=additional_claims
     )
 
-    user.last_login = datetime.utcnow()
-    db.session.commit()
+    # Buffered: no users row write (or updated_at bump) per login
+    ActivityService.logged_in(user)
 
     AuditService.log(user.id, "mfa_verification_success")
 
@@ -173,9 +182,9 @@ def verify_mfa():
 @jwt_required()
 @rate_limit_by_user(10)  # 10 attempts per minute per user
 @handle_auth_errors
+@validate_body(SetupMFASchema)
 def setup_mfa():
-    schema = SetupMFASchema()
-    schema.load(request.get_json(silent=True) or {})
+    data = g.body
     
     current_user_id = get_jwt_identity()
     user = User.query.get(current_user_id)
@@ -186,32 +195,36 @@ def setup_mfa():
     if user.mfa_enabled:
         return jsonify({"error": "MFA already enabled"}), 400
 
-    mfa_secret = MFAService.generate_mfa_secret()
+    # A retried setup keeps the pending secret, so the QR code comes from the render cache
+    mfa_secret = user.mfa_secret or MFAService.generate_mfa_secret()
     provisioning_uri = MFAService.generate_provisioning_uri(
         user.email,
         mfa_secret,
         current_app.config["MFA_ISSUER"]
     )
-    qr_code = MFAService.generate_qr_code(provisioning_uri)
+    qr_format = data['format'] or current_app.config["MFA_QR_FORMAT"]
+    qr_code = MFAService.generate_qr_code(provisioning_uri, qr_format)
 
-    user.mfa_secret = mfa_secret
-    db.session.commit()
+    if user.mfa_secret != mfa_secret:
+        user.mfa_secret = mfa_secret
+        db.session.commit()
 
     AuditService.log(user.id, "mfa_setup_initiated")
 
     return jsonify({
         "mfa_secret": mfa_secret,
         "provisioning_uri": provisioning_uri,
-        "qr_code": qr_code
+        "qr_code": qr_code,
+        "qr_code_format": qr_format
     }), 200
 
 @auth_bp.route('/verify-mfa-setup', methods=['POST'])
 @jwt_required()
 @rate_limit_by_user(10)  # 10 attempts per minute per user
 @handle_auth_errors
+@validate_body(VerifyMFASetupSchema)
 def verify_mfa_setup():
-    schema = VerifyMFASetupSchema()
-    data = schema.load(request.get_json(silent=True) or {})
+    data = g.body
     mfa_code = data['mfa_code']
 
     current_user_id = get_jwt_identity()
@@ -220,7 +233,7 @@ def verify_mfa_setup():
     if not user or not user.mfa_secret:
         return jsonify({"error": "MFA setup not initiated"}), 400
 
-    if not MFAService.verify_totp(user.mfa_secret, mfa_code):
+    if not MFAService.verify_totp(user.mfa_secret, mfa_code, user.id):
         user.mfa_secret = None
         db.session.commit()
         AuditService.log(user.id, "mfa_setup_failed")
@@ -241,9 +254,9 @@ def verify_mfa_setup():
 @jwt_required()
 @rate_limit_by_user(5)  # 5 attempts per minute per user
 @handle_auth_errors
+@validate_body(ChangePasswordSchema)
 def change_password():
-    schema = ChangePasswordSchema()
-    data = schema.load(request.get_json(silent=True) or {})
+    data = g.body
     current_password = data['current_password']
     new_password = data['new_password']
     
@@ -258,23 +271,23 @@ def change_password():
         return jsonify({'error': 'User not found'}), 404
     
     if not user.check_password(current_password):
-        AuditService.log(user.id, 'password_change_failed', details='Incorrect current password')
+        AuditService.log(user.id, 'password_change_failed', details='Incorrect current password', commit=False)
+        db.session.commit()
         return jsonify({'error': 'Current password is incorrect'}), 401
     
     user.set_password(new_password)
     user.first_login = False
+    AuditService.log(user.id, 'password_changed', commit=False)
     db.session.commit()
     
-    AuditService.log(user.id, 'password_changed')
-    
     return jsonify({'message': 'Password changed successfully'}), 200
 
 @auth_bp.route('/forgot-password', methods=['POST'])
 @rate_limit_by_email(3)  # 3 attempts per hour per email
 @handle_auth_errors
+@validate_body(ForgotPasswordSchema)
 def forgot_password():
-    schema = ForgotPasswordSchema()
-    data = schema.load(request.get_json(silent=True) or {})
+    data = g.body
     email = data['email'].strip().lower()
     
     user = User.query.filter_by(email=email, is_active=True).first()
@@ -291,9 +304,9 @@ def forgot_password():
 @auth_bp.route('/reset-password', methods=['POST'])
 @rate_limit_by_token(5)  # 5 attempts per hour per token
 @handle_auth_errors
+@validate_body(ResetPasswordSchema)
 def reset_password():
-    schema = ResetPasswordSchema()
-    data = schema.load(request.get_json(silent=True) or {})
+    data = g.body
     token = data['token']
     new_password = data['new_password']
     
@@ -301,19 +314,20 @@ def reset_password():
     if not is_strong:
         return jsonify({'error': message}), 400
     
-    user_id = AuthService.verify_password_reset_token(token)
+    # Token consumption, the new password and the audit entry commit together
+    user_id = AuthService.verify_password_reset_token(token, commit=False)
     if not user_id:
         return jsonify({'error': 'Invalid or expired token'}), 400
     
     user = User.query.get(user_id)
     if not user:
+        db.session.rollback()
         return jsonify({'error': 'User not found'}), 404
     
     user.set_password(new_password)
+    AuditService.log(user.id, 'password_reset_completed', commit=False)
     db.session.commit()
     
-    AuditService.log(user.id, 'password_reset_completed')
-    
     return jsonify({'message': 'Password reset successfully'}), 200
 
 @auth_bp.route('/refresh', methods=['POST'])
@@ -322,15 +336,15 @@ def reset_password():
 @handle_auth_errors
 def refresh_token():
     current_user_id = get_jwt_identity()
-    user = User.query.get(current_user_id)
+    status = user_status(current_user_id)
     
-    if not user or not user.is_active:
+    if not status or not status.is_active:
         return jsonify({'error': 'User not found or inactive'}), 404
     
-    additional_claims = {"role": user.role}
+    additional_claims = {"role": status.role}
     new_access_token = create_access_token(identity=str(current_user_id), additional_claims=additional_claims)
     
-    AuditService.log(user.id, 'token_refreshed')
+    AuditService.log(int(current_user_id), 'token_refreshed')
     
     return jsonify({
         'access_token': new_access_token
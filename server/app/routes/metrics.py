@@ -0,0 +1,42 @@
+# app/routes/metrics.py
+# Prometheus scrapes come from the addresses in METRICS_ALLOWED_IPS (loopback by default),
+# or from anywhere with "Authorization: Bearer <METRICS_TOKEN>" when a token is set.
+import hmac
+from functools import lru_cache
+from flask import Blueprint, Response, current_app, abort, jsonify, request
+from app.extensions import limiter
+from app.utils.ip_policy import IPPolicy, get_client_ip
+from app.utils.metrics import metrics_payload
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+@lru_cache(maxsize=8)
+def _allowed_ips(entries):
+    entries = [entry for entry in entries.split(',') if entry.strip()]
+    # IPPolicy allows everyone for an empty list; here it means no one
+    return IPPolicy(entries) if entries else None
+
+
+def _authorized():
+    config = current_app.config
+    token = config['METRICS_TOKEN']
+    if token:
+        scheme, _, credentials = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() == 'bearer' and hmac.compare_digest(credentials.strip().encode(), token.encode()):
+            return True
+    policy = _allowed_ips(config['METRICS_ALLOWED_IPS'])
+    return policy is not None and policy.allows(get_client_ip())
+
+@metrics_bp.route('/metrics', methods=['GET'])
+@limiter.exempt
+def metrics():
+    if not current_app.config.get('METRICS_ENABLED', True):
+        abort(404)
+    if not _authorized():
+        if current_app.config['METRICS_TOKEN']:
+            return jsonify({'error': 'Unauthorized'}), 401, {'WWW-Authenticate': 'Bearer'}
+        return jsonify({'error': 'Forbidden'}), 403
+
+    payload, content_type = metrics_payload()
+    return Response(payload, mimetype=content_type)
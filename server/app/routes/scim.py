@@ -0,0 +1,191 @@
+# app/routes/scim.py
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from werkzeug.exceptions import RequestEntityTooLarge
+from app.models import db, User
+from app.services.audit_service import AuditService
+from app.services.provisioning_service import (
+    ProvisioningService, ScimError, SCHEMA_LIST, SCHEMA_BULK_RESPONSE
+)
+from app.utils.decorators import role_required
+from app.extensions import limiter
+from app.utils.validation import body_limit
+
+scim_bp = Blueprint('scim', __name__)
+
+# An HR sync is a burst of requests from one address: its own limit instead of the defaults
+limiter.limit(lambda: current_app.config['SCIM_RATE_LIMIT'])(scim_bp)
+# Bulk payloads are far larger than the MAX_CONTENT_LENGTH other routes get
+body_limit(scim_bp, 'SCIM_BULK_MAX_PAYLOAD')
+
+def scim_response(body, status=200):
+    response = jsonify(body)
+    response.status_code = status
+    response.mimetype = 'application/scim+json'
+    return response
+
+def scim_error(error):
+    return scim_response(error.to_dict(), error.status)
+
+def scim_body():
+    # SCIM clients send application/scim+json
+    try:
+        data = request.get_json(force=True, silent=True)
+    except RequestEntityTooLarge:
+        max_payload = request.max_content_length
+        raise ScimError(413, f'The maximum payload size is {max_payload} bytes', 'tooLarge')
+    if not isinstance(data, dict):
+        raise ScimError(400, 'Request body must be a JSON object', 'invalidSyntax')
+    return data
+
+def get_scim_user(user_id):
+    user = User.query.get(user_id)
+    if not user:
+        raise ScimError(404, f'Resource {user_id} not found')
+    return user
+
+def internal_error(context, e):
+    db.session.rollback()
+    current_app.logger.error(f'SCIM {context} error: {str(e)}')
+    return scim_error(ScimError(500, 'Internal server error'))
+
+@scim_bp.route('/ServiceProviderConfig', methods=['GET'])
+@jwt_required()
+@role_required('admin')
+def service_provider_config():
+    return scim_response({
+        'schemas': ['urn:ietf:params:scim:schemas:core:2.0:ServiceProviderConfig'],
+        'patch': {'supported': True},
+        'bulk': {
+            'supported': True,
+            'maxOperations': current_app.config['SCIM_BULK_MAX_OPERATIONS'],
+            'maxPayloadSize': current_app.config['SCIM_BULK_MAX_PAYLOAD']
+        },
+        'filter': {'supported': True, 'maxResults': current_app.config['SCIM_MAX_RESULTS']},
+        'changePassword': {'supported': False},
+        'sort': {'supported': False},
+        'etag': {'supported': False},
+        'authenticationSchemes': [{
+            'type': 'oauthbearertoken',
+            'name': 'OAuth Bearer Token',
+            'description': 'Access token of a hub admin'
+        }]
+    })
+
+@scim_bp.route('/Users', methods=['GET'])
+@jwt_required()
+@role_required('admin')
+def list_users():
+    try:
+        start_index = max(request.args.get('startIndex', 1, type=int), 1)
+        count = min(max(request.args.get('count', current_app.config['SCIM_MAX_RESULTS'], type=int), 0),
+                    current_app.config['SCIM_MAX_RESULTS'])
+        total, users = ProvisioningService.find_users(request.args.get('filter'), start_index, count)
+
+        return scim_response({
+            'schemas': [SCHEMA_LIST],
+            'totalResults': total,
+            'startIndex': start_index,
+            'itemsPerPage': len(users),
+            'Resources': [ProvisioningService.to_scim(user) for user in users]
+        })
+
+    except ScimError as e:
+        return scim_error(e)
+    except Exception as e:
+        return internal_error('list users', e)
+
+@scim_bp.route('/Users/<int:user_id>', methods=['GET'])
+@jwt_required()
+@role_required('admin')
+def get_user(user_id):
+    try:
+        return scim_response(ProvisioningService.to_scim(get_scim_user(user_id)))
+    except ScimError as e:
+        return scim_error(e)
+    except Exception as e:
+        return internal_error('get user', e)
+
+@scim_bp.route('/Users', methods=['POST'])
+@jwt_required()
+@role_required('admin')
+def create_user():
+    try:
+        user = ProvisioningService.create(scim_body())
+        db.session.flush()
+        AuditService.log(get_jwt_identity(), 'scim_user_created', 'user', user.id, f"SCIM POST {user.email}",
+                         commit=False)
+        db.session.commit()
+
+        ProvisioningService.send_invitations([user.id])
+
+        body = ProvisioningService.to_scim(user)
+        response = scim_response(body, 201)
+        response.headers['Location'] = body['meta']['location']
+        return response
+
+    except ScimError as e:
+        db.session.rollback()
+        return scim_error(e)
+    except Exception as e:
+        return internal_error('create user', e)
+
+@scim_bp.route('/Users/<int:user_id>', methods=['PUT', 'PATCH'])
+@jwt_required()
+@role_required('admin')
+def update_user(user_id):
+    try:
+        user = get_scim_user(user_id)
+        if request.method == 'PUT':
+            ProvisioningService.replace(user, scim_body())
+        else:
+            ProvisioningService.patch(user, scim_body())
+
+        AuditService.log(get_jwt_identity(), 'scim_user_updated', 'user', user.id,
+                         f"SCIM {request.method} {user.email}", commit=False)
+        db.session.commit()
+
+        return scim_response(ProvisioningService.to_scim(user))
+
+    except ScimError as e:
+        db.session.rollback()
+        return scim_error(e)
+    except Exception as e:
+        return internal_error('update user', e)
+
+@scim_bp.route('/Users/<int:user_id>', methods=['DELETE'])
+@jwt_required()
+@role_required('admin')
+def delete_user(user_id):
+    try:
+        user = get_scim_user(user_id)
+        ProvisioningService.deactivate(user)
+
+        AuditService.log(get_jwt_identity(), 'scim_user_deactivated', 'user', user.id,
+                         f"SCIM DELETE {user.email}", commit=False)
+        db.session.commit()
+
+        return '', 204
+
+    except ScimError as e:
+        return scim_error(e)
+    except Exception as e:
+        return internal_error('delete user', e)
+
+@scim_bp.route('/Bulk', methods=['POST'])
+@jwt_required()
+@role_required('admin')
+def bulk():
+    try:
+        max_payload = current_app.config['SCIM_BULK_MAX_PAYLOAD']
+        if request.content_length and request.content_length > max_payload:
+            raise ScimError(413, f'The maximum payload size is {max_payload} bytes', 'tooLarge')
+
+        operations = ProvisioningService.bulk(scim_body(), int(get_jwt_identity()))
+
+        return scim_response({'schemas': [SCHEMA_BULK_RESPONSE], 'Operations': operations})
+
+    except ScimError as e:
+        return scim_error(e)
+    except Exception as e:
+        return internal_error('bulk', e)
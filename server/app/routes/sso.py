@@ -1,15 +1,22 @@
 # app/routes/sso.py
-from flask import Blueprint, request, jsonify, current_app, redirect
+from flask import Blueprint, request, jsonify, current_app, redirect, g
 from flask_jwt_extended import jwt_required, get_jwt_identity, create_access_token
 import jwt
 import datetime
 from app.models import db, User, CompanyApp
 from app.services.audit_service import AuditService
+from app.services.change_feed_service import ChangeFeedService, CursorExpired
+from app.schemas.auth_schemas import GenerateSSOTokenSchema, ValidateSSOTokenSchema
+from app.utils.ip_policy import get_client_ip
+from app.utils.held_requests import hold, busy_response
+from app.utils.validation import validate_body
+from app.extensions import limiter
 
 sso_bp = Blueprint('sso', __name__)
 
 @sso_bp.route('/generate-token', methods=['POST'])
 @jwt_required()
+@validate_body(GenerateSSOTokenSchema)
 def generate_sso_token():
     try:
         current_user_id = get_jwt_identity()
@@ -18,16 +25,17 @@ def generate_sso_token():
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        data = request.get_json()
-        app_id = data.get('app_id')
-        
-        if not app_id:
-            return jsonify({'error': 'App ID is required'}), 400
+        app_id = g.body['app_id']
         
         app = CompanyApp.query.get(app_id)
         if not app or not app.is_active:
             return jsonify({'error': 'App not found or inactive'}), 404
         
+        client_ip = get_client_ip()
+        if not app.is_ip_allowed(client_ip):
+            AuditService.log(user.id, 'sso_ip_denied', 'app', app_id, f"{client_ip} not allowed for {app.name}")
+            return jsonify({'error': 'Access from this IP address is not allowed'}), 403
+        
         # Create SSO token
         payload = {
             'user_id': user.id,
@@ -35,7 +43,9 @@ def generate_sso_token():
             'first_name': user.first_name,
             'last_name': user.last_name,
             'role': user.role,
+            'tenant': user.tenant_id,
             'app_id': app_id,
+            'ip': client_ip,
             'exp': datetime.datetime.utcnow() + datetime.timedelta(minutes=5),
             'iat': datetime.datetime.utcnow(),
             'iss': 'company-hub'
@@ -58,13 +68,10 @@ def generate_sso_token():
         return jsonify({'error': 'Internal server error'}), 500
 
 @sso_bp.route('/validate', methods=['POST'])
+@validate_body(ValidateSSOTokenSchema)
 def validate_sso_token():
     try:
-        data = request.get_json()
-        token = data.get('token')
-        
-        if not token:
-            return jsonify({'error': 'Token is required'}), 400
+        token = g.body['token']
         
         # Verify token
         payload = jwt.decode(
@@ -76,6 +83,9 @@ def validate_sso_token():
         
         user_id = payload['user_id']
         app_id = payload['app_id']
+        # Ids are per tenant; tokens issued before tenancy belong to the default tenant
+        if payload.get('tenant'):
+            g.tenant_id = payload['tenant']
         
         # Verify user and app still exist and are active
         user = User.query.get(user_id)
@@ -84,6 +94,13 @@ def validate_sso_token():
         if not user or not user.is_active or not app or not app.is_active:
             return jsonify({'error': 'Invalid token'}), 401
         
+        # The app's backend validates the token: check the address the user signed in from,
+        # against the policy as it is now
+        client_ip = payload.get('ip') or get_client_ip()
+        if not app.is_ip_allowed(client_ip):
+            AuditService.log(user.id, 'sso_ip_denied', 'app', app_id, f"{client_ip} not allowed for {app.name}")
+            return jsonify({'error': 'Access from this IP address is not allowed'}), 403
+        
         AuditService.log(user.id, 'sso_token_validated', 'app', app_id, f"Validated token for {app.name}")
         
         return jsonify({
@@ -93,7 +110,8 @@ def validate_sso_token():
                 'email': user.email,
                 'first_name': user.first_name,
                 'last_name': user.last_name,
-                'role': user.role
+                'role': user.role,
+                'tenant_id': user.tenant_id
             },
             'app': {
                 'id': app.id,
@@ -109,3 +127,41 @@ def validate_sso_token():
         current_app.logger.error(f'SSO token validation error: {str(e)}')
         return jsonify({'error': 'Internal server error'}), 500
 
+
+
+@sso_bp.route('/changes', methods=['GET'])
+@limiter.limit(lambda: current_app.config['USER_CHANGES_RATE_LIMIT'])
+def user_changes():
+    # Called by company app backends, authenticated with the app's client_id and
+    # client_secret (HTTP Basic). ?wait=N long-polls for up to N seconds
+    try:
+        auth = request.authorization
+        app = ChangeFeedService.authenticate(auth.username, auth.password) if auth else None
+        if not app:
+            return jsonify({'error': 'Invalid client credentials'}), 401
+        
+        cursor = max(request.args.get('cursor', 0, type=int), 0)
+        limit = min(max(request.args.get('limit', 500, type=int), 1), current_app.config['USER_CHANGES_PAGE_SIZE'])
+        wait = max(request.args.get('wait', 0, type=float), 0)
+        
+        # Only a long-poll holds the thread
+        release = hold() if wait else None
+        if wait and release is None:
+            return busy_response()
+        try:
+            changes, next_cursor, has_more = ChangeFeedService.wait_for_changes(cursor, limit, wait)
+        finally:
+            if release:
+                release()
+        
+        return jsonify({
+            'cursor': str(next_cursor),
+            'changes': changes,
+            'has_more': has_more
+        }), 200
+        
+    except CursorExpired:
+        return jsonify({'error': 'Cursor expired: changes after it were deleted, resynchronize'}), 410
+    except Exception as e:
+        current_app.logger.error(f'User change feed error: {str(e)}')
+        return jsonify({'error': 'Internal server error'}), 500
@@ -1,13 +1,25 @@
 # app/routes/user.py
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, g
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from app.models import db, User, UserOnboarding, CompanyApp
 from app.services.audit_service import AuditService
+from app.services.onboarding_service import OnboardingService, OnboardingError
+from app.schemas.user_schemas import UpdateProfileSchema, SaveOnboardingSchema, OnboardingPatchSchema
+from app.utils.query_profiler import query_budget
+from app.utils.validation import validate_body
+from app.utils.http_cache import conditional, user_version, onboarding_version, onboarding_etag, apps_version
+from sqlalchemy.orm.exc import StaleDataError
 
 user_bp = Blueprint('user', __name__)
 
+def log_dashboard_view():
+    # A revalidated dashboard (304) is still a view
+    AuditService.log(get_jwt_identity(), 'view_user_dashboard')
+
 @user_bp.route('/dashboard', methods=['GET'])
+@query_budget(5)
 @jwt_required()
+@conditional(user_version, apps_version, on_not_modified=log_dashboard_view)
 def user_dashboard():
     try:
         current_user_id = get_jwt_identity()
@@ -38,7 +50,9 @@ def user_dashboard():
         return jsonify({'error': 'Internal server error'}), 500
 
 @user_bp.route('/profile', methods=['GET'])
+@query_budget(2)
 @jwt_required()
+@conditional(user_version)
 def get_profile():
     try:
         current_user_id = get_jwt_identity()
@@ -55,6 +69,7 @@ def get_profile():
 
 @user_bp.route('/profile', methods=['PUT'])
 @jwt_required()
+@validate_body(UpdateProfileSchema)
 def update_profile():
     try:
         current_user_id = get_jwt_identity()
@@ -63,7 +78,7 @@ def update_profile():
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        data = request.get_json()
+        data = g.body
         
         if 'first_name' in data:
             user.first_name = data['first_name']
@@ -84,9 +99,27 @@ def update_profile():
         current_app.logger.error(f'Update profile error: {str(e)}')
         return jsonify({'error': 'Internal server error'}), 500
 
+def onboarding_body_limit():
+    # Room for the step and JSON whitespace on top of the profile_data cap
+    return 2 * current_app.config['ONBOARDING_MAX_BYTES']
+
 @user_bp.route('/onboarding', methods=['POST'])
 @jwt_required()
+@validate_body(SaveOnboardingSchema, max_bytes=onboarding_body_limit)
 def save_onboarding():
+    # The whole document: {step, profile_data}
+    data = g.body
+    return _save_onboarding({'step_completed': data['step'], 'profile_data': data['profile_data']}, replace=True)
+
+@user_bp.route('/onboarding', methods=['PATCH'])
+@jwt_required()
+@validate_body(OnboardingPatchSchema, max_bytes=onboarding_body_limit)
+def patch_onboarding():
+    # An RFC 7396 merge-patch (application/merge-patch+json) of what GET returns
+    return _save_onboarding(g.body, replace=False)
+
+def _save_onboarding(document, replace):
+    # Either may send If-Match with the GET ETag
     try:
         current_user_id = get_jwt_identity()
         user = User.query.get(current_user_id)
@@ -94,39 +127,41 @@ def save_onboarding():
         if not user:
             return jsonify({'error': 'User not found'}), 404
         
-        data = request.get_json()
-        step = data.get('step', 0)
-        profile_data = data.get('profile_data', {})
-        
-        onboarding = UserOnboarding.query.filter_by(user_id=user.id).first()
-        if not onboarding:
-            onboarding = UserOnboarding(user_id=user.id)
-            db.session.add(onboarding)
-        
-        onboarding.step_completed = step
-        onboarding.profile_data = profile_data
+        onboarding, previous_step, changed = OnboardingService.save(
+            user, document, request.if_match, current_app.config['ONBOARDING_MAX_BYTES'], replace=replace
+        )
+        etag = onboarding_etag(onboarding.updated_at)
         
-        # Mark onboarding as completed if final step
-        if step >= 3:  # Assuming 3 is the final step
-            user.onboarding_completed = True
-            onboarding.completed_at = db.func.now()
+        # Unchanged autosaves write nothing, not even an audit row
+        if changed:
+            if onboarding.step_completed != previous_step:
+                AuditService.log(user.id, 'onboarding_progress', details=f"Completed step {onboarding.step_completed}",
+                                 commit=False)
+            db.session.commit()
         
-        db.session.commit()
-        
-        AuditService.log(user.id, 'onboarding_progress', details=f"Completed step {step}")
-        
-        return jsonify({
-            'message': 'Onboarding progress saved',
+        response = jsonify({
+            'message': 'Onboarding progress saved' if changed else 'Onboarding unchanged',
+            'step_completed': onboarding.step_completed,
             'onboarding_completed': user.onboarding_completed
-        }), 200
+        })
+        response.set_etag(etag)
+        return response, 200
         
+    except OnboardingError as e:
+        db.session.rollback()
+        return jsonify({'error': e.message}), e.status
+    except StaleDataError:
+        db.session.rollback()
+        return jsonify({'error': 'Onboarding was changed since it was read; reload and retry'}), 412
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f'Onboarding save error: {str(e)}')
         return jsonify({'error': 'Internal server error'}), 500
 
 @user_bp.route('/onboarding', methods=['GET'])
+@query_budget(2)
 @jwt_required()
+@conditional(onboarding_version)
 def get_onboarding():
     try:
         current_user_id = get_jwt_identity()
@@ -0,0 +1,33 @@
+from flask import current_app
+from marshmallow import Schema, ValidationError, fields, validate
+from app.services.webhook_service import EVENT_TYPES
+
+ASSIGNABLE_ROLES = ['user', 'admin']
+
+class EnrollUserSchema(Schema):
+    email = fields.Email(required=True, validate=validate.Length(max=120))
+    first_name = fields.Str(required=True, validate=validate.Length(min=1, max=50))
+    last_name = fields.Str(required=True, validate=validate.Length(min=1, max=50))
+    role = fields.Str(load_default='user', validate=validate.OneOf(ASSIGNABLE_ROLES))
+
+class UpdateUserSchema(Schema):
+    first_name = fields.Str(validate=validate.Length(min=1, max=50))
+    last_name = fields.Str(validate=validate.Length(min=1, max=50))
+    role = fields.Str(validate=validate.OneOf(ASSIGNABLE_ROLES))
+    is_active = fields.Bool()
+
+class HttpsOutsideDebug(validate.Validator):
+    """Plain http URLs only in DEBUG (local receivers)."""
+    error = 'Must be an https URL.'
+
+    def __call__(self, value):
+        if not value.lower().startswith('https://') and not current_app.debug:
+            raise ValidationError(self.error)
+        return value
+
+class AppWebhookSchema(Schema):
+    # null unsubscribes; an empty event list means every event. Where it resolves to is
+    # checked at delivery (webhook_service.PublicOnlyAdapter)
+    webhook_url = fields.Url(load_default=None, schemes={'http', 'https'}, require_tld=False,
+                             validate=[validate.Length(max=255), HttpsOutsideDebug()])
+    webhook_events = fields.List(fields.Str(validate=validate.OneOf(EVENT_TYPES)), load_default=list, allow_none=True)
@@ -19,13 +19,14 @@ class ResetPasswordSchema(Schema):
     new_password = fields.Str(required=True, validate=validate.Length(min=8))
 
 class SetupMFASchema(Schema):
-    pass
+    format = fields.Str(load_default=None, validate=validate.OneOf(['png', 'svg']))
 
 class VerifyMFASetupSchema(Schema):
     mfa_code = fields.Str(required=True, validate=validate.Length(min=6, max=6))
 
 class GenerateSSOTokenSchema(Schema):
-    app_id = fields.Str(required=True)
+    # Clients send the id as a number or a numeric string
+    app_id = fields.Int(required=True, validate=validate.Range(min=1))
 
 class ValidateSSOTokenSchema(Schema):
     token = fields.Str(required=True)
\ No newline at end of file
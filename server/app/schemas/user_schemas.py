@@ -0,0 +1,14 @@
+from marshmallow import Schema, fields, validate
+
+class UpdateProfileSchema(Schema):
+    first_name = fields.Str(validate=validate.Length(min=1, max=50))
+    last_name = fields.Str(validate=validate.Length(min=1, max=50))
+
+class SaveOnboardingSchema(Schema):
+    step = fields.Int(strict=True, load_default=0, validate=validate.Range(min=0))
+    profile_data = fields.Dict(load_default=dict)
+
+class OnboardingPatchSchema(Schema):
+    # RFC 7396: a member set to null is removed (step_completed goes back to 0)
+    step_completed = fields.Int(strict=True, allow_none=True, validate=validate.Range(min=0))
+    profile_data = fields.Dict(allow_none=True)
@@ -0,0 +1,252 @@
+# app/services/activity_service.py
+# Write-behind buffer for volatile per-user columns (last_login). A login used to write and
+# commit the users row, bumping updated_at (and with it every cache keyed on it). Now the new
+# values are staged in process memory and written every WRITE_BEHIND_FLUSH_INTERVAL seconds
+# as one UPDATE ... CASE per batch of users, leaving updated_at alone. Users loaded in this
+# process see their staged values; other workers see them after the next flush. The login
+# attempt counter and lockout are not buffered: a failed attempt recorded by another worker
+# must not be overwritten by a reset staged earlier, so a correct password clears them with
+# an UPDATE in the request's transaction that only matches the failures it saw. Password
+# hashes upgraded to the current hashing policy on login are buffered like last_login, but
+# only written over the hash they replace: a password changed in the meantime, in any
+# worker, is never reverted. With WRITE_BEHIND_ENABLED off the same writes join the
+# request's transaction instead, committed by the route.
+import atexit
+import os
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import case, event, inspect, or_, update
+from sqlalchemy.orm.attributes import set_committed_value
+from app.models import db, User
+from app.utils.metrics import USER_ACTIVITY_FLUSHED, USER_ACTIVITY_FLUSH_SECONDS, PASSWORD_REHASHES
+from app.utils.passwords import hash_password, needs_rehash, scheme_of
+from app.utils.tenancy import shard_for_tenant, shard_scope
+
+BUFFERED_FIELDS = ('last_login',)
+
+# (tenant, user id) -> {column: value}
+_pending = {}
+# (tenant, user id) -> (hash verified, its replacement)
+_rehashes = {}
+_pending_lock = threading.Lock()
+_flush_wanted = threading.Event()
+_flusher_pid = None
+_flusher_lock = threading.Lock()
+
+
+class ActivityService:
+    @staticmethod
+    def logged_in(user):
+        """Record a completed login."""
+        ActivityService.stage(user, last_login=datetime.utcnow())
+
+    @staticmethod
+    def password_verified(user, password):
+        """A correct password clears earlier failed attempts, and upgrades an outdated hash."""
+        if user.login_attempts or user.locked_until:
+            ActivityService.reset_failures(user)
+        if current_app.config['PASSWORD_REHASH_ON_LOGIN'] and needs_rehash(user.password_hash):
+            ActivityService.stage_rehash(user, hash_password(password))
+
+    @staticmethod
+    def reset_failures(user):
+        """Clear the attempt counter and an expired lockout in the request's transaction (the
+        route commits it), unless another worker recorded a failure or a lockout since the
+        user was loaded."""
+        reset = db.session.execute(
+            update(User)
+            .where(User.id == user.id, User.login_attempts == user.login_attempts,
+                   or_(User.locked_until.is_(None), User.locked_until <= datetime.utcnow()))
+            .values(login_attempts=0, locked_until=None, updated_at=User.updated_at)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if reset:
+            set_committed_value(user, 'login_attempts', 0)
+            set_committed_value(user, 'locked_until', None)
+
+    @staticmethod
+    def stage_rehash(user, password_hash):
+        previous = user.password_hash
+        PASSWORD_REHASHES.labels(scheme=scheme_of(password_hash)).inc()
+        if not current_app.config.get('WRITE_BEHIND_ENABLED', True):
+            # Same guarded UPDATE, in the request's transaction: the route's commit writes it
+            _write_rehashes([(user.id, previous, password_hash)])
+            set_committed_value(user, 'password_hash', password_hash)
+            return
+
+        set_committed_value(user, 'password_hash', password_hash)
+        with _pending_lock:
+            _rehashes[(user.tenant_id, user.id)] = (previous, password_hash)
+
+    @staticmethod
+    def stage(user, **values):
+        app = current_app
+        if not app.config.get('WRITE_BEHIND_ENABLED', True):
+            # Left on the session for the route's commit (the audit entry's), not one of their own
+            for field, value in values.items():
+                setattr(user, field, value)
+            return
+
+        # Committed values: the instance stays clean, so a later commit in this
+        # request does not write the row (or bump updated_at) for them
+        for field, value in values.items():
+            set_committed_value(user, field, value)
+        with _pending_lock:
+            _pending.setdefault((user.tenant_id, user.id), {}).update(values)
+            size = len(_pending)
+        if size >= app.config['WRITE_BEHIND_MAX_PENDING']:
+            _flush_wanted.set()
+
+    @staticmethod
+    def staged(tenant_id, user_id):
+        """Values staged for a user and not flushed yet."""
+        with _pending_lock:
+            return dict(_pending.get((tenant_id, int(user_id)), ()))
+
+    @staticmethod
+    def flush(app):
+        """Write all staged values; returns the number of users updated."""
+        global _pending, _rehashes
+        with _pending_lock:
+            pending, _pending = _pending, {}
+            rehashes, _rehashes = _rehashes, {}
+        if not pending and not rehashes:
+            return 0
+
+        by_shard = defaultdict(list)
+        for (tenant_id, user_id), values in pending.items():
+            by_shard[shard_for_tenant(tenant_id)].append((user_id, values))
+        rehashes_by_shard = defaultdict(list)
+        for (tenant_id, user_id), (previous, password_hash) in rehashes.items():
+            rehashes_by_shard[shard_for_tenant(tenant_id)].append((user_id, previous, password_hash))
+
+        start = time.perf_counter()
+        rows = 0
+        batch_size = app.config['WRITE_BEHIND_BATCH_SIZE']
+        for bind_key in by_shard.keys() | rehashes_by_shard.keys():
+            entries = by_shard.get(bind_key, [])
+            shard_rehashes = rehashes_by_shard.get(bind_key, [])
+            try:
+                with shard_scope(bind_key):
+                    for offset in range(0, len(entries), batch_size):
+                        rows += _write_batch(entries[offset:offset + batch_size])
+                    for offset in range(0, len(shard_rehashes), batch_size):
+                        rows += _write_rehashes(shard_rehashes[offset:offset + batch_size])
+                    db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f"User activity flush failed: {str(e)}")
+                # Rehashes are dropped: the next login redoes them
+                _restage(pending, bind_key)
+        # Cached ETag versions read last_login from the row (staged values on top): now
+        # that the row has it, re-read them. Imported here: http_cache reads staged values
+        from app.utils.http_cache import invalidate
+        invalidate(*(f'user:{tenant_id}:{user_id}' for tenant_id, user_id in pending))
+        USER_ACTIVITY_FLUSH_SECONDS.observe(time.perf_counter() - start)
+        USER_ACTIVITY_FLUSHED.inc(rows)
+        return rows
+
+
+def _write_batch(entries):
+    values = {}
+    for field in BUFFERED_FIELDS:
+        staged = {user_id: row[field] for user_id, row in entries if field in row}
+        if staged:
+            values[field] = case(staged, value=User.id, else_=getattr(User, field))
+    # Not a profile change: keep updated_at (its onupdate would fire even for a Core UPDATE)
+    values['updated_at'] = User.updated_at
+    return db.session.execute(
+        update(User).where(User.id.in_([user_id for user_id, _ in entries])).values(**values)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def _write_rehashes(rehashes):
+    # Each user's new hash only replaces the hash that was verified
+    return db.session.execute(
+        update(User)
+        .where(or_(*[(User.id == user_id) & (User.password_hash == previous) for user_id, previous, _ in rehashes]))
+        .values(
+            password_hash=case({user_id: password_hash for user_id, _, password_hash in rehashes}, value=User.id),
+            updated_at=User.updated_at
+        )
+        .execution_options(synchronize_session=False)
+    ).rowcount
+
+
+def _restage(pending, bind_key):
+    # Put the failed shard's values back without overwriting anything staged since
+    with _pending_lock:
+        for key, values in pending.items():
+            if shard_for_tenant(key[0]) == bind_key:
+                _pending[key] = {**values, **_pending.get(key, {})}
+
+
+def _apply_pending(target, *args):
+    with _pending_lock:
+        values = _pending.get((target.tenant_id, target.id))
+        values = dict(values) if values else None
+        rehash = _rehashes.get((target.tenant_id, target.id))
+    if values:
+        for field, value in values.items():
+            set_committed_value(target, field, value)
+    # From __dict__: a refresh may not have loaded it
+    if rehash and target.__dict__.get('password_hash') == rehash[0]:
+        set_committed_value(target, 'password_hash', rehash[1])
+
+
+def _drop_superseded(mapper, connection, target):
+    # The ORM just wrote some of these columns itself (a failed login): those values are newer
+    state = inspect(target)
+    written = [field for field in BUFFERED_FIELDS if state.attrs[field].history.has_changes()]
+    if not written:
+        return
+    with _pending_lock:
+        values = _pending.get((target.tenant_id, target.id))
+        if values:
+            for field in written:
+                values.pop(field, None)
+            if not values:
+                del _pending[(target.tenant_id, target.id)]
+
+
+def _flush_loop(app):
+    interval = app.config['WRITE_BEHIND_FLUSH_INTERVAL']
+    while True:
+        _flush_wanted.wait(interval)
+        _flush_wanted.clear()
+        with app.app_context():
+            try:
+                ActivityService.flush(app)
+            except Exception as e:
+                app.logger.error(f"User activity flush failed: {str(e)}")
+
+
+def _flush_at_exit(app):
+    with app.app_context():
+        ActivityService.flush(app)
+
+
+def init_activity_buffer(app):
+    if not event.contains(User, 'load', _apply_pending):
+        event.listen(User, 'load', _apply_pending)
+        event.listen(User, 'refresh', _apply_pending)
+        event.listen(User, 'after_update', _drop_superseded)
+
+    if not app.config.get('WRITE_BEHIND_ENABLED', True):
+        return
+
+    @app.before_request
+    def start_activity_flusher():
+        global _flusher_pid
+        # One flusher per process, started after a gunicorn fork (see init_scheduler)
+        if _flusher_pid == os.getpid():
+            return
+        with _flusher_lock:
+            if _flusher_pid != os.getpid():
+                _flusher_pid = os.getpid()
+                threading.Thread(target=_flush_loop, args=(app,), name='activity-flush', daemon=True).start()
+                atexit.register(_flush_at_exit, app)
@@ -1,10 +1,13 @@
 from flask import request, has_request_context, current_app
 from app.models import db, AuditLog
+from app.utils.ip_policy import get_client_ip
 import json
 
 class AuditService:
     @staticmethod
-    def log(user_id, action, resource=None, resource_id=None, details=None):
+    def log(user_id, action, resource=None, resource_id=None, details=None, commit=True):
+        """Record an audit entry. With ``commit=False`` it is only added to the session, to
+        be committed in the same transaction as the change it describes."""
         try:
             # Convert details dict → JSON
             if isinstance(details, dict):
@@ -16,12 +19,7 @@ class AuditService:
             # handle cases where request exists
             if has_request_context():
                 # Render uses proxy → extract real client IP
-                forwarded_for = request.headers.get("X-Forwarded-For", None)
-                if forwarded_for:
-                    # Real IP is first in the chain
-                    ip_address = forwarded_for.split(",")[0].strip()
-                else:
-                    ip_address = request.remote_addr
+                ip_address = get_client_ip()
 
                 user_agent = request.headers.get("User-Agent")
             else:
@@ -40,13 +38,16 @@ class AuditService:
             )
 
             db.session.add(audit_log)
-            db.session.commit()
+            if commit:
+                db.session.commit()
 
         except Exception as e:
-            try:
-                db.session.rollback()
-            except:
-                pass
+            # Without commit the session holds the caller's changes: leave it to the caller
+            if commit:
+                try:
+                    db.session.rollback()
+                except:
+                    pass
 
             if current_app:
                 current_app.logger.error(f"[AUDIT] Failed to log action: {str(e)}")
@@ -0,0 +1,279 @@
+# app/services/audit_stream_service.py
+# Live audit events for the admin console (Server-Sent Events). Audit rows are published
+# to an in-process channel per tenant once their transaction commits. Connected admins
+# share that channel's ring buffer: each one only keeps a position in it and a wake-up
+# callback, so an idle connection costs next to nothing. Rows committed by other worker
+# processes reach the channel through one poller thread per process, which only polls
+# tenants somebody is watching. A client that reconnects with Last-Event-ID first gets
+# what it missed from the database, then the live events.
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+from app.models import db, AuditLog
+from app.utils.tenancy import tenant_scope
+
+STREAM_FIELDS = (
+    'id', 'user_id', 'action', 'resource', 'resource_id', 'ip_address', 'timestamp', 'details', 'status',
+    'endpoint', 'method'
+)
+
+_channels = {}
+_channels_lock = threading.Lock()
+_poller_pid = None
+_app = None
+
+
+def serialize(log):
+    data = {field: getattr(log, field) for field in STREAM_FIELDS}
+    # Callers pass the JWT identity (a string) before the row is flushed
+    data['user_id'] = int(log.user_id) if log.user_id is not None else None
+    data['timestamp'] = log.timestamp.isoformat() if log.timestamp else None
+    data['status'] = log.status or 'success'
+    return data
+
+
+def matches(audit_event, filters):
+    if filters.get('user_id') and audit_event['user_id'] != filters['user_id']:
+        return False
+    if filters.get('action') and filters['action'].lower() not in audit_event['action'].lower():
+        return False
+    if filters.get('status') and audit_event['status'] != filters['status']:
+        return False
+    return True
+
+
+def replay_statement(after_id, filters, limit, tenant_id=None):
+    # Same filters as matches(), in SQL
+    statement = select(AuditLog).where(AuditLog.id > after_id).order_by(AuditLog.id).limit(limit)
+    if filters.get('user_id'):
+        statement = statement.where(AuditLog.user_id == filters['user_id'])
+    if filters.get('action'):
+        statement = statement.where(AuditLog.action.ilike(f"%{filters['action']}%"))
+    if filters.get('status'):
+        statement = statement.where(func.coalesce(AuditLog.status, 'success') == filters['status'])
+    return statement.where(AuditLog.tenant_id == tenant_id) if tenant_id else statement
+
+
+def frame(audit_event):
+    return f"id: {audit_event['id']}\nevent: audit\ndata: {json.dumps(audit_event)}\n\n"
+
+
+class Channel:
+    """Recent audit events of one tenant, in publish order."""
+
+    def __init__(self, size):
+        self.events = deque()
+        self.ids = set()
+        self.size = size
+        self.seq = 0
+        self.subscribers = set()
+        # Highest audit id the poller has seen; None until its first poll
+        self.mark = None
+        self.opened_at = datetime.utcnow()
+
+    def append(self, audit_event):
+        # Caller holds _channels_lock
+        if audit_event['id'] in self.ids:
+            return False
+        self.seq += 1
+        self.events.append((self.seq, audit_event))
+        self.ids.add(audit_event['id'])
+        if len(self.events) > self.size:
+            _, dropped = self.events.popleft()
+            self.ids.discard(dropped['id'])
+        return True
+
+
+class Subscription:
+    def __init__(self, channel, filters, notify):
+        self.channel = channel
+        self.filters = filters
+        self.notify = notify
+        self.seq = channel.seq
+        self.read_at = time.monotonic()
+        # Ids already sent from the database on resume
+        self.replayed = set()
+
+
+class AuditStreamService:
+    @staticmethod
+    def subscribe(tenant_id, filters, notify):
+        """Start receiving the tenant's audit events; ``notify()`` is called (from any thread) when some arrive."""
+        _start_poller()
+        with _channels_lock:
+            channel = _channels.get(tenant_id)
+            if channel is None:
+                channel = _channels[tenant_id] = Channel(_app.config['AUDIT_STREAM_BUFFER_SIZE'])
+            subscription = Subscription(channel, filters, notify)
+            channel.subscribers.add(subscription)
+        return subscription
+
+    @staticmethod
+    def unsubscribe(subscription):
+        with _channels_lock:
+            subscription.channel.subscribers.discard(subscription)
+
+    @staticmethod
+    def read(subscription):
+        """Events published since the last read that match the filters, or None if the
+        subscriber fell so far behind that the buffer no longer holds them."""
+        with _channels_lock:
+            channel = subscription.channel
+            if channel.events and channel.events[0][0] > subscription.seq + 1:
+                return None
+            pending = [audit_event for seq, audit_event in channel.events if seq > subscription.seq]
+            subscription.seq = channel.seq
+            subscription.read_at = time.monotonic()
+        return [
+            audit_event for audit_event in pending
+            if audit_event['id'] not in subscription.replayed and matches(audit_event, subscription.filters)
+        ]
+
+    @staticmethod
+    def replay(subscription, last_event_id, limit):
+        """Matching events after ``last_event_id`` from the database (current tenant)."""
+        logs = db.session.scalars(replay_statement(last_event_id, subscription.filters, limit)).all()
+        backlog = [serialize(log) for log in logs]
+        subscription.replayed.update(audit_event['id'] for audit_event in backlog)
+        return backlog
+
+    @staticmethod
+    def publish(tenant_id, audit_events):
+        with _channels_lock:
+            channel = _channels.get(tenant_id)
+            if channel is None:
+                return
+            appended = [audit_event for audit_event in audit_events if channel.append(audit_event)]
+            subscribers = list(channel.subscribers) if appended else ()
+        for subscription in subscribers:
+            try:
+                subscription.notify()
+            except Exception:
+                # Runs inside the publisher's commit: a dead stream must not fail it
+                pass
+
+    @staticmethod
+    def stream(subscription, wake, backlog, more):
+        """SSE body for the Flask route, woken through ``wake`` (the subscription's notify). It holds
+        a worker thread, so it ends after AUDIT_STREAM_MAX_SECONDS, capped below gunicorn's timeout by
+        WSGI_MAX_HOLD_SECONDS, and the client resumes with Last-Event-ID."""
+        config = current_app.config
+        heartbeat = config['AUDIT_STREAM_HEARTBEAT']
+        deadline = time.monotonic() + min(config['AUDIT_STREAM_MAX_SECONDS'], config['WSGI_MAX_HOLD_SECONDS'])
+        retry_ms = int(config['AUDIT_STREAM_RETRY_MS'])
+
+        def generate():
+            try:
+                yield f'retry: {retry_ms}\n\n' + ''.join(frame(audit_event) for audit_event in backlog)
+                # A full replay page: reconnecting fetches the next one
+                if more:
+                    return
+                while time.monotonic() < deadline:
+                    woken = wake.wait(min(heartbeat, max(deadline - time.monotonic(), 0)))
+                    wake.clear()
+                    audit_events = AuditStreamService.read(subscription)
+                    if audit_events is None:
+                        return
+                    if audit_events:
+                        yield ''.join(frame(audit_event) for audit_event in audit_events)
+                    elif not woken:
+                        yield ': keep-alive\n\n'
+            finally:
+                AuditStreamService.unsubscribe(subscription)
+
+        return generate()
+
+
+def _stage(mapper, connection, target):
+    # Serialized now: after the commit the row's attributes are expired
+    Session.object_session(target).info.setdefault('audit_events', []).append((target.tenant_id, serialize(target)))
+
+
+def _after_commit(session):
+    staged = session.info.pop('audit_events', None)
+    if not staged or not _channels:
+        return
+    by_tenant = {}
+    for tenant_id, audit_event in staged:
+        by_tenant.setdefault(tenant_id, []).append(audit_event)
+    for tenant_id, audit_events in by_tenant.items():
+        AuditStreamService.publish(tenant_id, audit_events)
+
+
+def _after_rollback(session):
+    session.info.pop('audit_events', None)
+
+
+def _poll(app, tenant_id, channel):
+    config = app.config
+    with app.app_context(), tenant_scope(tenant_id):
+        if channel.mark is None:
+            channel.mark = db.session.scalar(select(func.max(AuditLog.id))) or 0
+            return
+        # Ids are assigned before commit, so another worker's row can land a little behind
+        # the mark: look back a few ids, the channel drops the ones it already has
+        logs = db.session.scalars(
+            select(AuditLog)
+            .where(AuditLog.id > channel.mark - config['AUDIT_STREAM_POLL_OVERLAP'])
+            .order_by(AuditLog.id)
+            .limit(config['AUDIT_STREAM_BUFFER_SIZE'])
+        ).all()
+    if logs:
+        mark, channel.mark = channel.mark, max(channel.mark, logs[-1].id)
+        # Not the look-back rows from before anybody was watching
+        AuditStreamService.publish(tenant_id, [
+            serialize(log) for log in logs if log.id > mark or (log.timestamp and log.timestamp >= channel.opened_at)
+        ])
+
+
+def _poll_loop(app):
+    interval = app.config['AUDIT_STREAM_POLL_INTERVAL']
+    # Streams read at least once per heartbeat; one that stopped never got to unsubscribe
+    # (its response was dropped before the body started)
+    abandoned_after = app.config['AUDIT_STREAM_HEARTBEAT'] * 3
+    while True:
+        time.sleep(interval)
+        with _channels_lock:
+            now = time.monotonic()
+            for channel in _channels.values():
+                channel.subscribers = {
+                    subscription for subscription in channel.subscribers
+                    if now - subscription.read_at < abandoned_after
+                }
+            # Channels nobody watches are dropped; they start over on the next subscribe
+            for tenant_id in [tenant_id for tenant_id, channel in _channels.items() if not channel.subscribers]:
+                del _channels[tenant_id]
+            watched = list(_channels.items())
+        for tenant_id, channel in watched:
+            try:
+                _poll(app, tenant_id, channel)
+            except Exception as e:
+                app.logger.error(f"Audit stream poll failed for tenant {tenant_id}: {str(e)}")
+
+
+def _start_poller():
+    global _poller_pid
+    # One poller per process, started by the first subscriber (ASGI requests never run
+    # Flask's before_request hooks)
+    if _poller_pid == os.getpid():
+        return
+    with _channels_lock:
+        if _poller_pid != os.getpid():
+            _poller_pid = os.getpid()
+            _channels.clear()
+            threading.Thread(target=_poll_loop, args=(_app,), name='audit-stream', daemon=True).start()
+
+
+def init_audit_stream(app):
+    global _app
+    _app = app
+    if not event.contains(AuditLog, 'after_insert', _stage):
+        event.listen(AuditLog, 'after_insert', _stage)
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_rollback', _after_rollback)
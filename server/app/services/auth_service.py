@@ -1,45 +1,156 @@
 # app/services/auth_service.py
+import hashlib
 import secrets
+import threading
+import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import event, or_, select, update
+from sqlalchemy.orm import Session
 from app.models import db, User, PasswordReset
+from app.utils.batching import chunked_delete
+from app.utils.breached_passwords import is_breached
+from app.utils.tenancy import current_tenant
+
+# (tenant, token digest) -> ((reset id, user id, expires_at) or None, cached_at)
+_reset_cache = OrderedDict()
+_reset_cache_lock = threading.Lock()
+
+
+def hash_reset_token(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
 
 class AuthService:
     @staticmethod
     def generate_password_reset_token(user_id):
         token = secrets.token_urlsafe(32)
-        expires_at = datetime.utcnow() + timedelta(hours=1)
+        token_hash = hash_reset_token(token)
+        expires_at = datetime.utcnow() + timedelta(minutes=current_app.config['PASSWORD_RESET_EXPIRY_MINUTES'])
         
-        # Invalidate previous tokens
+        # Invalidate previous tokens (served by the (user_id, is_used) index)
         PasswordReset.query.filter_by(user_id=user_id, is_used=False).update({'is_used': True})
         
         reset_token = PasswordReset(
             user_id=user_id,
-            token=token,
+            token=token_hash,
             expires_at=expires_at
         )
         db.session.add(reset_token)
         db.session.commit()
-        
+
+        AuthService._cache_reset(token_hash, (reset_token.id, user_id, expires_at))
         return token
     
     @staticmethod
-    def verify_password_reset_token(token):
-        reset_token = PasswordReset.query.filter_by(token=token, is_used=False).first()
-        
-        if not reset_token or reset_token.expires_at < datetime.utcnow():
-            return None
-        
-        reset_token.is_used = True
+    def generate_invitation_tokens(user_ids, expiry_hours):
+        """Set-password tokens for new users (who have none to invalidate), inserted and
+        committed together; returns ``{user_id: token}``."""
+        expires_at = datetime.utcnow() + timedelta(hours=expiry_hours)
+        tokens = {user_id: secrets.token_urlsafe(32) for user_id in user_ids}
+        resets = [
+            PasswordReset(user_id=user_id, token=hash_reset_token(token), expires_at=expires_at)
+            for user_id, token in tokens.items()
+        ]
+        db.session.add_all(resets)
         db.session.commit()
-        
-        return reset_token.user_id
+
+        for reset in resets:
+            AuthService._cache_reset(reset.token, (reset.id, reset.user_id, expires_at))
+        return tokens
+    
+    @staticmethod
+    def verify_password_reset_token(token, commit=True):
+        """Consume ``token``; returns the user id, or None. With ``commit=False`` the caller
+        commits (the token is only spent, in the database and the cache, if that transaction commits)."""
+        token_hash = hash_reset_token(token)
+        entry = AuthService._cached_reset(token_hash)
+        if entry is False:
+            entry = db.session.execute(
+                select(PasswordReset.id, PasswordReset.user_id, PasswordReset.expires_at)
+                .filter_by(token=token_hash, is_used=False)
+            ).first()
+            entry = tuple(entry) if entry else None
+            AuthService._cache_reset(token_hash, entry)
+
+        # Unknown, used and expired tokens never become valid again, so they are
+        # answered from the cache; retries and guesses do not reach the database
+        if entry is None:
+            return None
+        reset_id, user_id, expires_at = entry
+        if expires_at < datetime.utcnow():
+            return None
+
+        # Conditional update: the single source of truth, and only one of two
+        # concurrent requests with the same token can consume it
+        consumed = db.session.execute(
+            update(PasswordReset)
+            .where(PasswordReset.id == reset_id, PasswordReset.is_used == False, PasswordReset.expires_at > datetime.utcnow())
+            .values(is_used=True)
+        ).rowcount
+        # Cached as spent once the consuming transaction commits (_spend_cached_resets): a
+        # rollback leaves the token usable, and so must the cache
+        db.session.info.setdefault('spent_reset_tokens', []).append((current_tenant(), token_hash))
+        if commit:
+            db.session.commit()
+        return user_id if consumed else None
+
+    @staticmethod
+    def sweep_password_resets(batch_size=None, max_batches=None):
+        """Delete used and expired reset rows in bounded batches; returns the number deleted."""
+        return chunked_delete(
+            PasswordReset,
+            or_(PasswordReset.is_used == True, PasswordReset.expires_at < datetime.utcnow()),
+            batch_size or current_app.config['PASSWORD_RESET_SWEEP_BATCH_SIZE'],
+            max_batches
+        )
+
+    @staticmethod
+    def _cached_reset(token_hash):
+        ttl = current_app.config['PASSWORD_RESET_CACHE_TTL']
+        with _reset_cache_lock:
+            cached = _reset_cache.get((current_tenant(), token_hash))
+            if cached is None or time.monotonic() - cached[1] > ttl:
+                return False
+            return cached[0]
+
+    @staticmethod
+    def _cache_reset(token_hash, entry, tenant_id=None):
+        max_size = current_app.config['PASSWORD_RESET_CACHE_SIZE']
+        if max_size <= 0:
+            return
+        key = (tenant_id or current_tenant(), token_hash)
+        with _reset_cache_lock:
+            _reset_cache[key] = (entry, time.monotonic())
+            _reset_cache.move_to_end(key)
+            while len(_reset_cache) > max_size:
+                _reset_cache.popitem(last=False)
     
     @staticmethod
     def generate_temporary_password():
         """Generate a secure temporary password"""
         import string
-        import random
         
         # Generate 12 character password with mix of characters
         characters = string.ascii_letters + string.digits + "!@#$%"
-        return ''.join(random.choice(characters) for i in range(12))
\ No newline at end of file
+        while True:
+            password = ''.join(secrets.choice(characters) for i in range(12))
+            # Enrollment must not hand out a breached password (or a filter false positive)
+            if not is_breached(password):
+                return password
+
+
+def _spend_cached_resets(session):
+    for tenant_id, token_hash in session.info.pop('spent_reset_tokens', ()):
+        AuthService._cache_reset(token_hash, None, tenant_id)
+
+
+def _forget_spent_resets(session):
+    session.info.pop('spent_reset_tokens', None)
+
+
+def init_password_resets(app):
+    if not event.contains(Session, 'after_commit', _spend_cached_resets):
+        event.listen(Session, 'after_commit', _spend_cached_resets)
+        event.listen(Session, 'after_rollback', _forget_spent_resets)
@@ -0,0 +1,164 @@
+# app/services/change_feed_service.py
+# Change feed for downstream company apps. Every ORM insert/update of a User that touches
+# a field apps care about appends a user_changes row in the same transaction, holding
+# only the changed fields. Apps read it with /api/sso/changes?cursor=<last id seen> and
+# can long-poll. Ids are assigned before commit, so a transaction that commits late can
+# land behind one that was already served. Rows are only handed out once they are
+# USER_CHANGES_SETTLE_SECONDS old by the database's clock (stamped when the row is
+# inserted, compared when the feed is read), so app hosts' clocks do not matter. This is
+# best-effort: a transaction still open SETTLE_SECONDS after writing its changes commits
+# them behind the cursor and they are skipped, so the window must stay well above the
+# longest transaction that updates users.
+import hmac
+import time
+from flask import current_app
+from sqlalchemy import DateTime, event, func, inspect, insert, literal, select
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.expression import FunctionElement
+from app.models import db, User, UserChange, CompanyApp
+
+FEED_FIELDS = ('email', 'first_name', 'last_name', 'role', 'is_active')
+
+
+class db_utcnow(FunctionElement):
+    """The database's current UTC time, ``seconds`` from now, naive like datetime.utcnow()."""
+    type = DateTime()
+    inherit_cache = True
+    name = 'db_utcnow'
+
+    def __init__(self, seconds=0):
+        super().__init__(literal(float(seconds)))
+
+
+@compiles(db_utcnow)
+def _db_utcnow(element, compiler, **kw):
+    # PostgreSQL; CLOCK_TIMESTAMP is the time of the call, not of the transaction's start
+    return f"TIMEZONE('utc', CLOCK_TIMESTAMP()) + MAKE_INTERVAL(secs => {compiler.process(element.clauses, **kw)})"
+
+
+@compiles(db_utcnow, 'sqlite')
+def _db_utcnow_sqlite(element, compiler, **kw):
+    return f"STRFTIME('%Y-%m-%d %H:%M:%f', 'now', {compiler.process(element.clauses, **kw)} || ' seconds')"
+
+
+class CursorExpired(Exception):
+    """The cursor points at changes the retention job has already deleted."""
+
+
+class ChangeFeedService:
+    @staticmethod
+    def authenticate(client_id, client_secret):
+        """The active CompanyApp with these credentials, or None."""
+        if not client_id or not client_secret:
+            return None
+        app = CompanyApp.query.filter_by(client_id=client_id).first()
+        if not app or not app.is_active or not hmac.compare_digest(app.client_secret, client_secret):
+            return None
+        return app
+
+    @staticmethod
+    def changes_since(cursor, limit):
+        """``(changes, next cursor, has_more)`` for the current tenant."""
+        rows = db.session.execute(
+            changes_statement(cursor, limit, current_app.config['USER_CHANGES_SETTLE_SECONDS'])
+        ).all()
+        if cursor_needs_check(rows, cursor):
+            check_cursor(cursor, db.session.scalar(oldest_statement()), current_app.config['USER_CHANGES_RETENTION_DAYS'])
+        return page(rows, cursor, limit)
+
+    @staticmethod
+    def wait_for_changes(cursor, limit, wait):
+        """changes_since, waiting up to ``wait`` seconds for the first change. The wait holds a worker
+        thread, so it is capped by WSGI_MAX_HOLD_SECONDS as well as USER_CHANGES_MAX_WAIT."""
+        config = current_app.config
+        deadline = time.monotonic() + min(wait, config['USER_CHANGES_MAX_WAIT'], config['WSGI_MAX_HOLD_SECONDS'])
+        while True:
+            changes, next_cursor, has_more = ChangeFeedService.changes_since(cursor, limit)
+            remaining = deadline - time.monotonic()
+            if changes or remaining <= 0:
+                return changes, next_cursor, has_more
+            # Hand the connection back to the pool while waiting
+            db.session.rollback()
+            time.sleep(min(remaining, config['USER_CHANGES_POLL_INTERVAL']))
+
+
+def changes_statement(cursor, limit, settle_seconds, tenant_id=None):
+    # One row more than asked for tells whether there is more
+    statement = (
+        select(UserChange.id, UserChange.user_id, UserChange.op, UserChange.changes, UserChange.created_at)
+        .where(UserChange.id > cursor, UserChange.created_at <= db_utcnow(-settle_seconds))
+        .order_by(UserChange.id)
+        .limit(limit + 1)
+    )
+    return statement.where(UserChange.tenant_id == tenant_id) if tenant_id else statement
+
+
+def oldest_statement(tenant_id=None):
+    statement = select(func.min(UserChange.id))
+    return statement.where(UserChange.tenant_id == tenant_id) if tenant_id else statement
+
+
+def cursor_needs_check(rows, cursor):
+    # A gap after the cursor is usually a rolled back insert, but may be pruned rows
+    return bool(cursor) and (not rows or rows[0].id > cursor + 1)
+
+
+def check_cursor(cursor, oldest, retention_days):
+    if retention_days > 0 and oldest is not None and cursor < oldest - 1:
+        raise CursorExpired()
+
+
+def page(rows, cursor, limit):
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    changes = [
+        {'id': row.id, 'user_id': row.user_id, 'op': row.op, 'changes': row.changes, 'at': row.created_at.isoformat()}
+        for row in rows
+    ]
+    return changes, rows[-1].id if rows else cursor, has_more
+
+
+def _record(connection, target, op, changes):
+    # Written in one executemany per flush (a SCIM bulk chunk creates hundreds of users)
+    staged = Session.object_session(target).info.setdefault('user_changes', {})
+    staged.setdefault(connection, []).append({
+        'tenant_id': target.tenant_id,
+        'user_id': target.id,
+        'op': op,
+        'changes': changes
+    })
+
+
+def _user_inserted(mapper, connection, target):
+    _record(connection, target, 'create', {field: getattr(target, field) for field in FEED_FIELDS})
+
+
+def _user_updated(mapper, connection, target):
+    state = inspect(target)
+    changes = {}
+    for field in FEED_FIELDS:
+        history = state.attrs[field].history
+        if history.added and list(history.added) != list(history.deleted):
+            changes[field] = history.added[0]
+    if changes:
+        _record(connection, target, 'update', changes)
+
+
+def _write_changes(session, flush_context):
+    # Same connection, so the same transaction as the user rows
+    for connection, rows in session.info.pop('user_changes', {}).items():
+        connection.execute(insert(UserChange.__table__).values(created_at=db_utcnow()), rows)
+
+
+def _discard_changes(session):
+    # A flush that failed part way never reached after_flush
+    session.info.pop('user_changes', None)
+
+
+def init_change_feed(app):
+    if not event.contains(User, 'after_insert', _user_inserted):
+        event.listen(User, 'after_insert', _user_inserted)
+        event.listen(User, 'after_update', _user_updated)
+        event.listen(Session, 'after_flush', _write_changes)
+        event.listen(Session, 'after_rollback', _discard_changes)
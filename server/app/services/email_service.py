@@ -1,9 +1,16 @@
 # app/services/email_service.py
 
 import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from flask import current_app, render_template
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
+from app.utils.metrics import EMAIL_SEND_SECONDS
+from app.utils.tenancy import current_tenant, default_tenant
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
 
 class EmailService:
 
@@ -21,32 +28,86 @@ class EmailService:
 
     @staticmethod
     def send_password_reset_email(email, reset_token, first_name):
-        reset_url = f"{current_app.config['FRONTEND_URL']}/reset-password?token={reset_token}"
-
         subject = "Password Reset Request - Company Hub"
 
         html_content = render_template(
             "emails/password_reset.html",
             first_name=first_name,
-            reset_url=reset_url
+            reset_url=EmailService._reset_url(reset_token)
+        )
+
+        EmailService._send_email(email, subject, html_content)
+
+    @staticmethod
+    def send_invitation_email(email, reset_token, first_name, expiry_hours):
+        subject = "Welcome to Company Hub - Set Your Password"
+
+        html_content = render_template(
+            "emails/invitation.html",
+            first_name=first_name,
+            reset_url=EmailService._reset_url(reset_token),
+            expiry_hours=expiry_hours
         )
 
         EmailService._send_email(email, subject, html_content)
 
+    @staticmethod
+    def _reset_url(reset_token):
+        reset_url = f"{current_app.config['FRONTEND_URL']}/reset-password?token={reset_token}"
+        if current_tenant() != default_tenant():
+            # The reset page sends it back as X-Tenant-ID
+            reset_url += f"&tenant={current_tenant()}"
+        return reset_url
+
     @staticmethod
     def _send_email(to_email, subject, html_content):
-        try:
-            message = Mail(
-                from_email=current_app.config["SENDGRID_SENDER"],
-                to_emails=to_email,
-                subject=subject,
-                html_content=html_content
+        app = current_app._get_current_object()
+
+        # Hand delivery to a background thread so the request never waits on SendGrid
+        if app.config.get('EMAIL_ASYNC_DELIVERY'):
+            EmailService._get_executor(app).submit(
+                EmailService._deliver, app, to_email, subject, html_content
             )
+        else:
+            EmailService._deliver(app, to_email, subject, html_content)
+
+    @staticmethod
+    def _get_executor(app):
+        global _executor, _executor_pid
+        # A pool inherited through fork has no live threads: build one per process
+        with _executor_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor_pid = os.getpid()
+                _executor = ThreadPoolExecutor(
+                    max_workers=app.config.get('EMAIL_DELIVERY_WORKERS', 4),
+                    thread_name_prefix='email'
+                )
+        return _executor
 
-            sg = SendGridAPIClient(current_app.config["SENDGRID_API_KEY"])
-            sg.send(message)
+    @staticmethod
+    def _deliver(app, to_email, subject, html_content):
+        start = time.perf_counter()
+        status = 'sent'
+        with app.app_context():
+            try:
+                # Imported lazily: the SendGrid client is heavy and only needed when mail goes out
+                from sendgrid import SendGridAPIClient
+                from sendgrid.helpers.mail import Mail
 
-        except Exception as e:
-            current_app.logger.error(
-                f"Failed to send email to {to_email}: {str(e)}"
-            )
+                message = Mail(
+                    from_email=current_app.config["SENDGRID_SENDER"],
+                    to_emails=to_email,
+                    subject=subject,
+                    html_content=html_content
+                )
+
+                sg = SendGridAPIClient(current_app.config["SENDGRID_API_KEY"])
+                sg.send(message)
+
+            except Exception as e:
+                status = 'failed'
+                current_app.logger.error(
+                    f"Failed to send email to {to_email}: {str(e)}"
+                )
+            finally:
+                EMAIL_SEND_SECONDS.labels(status=status).observe(time.perf_counter() - start)
@@ -1,35 +1,29 @@
 # app/services/mfa_service.py
-import pyotp
-import qrcode
-import base64
-from io import BytesIO
+# pyotp is imported on first use and QR codes are rendered by QRService:
+# most workers never render a QR code, so they should not pay for it at startup
 from app.models import db, User
+from app.services.qr_service import QRService
+from app.services.totp_service import TOTPService
 
 class MFAService:
     @staticmethod
     def generate_mfa_secret():
+        import pyotp
         return pyotp.random_base32()
     
     @staticmethod
     def generate_provisioning_uri(email, secret, issuer):
+        import pyotp
         totp = pyotp.TOTP(secret)
         return totp.provisioning_uri(name=email, issuer_name=issuer)
     
     @staticmethod
-    def generate_qr_code(provisioning_uri):
-        qr = qrcode.QRCode(version=1, box_size=10, border=5)
-        qr.add_data(provisioning_uri)
-        qr.make(fit=True)
-        
-        img = qr.make_image(fill_color="black", back_color="white")
-        buffered = BytesIO()
-        img.save(buffered, format="PNG")
-        return base64.b64encode(buffered.getvalue()).decode()
+    def generate_qr_code(provisioning_uri, fmt=None):
+        return QRService.render(provisioning_uri, fmt)
     
     @staticmethod
-    def verify_totp(secret, token):
-        totp = pyotp.TOTP(secret)
-        return totp.verify(token)
+    def verify_totp(secret, token, user_id=None):
+        return TOTPService.verify(secret, token, user_id)
     
     @staticmethod
     def enable_mfa_for_user(user_id, secret):
@@ -0,0 +1,104 @@
+# app/services/onboarding_service.py
+# Onboarding progress. Clients autosave every few seconds, usually with little or nothing
+# new, so a save is an RFC 7396 merge-patch against the stored document (or a whole
+# document) applied in memory, and the row is only written when the content hash of the
+# result differs from the stored content. A save can be made conditional on the version
+# the client last read (If-Match with the GET ETag); updated_at is the row's version
+# column, so the UPDATE itself re-checks it and a concurrent save fails instead of being
+# overwritten.
+import hashlib
+import json
+from datetime import datetime
+from app.models import db, UserOnboarding
+from app.utils.http_cache import onboarding_etag
+
+FINAL_STEP = 3
+DOCUMENT_FIELDS = ('step_completed', 'profile_data')
+
+
+class OnboardingError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def merge_patch(target, patch):
+    """RFC 7396: objects merge member by member, null removes a member, anything else replaces."""
+    if not isinstance(patch, dict):
+        return patch
+    result = dict(target) if isinstance(target, dict) else {}
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        else:
+            result[key] = merge_patch(result.get(key), value)
+    return result
+
+
+def canonical(document):
+    return json.dumps(document, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def content_hash(step_completed, profile_data):
+    return hashlib.sha256(canonical([step_completed, profile_data])).hexdigest()
+
+
+class OnboardingService:
+    @staticmethod
+    def save(user, patch, if_match, max_bytes, replace=False):
+        """Apply ``patch`` ({step_completed, profile_data}, as GET returns them) to the user's
+        onboarding; with ``replace`` it is the whole document. Flushes only when the content
+        changed. Returns ``(onboarding, previous step, changed)``."""
+        unknown = set(patch) - set(DOCUMENT_FIELDS)
+        if unknown:
+            raise OnboardingError(400, f"Unknown or read-only fields: {', '.join(sorted(unknown))}")
+
+        onboarding = UserOnboarding.query.filter_by(user_id=user.id).first()
+        if if_match:
+            current = onboarding_etag(onboarding.updated_at if onboarding else None)
+            if not (if_match.star_tag and onboarding) and not if_match.contains_weak(current):
+                raise OnboardingError(412, 'Onboarding was changed since it was read; reload and retry')
+
+        step = (onboarding.step_completed or 0) if onboarding else 0
+        profile_data = (onboarding.profile_data or {}) if onboarding else {}
+        if replace:
+            step, profile_data = 0, {}
+
+        new_step = step
+        if 'step_completed' in patch:
+            value = patch['step_completed']
+            if value is not None and (isinstance(value, bool) or not isinstance(value, int) or value < 0):
+                raise OnboardingError(400, 'step_completed must be a non-negative integer')
+            new_step = value or 0
+        new_profile_data = profile_data
+        if 'profile_data' in patch:
+            value = patch['profile_data']
+            if value is not None and not isinstance(value, dict):
+                raise OnboardingError(400, 'profile_data must be an object')
+            # null clears it, as for any member a merge-patch sets to null
+            new_profile_data = merge_patch(profile_data, value) if value is not None else {}
+
+        if len(canonical(new_profile_data)) > max_bytes:
+            raise OnboardingError(413, f'profile_data is limited to {max_bytes} bytes')
+
+        previous_step = (onboarding.step_completed or 0) if onboarding else 0
+        if onboarding and content_hash(new_step, new_profile_data) == content_hash(
+            onboarding.step_completed or 0, onboarding.profile_data or {}
+        ):
+            return onboarding, previous_step, False
+
+        if not onboarding:
+            onboarding = UserOnboarding(user_id=user.id)
+            db.session.add(onboarding)
+        onboarding.step_completed = new_step
+        onboarding.profile_data = new_profile_data
+
+        if new_step >= FINAL_STEP:
+            user.onboarding_completed = True
+            if not onboarding.completed_at:
+                onboarding.completed_at = datetime.utcnow()
+
+        # Raises StaleDataError when another save got in since the row was loaded
+        db.session.flush()
+        return onboarding, previous_step, True
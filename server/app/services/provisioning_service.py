@@ -0,0 +1,408 @@
+# app/services/provisioning_service.py
+# SCIM 2.0 (RFC 7643/7644) user provisioning for HR systems. Bulk requests are applied in
+# chunks of SCIM_BULK_CHUNK_SIZE operations: one query loads the chunk's target users, one
+# checks its new userNames, and the chunk (audit entries included) is one flush and one
+# commit. A chunk that fails to commit is retried one operation at a time, so a single bad
+# row only fails itself. New users get no password (and no bcrypt hash): once their chunk
+# is committed a background worker mails them set-password links.
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, url_for
+from sqlalchemy import select
+from app.models import db, User, UNUSABLE_PASSWORD
+from app.services.audit_service import AuditService
+from app.services.auth_service import AuthService
+from app.services.email_service import EmailService
+from app.utils.tenancy import current_tenant, tenant_scope
+
+SCHEMA_USER = 'urn:ietf:params:scim:schemas:core:2.0:User'
+SCHEMA_LIST = 'urn:ietf:params:scim:api:messages:2.0:ListResponse'
+SCHEMA_PATCH = 'urn:ietf:params:scim:api:messages:2.0:PatchOp'
+SCHEMA_BULK_REQUEST = 'urn:ietf:params:scim:api:messages:2.0:BulkRequest'
+SCHEMA_BULK_RESPONSE = 'urn:ietf:params:scim:api:messages:2.0:BulkResponse'
+SCHEMA_ERROR = 'urn:ietf:params:scim:api:messages:2.0:Error'
+
+ROLES = ('user', 'admin')
+FILTER_RE = re.compile(r'^\s*userName\s+eq\s+"((?:[^"\\]|\\.)*)"\s*$', re.IGNORECASE)
+USER_PATH_RE = re.compile(r'^/Users/(bulkId:)?([^/]+)$')
+
+_executor = None
+_executor_pid = None
+_executor_lock = threading.Lock()
+
+
+class ScimError(Exception):
+    def __init__(self, status, detail, scim_type=None):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+        self.scim_type = scim_type
+
+    def to_dict(self):
+        body = {'schemas': [SCHEMA_ERROR], 'status': str(self.status), 'detail': self.detail}
+        if self.scim_type:
+            body['scimType'] = self.scim_type
+        return body
+
+
+def _bool(value):
+    # Some clients (Azure AD) send booleans as strings
+    if isinstance(value, str) and value.lower() in ('true', 'false'):
+        return value.lower() == 'true'
+    if not isinstance(value, bool):
+        raise ScimError(400, 'active must be a boolean', 'invalidValue')
+    return value
+
+
+def _string(value, name, max_length):
+    if not isinstance(value, str) or not value.strip():
+        raise ScimError(400, f'{name} must be a non-empty string', 'invalidValue')
+    if len(value.strip()) > max_length:
+        raise ScimError(400, f'{name} is longer than {max_length} characters', 'invalidValue')
+    return value.strip()
+
+
+def _user_name(data):
+    user_name = data.get('userName')
+    if user_name is None:
+        # userName is the email; accept the primary email when it is missing
+        emails = data.get('emails') or []
+        primary = [e for e in emails if isinstance(e, dict) and e.get('primary')] or emails
+        user_name = primary[0].get('value') if primary and isinstance(primary[0], dict) else None
+    if user_name is None:
+        return None
+    return _string(user_name, 'userName', 120).lower()
+
+
+def _role(value):
+    if isinstance(value, list):
+        value = value[0].get('value') if value and isinstance(value[0], dict) else None
+    if value not in ROLES:
+        raise ScimError(400, f'roles must be one of {", ".join(ROLES)}', 'invalidValue')
+    return value
+
+
+def _timestamp(value):
+    return value.isoformat() + 'Z' if value else None
+
+
+def _version(user):
+    return f'W/"{int(user.updated_at.timestamp() * 1000)}"' if user.updated_at else None
+
+
+class ProvisioningService:
+    @staticmethod
+    def to_scim(user):
+        return {
+            'schemas': [SCHEMA_USER],
+            'id': str(user.id),
+            'userName': user.email,
+            'name': {
+                'givenName': user.first_name,
+                'familyName': user.last_name,
+                'formatted': f'{user.first_name} {user.last_name}'
+            },
+            'displayName': f'{user.first_name} {user.last_name}',
+            'emails': [{'value': user.email, 'type': 'work', 'primary': True}],
+            'active': bool(user.is_active),
+            'roles': [{'value': user.role, 'primary': True}],
+            'meta': {
+                'resourceType': 'User',
+                'created': _timestamp(user.created_at),
+                'lastModified': _timestamp(user.updated_at),
+                'location': url_for('scim.get_user', user_id=user.id, _external=True),
+                'version': _version(user)
+            }
+        }
+
+    @staticmethod
+    def find_users(filter_expr, start_index, count):
+        """``(total, users)`` for a list request; only ``userName eq "..."`` filters are supported."""
+        query = User.query
+        if filter_expr:
+            match = FILTER_RE.match(filter_expr)
+            if not match:
+                raise ScimError(400, 'Only filters of the form userName eq "value" are supported', 'invalidFilter')
+            query = query.filter_by(email=match.group(1).replace('\\"', '"').lower())
+        total = query.count()
+        users = query.order_by(User.id).offset(max(start_index, 1) - 1).limit(count).all() if count else []
+        return total, users
+
+    @staticmethod
+    def create(data, taken=None):
+        """A new User from a SCIM resource, added to the session (not committed).
+
+        ``taken`` is the set of userNames known to exist; without it the database is asked.
+        """
+        user_name = _user_name(data)
+        if not user_name:
+            raise ScimError(400, 'userName is required', 'invalidValue')
+        exists = user_name in taken if taken is not None else \
+            db.session.query(User.id).filter_by(email=user_name).first() is not None
+        if exists:
+            raise ScimError(409, f'User {user_name} already exists', 'uniqueness')
+
+        # No temporary password: the invitation link lets them choose one
+        user = User(email=user_name, password_hash=UNUSABLE_PASSWORD, is_verified=True, first_login=False)
+        ProvisioningService._assign(user, ProvisioningService._changes(user, data, replace=True))
+        db.session.add(user)
+        if taken is not None:
+            taken.add(user_name)
+        return user
+
+    @staticmethod
+    def replace(user, data):
+        """PUT: every attribute the hub maps is taken from ``data``. Nothing is changed unless all of it is valid."""
+        changes = ProvisioningService._changes(user, data, replace=True)
+        user_name = _user_name(data)
+        if user_name and user_name != user.email:
+            ProvisioningService._check_unique(user_name)
+            changes['email'] = user_name
+        ProvisioningService._assign(user, changes)
+
+    @staticmethod
+    def patch(user, data):
+        """PATCH with a PatchOp body: add/replace of userName, name, active and roles. The
+        operations apply together, once every one of them is valid."""
+        if SCHEMA_PATCH not in (data.get('schemas') or []):
+            raise ScimError(400, f'PATCH requires the {SCHEMA_PATCH} schema', 'invalidSyntax')
+        operations = data.get('Operations')
+        if not isinstance(operations, list) or not operations or \
+                not all(isinstance(operation, dict) for operation in operations):
+            raise ScimError(400, 'Operations must be a non-empty list of objects', 'invalidSyntax')
+
+        pending = {}
+        for operation in operations:
+            op = str(operation.get('op', '')).lower()
+            path = operation.get('path')
+            value = operation.get('value')
+            if op == 'remove':
+                raise ScimError(400, 'Hub user attributes are required and cannot be removed', 'mutability')
+            if op not in ('add', 'replace'):
+                raise ScimError(400, f'Unsupported op: {op}', 'invalidSyntax')
+            if not path:
+                if not isinstance(value, dict):
+                    raise ScimError(400, 'An op without a path needs an object value', 'invalidValue')
+                changes = value
+            else:
+                # "name.givenName" -> {"name": {"givenName": value}}
+                head, _, tail = path.partition('.')
+                changes = {head: {tail: value}} if tail else {head: value}
+                if head not in ('userName', 'name', 'active', 'roles', 'emails'):
+                    raise ScimError(400, f'Unsupported path: {path}', 'noTarget')
+
+            user_name = _user_name(changes) if 'userName' in changes or 'emails' in changes else None
+            if user_name and user_name != pending.get('email', user.email):
+                if user_name != user.email:
+                    ProvisioningService._check_unique(user_name)
+                pending['email'] = user_name
+            pending.update(ProvisioningService._changes(user, changes))
+        ProvisioningService._assign(user, pending)
+
+    @staticmethod
+    def deactivate(user):
+        # Users are never deleted (their audit trail references them): DELETE deactivates
+        user.is_active = False
+
+    @staticmethod
+    def bulk(data, actor_id):
+        """Run a BulkRequest; returns the BulkResponse ``Operations`` list."""
+        operations = data.get('Operations')
+        if SCHEMA_BULK_REQUEST not in (data.get('schemas') or []) or not isinstance(operations, list) or \
+                not all(isinstance(operation, dict) for operation in operations):
+            raise ScimError(400, 'Expected a BulkRequest with an Operations list', 'invalidSyntax')
+        max_operations = current_app.config['SCIM_BULK_MAX_OPERATIONS']
+        if len(operations) > max_operations:
+            raise ScimError(413, f'The maximum number of operations is {max_operations}', 'tooMany')
+        fail_on_errors = data.get('failOnErrors')
+        chunk_size = current_app.config['SCIM_BULK_CHUNK_SIZE']
+
+        state = {'bulk_ids': {}, 'errors': 0, 'fail_on_errors': fail_on_errors}
+        results = []
+        for offset in range(0, len(operations), chunk_size):
+            if fail_on_errors and state['errors'] >= fail_on_errors:
+                break
+            results.extend(ProvisioningService._run_chunk(operations[offset:offset + chunk_size], state, actor_id))
+        return results
+
+    @staticmethod
+    def _run_chunk(operations, state, actor_id):
+        # Targets and userName conflicts for the whole chunk, one query each
+        ids = set()
+        user_names = set()
+        for operation in operations:
+            match = USER_PATH_RE.match(str(operation.get('path', '')))
+            if match and not match.group(1) and match.group(2).isdigit():
+                ids.add(int(match.group(2)))
+            if isinstance(operation.get('data'), dict):
+                try:
+                    user_name = _user_name(operation['data'])
+                except ScimError:
+                    user_name = None
+                if user_name:
+                    user_names.add(user_name)
+        users = {user.id: user for user in User.query.filter(User.id.in_(ids))} if ids else {}
+        taken = set(db.session.scalars(select(User.email).where(User.email.in_(user_names)))) if user_names else set()
+
+        applied = []
+        errors = 0
+        for operation in operations:
+            if state['fail_on_errors'] and state['errors'] + errors >= state['fail_on_errors']:
+                break
+            try:
+                applied.append((operation,) + ProvisioningService._apply_operation(operation, users, taken, state))
+            except ScimError as e:
+                errors += 1
+                applied.append((operation, None, None, e))
+
+        try:
+            db.session.flush()
+            for operation, user, action, error in applied:
+                if error is None:
+                    AuditService.log(actor_id, action, 'user', user.id, f"SCIM {operation['method'].upper()} {user.email}",
+                                     commit=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            for operation, user, _, error in applied:
+                if error is None and operation.get('bulkId'):
+                    state['bulk_ids'].pop(operation['bulkId'], None)
+            if len(operations) > 1:
+                # Find the operation(s) that broke the chunk: each on its own
+                results = []
+                for operation in operations:
+                    results.extend(ProvisioningService._run_chunk([operation], state, actor_id))
+                return results
+            current_app.logger.error(f'SCIM bulk operation failed: {str(e)}')
+            applied = [(operations[0], None, None, ScimError(409, 'The operation conflicts with existing data'))]
+            errors = 1
+
+        state['errors'] += errors
+        created = [user.id for _, user, action, error in applied if error is None and action == 'scim_user_created']
+        if created:
+            ProvisioningService.send_invitations(created)
+        return [ProvisioningService._result(*entry) for entry in applied]
+
+    @staticmethod
+    def _apply_operation(operation, users, taken, state):
+        """Apply one bulk operation to the session; ``(user, audit action, None)``."""
+        method = str(operation.get('method', '')).upper()
+        path = str(operation.get('path', ''))
+        data = operation.get('data') if isinstance(operation.get('data'), dict) else {}
+
+        if method == 'POST':
+            if path != '/Users':
+                raise ScimError(400, f'Unsupported path: {path}', 'invalidPath')
+            if not operation.get('bulkId'):
+                raise ScimError(400, 'POST operations require a bulkId', 'invalidSyntax')
+            user = ProvisioningService.create(data, taken)
+            state['bulk_ids'][operation['bulkId']] = user
+            return user, 'scim_user_created', None
+
+        match = USER_PATH_RE.match(path)
+        if method not in ('PUT', 'PATCH', 'DELETE') or not match:
+            raise ScimError(400, f'Unsupported operation: {method} {path}', 'invalidPath')
+        if match.group(1):
+            user = state['bulk_ids'].get(match.group(2))
+        else:
+            user = users.get(int(match.group(2))) if match.group(2).isdigit() else None
+        if user is None:
+            raise ScimError(404, f'Resource {match.group(2)} not found')
+
+        if method == 'PUT':
+            ProvisioningService.replace(user, data)
+            return user, 'scim_user_updated', None
+        if method == 'PATCH':
+            ProvisioningService.patch(user, data)
+            return user, 'scim_user_updated', None
+        ProvisioningService.deactivate(user)
+        return user, 'scim_user_deactivated', None
+
+    @staticmethod
+    def _result(operation, user, action, error):
+        result = {'method': str(operation.get('method', '')).upper()}
+        if operation.get('bulkId'):
+            result['bulkId'] = operation['bulkId']
+        if error is not None:
+            result['status'] = str(error.status)
+            result['response'] = error.to_dict()
+            return result
+        result['location'] = url_for('scim.get_user', user_id=user.id, _external=True)
+        result['status'] = {'scim_user_created': '201', 'scim_user_deactivated': '204'}.get(action, '200')
+        if action != 'scim_user_deactivated':
+            result['version'] = _version(user)
+        return result
+
+    @staticmethod
+    def _check_unique(user_name):
+        if db.session.query(User.id).filter_by(email=user_name).first() is not None:
+            raise ScimError(409, f'User {user_name} already exists', 'uniqueness')
+
+    @staticmethod
+    def _changes(user, data, replace=False):
+        """Validated ``{attribute: value}`` for the mapped attributes in ``data``; the user is not touched."""
+        changes = {}
+        name = data.get('name')
+        if name is not None and not isinstance(name, dict):
+            raise ScimError(400, 'name must be an object', 'invalidValue')
+        name = name or {}
+        if 'givenName' in name or replace:
+            changes['first_name'] = _string(name.get('givenName'), 'name.givenName', 50)
+        if 'familyName' in name or replace:
+            changes['last_name'] = _string(name.get('familyName'), 'name.familyName', 50)
+        if 'active' in data:
+            changes['is_active'] = _bool(data['active'])
+        elif replace and user.is_active is None:
+            changes['is_active'] = True
+        if 'roles' in data:
+            changes['role'] = _role(data['roles'])
+        elif replace and user.role is None:
+            changes['role'] = 'user'
+        return changes
+
+    @staticmethod
+    def _assign(user, changes):
+        # Only with every change validated: a rejected operation must leave nothing dirty in
+        # the session for the chunk's commit to write
+        for attribute, value in changes.items():
+            setattr(user, attribute, value)
+
+    @staticmethod
+    def send_invitations(user_ids):
+        """Mail new users a set-password link, on a background worker."""
+        app = current_app._get_current_object()
+        ProvisioningService._get_executor(app).submit(
+            ProvisioningService._send_invitations, app, current_tenant(), list(user_ids)
+        )
+
+    @staticmethod
+    def _get_executor(app):
+        global _executor, _executor_pid
+        # A pool inherited through fork has no live threads: build one per process
+        with _executor_lock:
+            if _executor is None or _executor_pid != os.getpid():
+                _executor_pid = os.getpid()
+                _executor = ThreadPoolExecutor(
+                    max_workers=app.config.get('SCIM_INVITATION_WORKERS', 2),
+                    thread_name_prefix='scim-invitations'
+                )
+        return _executor
+
+    @staticmethod
+    def _send_invitations(app, tenant_id, user_ids):
+        with app.app_context(), tenant_scope(tenant_id):
+            try:
+                users = db.session.execute(
+                    select(User.id, User.email, User.first_name)
+                    .where(User.id.in_(user_ids), User.password_hash == UNUSABLE_PASSWORD)
+                ).all()
+                expiry_hours = app.config['SCIM_INVITATION_EXPIRY_HOURS']
+                tokens = AuthService.generate_invitation_tokens([user.id for user in users], expiry_hours)
+                for user in users:
+                    EmailService.send_invitation_email(user.email, tokens[user.id], user.first_name, expiry_hours)
+            except Exception as e:
+                db.session.rollback()
+                # They can still get in through "forgot password"
+                app.logger.error(f"SCIM invitations for users {user_ids} failed: {str(e)}")
@@ -0,0 +1,172 @@
+# app/services/qr_service.py
+# Rendering for MFA enrollment QR codes. The encoding work happens in a small process
+# pool so an onboarding wave does not tie up request workers; qrcode and Pillow are only
+# ever imported by the pool processes (or lazily, when rendering in-process).
+import base64
+import hashlib
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from flask import current_app
+from app.utils.metrics import MFA_QR_RENDER_SECONDS, MFA_QR_SIZE_BYTES
+
+QR_FORMATS = ('png', 'svg')
+# The QR spec asks for a four module quiet zone; anything less fails on some scanners
+QR_BORDER = 4
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _warm():
+    import qrcode
+    import PIL.Image
+    import PIL.PngImagePlugin
+
+
+def render_qr(data, fmt, box_size):
+    """Render ``data`` as a QR code and return it as text (base64 PNG or SVG markup)."""
+    import qrcode
+
+    qr = qrcode.QRCode(border=QR_BORDER, box_size=box_size)
+    qr.add_data(data)
+    qr.make(fit=True)
+
+    if fmt == 'svg':
+        return _render_svg(qr.get_matrix(), box_size)
+
+    buffered = BytesIO()
+    # One bit per pixel: palette PNGs of a black and white code are several times larger
+    img = qr.make_image(fill_color="black", back_color="white").get_image().convert('1')
+    img.save(buffered, format="PNG", optimize=True)
+    return base64.b64encode(buffered.getvalue()).decode()
+
+
+def _render_svg(matrix, box_size):
+    # One path in module units with a subpath per horizontal run of dark modules.
+    # qrcode's own SVG factories emit a rect (or subpath) per module, several times larger.
+    runs = []
+    for y, row in enumerate(matrix):
+        x = 0
+        while x < len(row):
+            if not row[x]:
+                x += 1
+                continue
+            start = x
+            while x < len(row) and row[x]:
+                x += 1
+            runs.append(f"M{start} {y}h{x - start}v1h-{x - start}z")
+
+    size = len(matrix)
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{size * box_size}" height="{size * box_size}" '
+        f'viewBox="0 0 {size} {size}" shape-rendering="crispEdges">'
+        f'<rect width="{size}" height="{size}" fill="#fff"/><path d="{"".join(runs)}"/></svg>'
+    )
+
+
+class QRService:
+    @staticmethod
+    def render(provisioning_uri, fmt=None):
+        app = current_app._get_current_object()
+        fmt = fmt or app.config['MFA_QR_FORMAT']
+        if fmt not in QR_FORMATS:
+            raise ValueError(f"Unsupported QR code format: {fmt}")
+
+        # Keyed by digest: the URI carries the TOTP secret
+        key = (hashlib.sha256(provisioning_uri.encode()).hexdigest(), fmt)
+        cached = QRService._cache_get(app, key)
+        if cached is not None:
+            return cached
+
+        box_size = app.config['MFA_QR_BOX_SIZE']
+        start = time.perf_counter()
+        source = 'pool'
+        try:
+            pool = QRService._get_pool(app)
+            if pool is None:
+                source = 'inline'
+                image = render_qr(provisioning_uri, fmt, box_size)
+            else:
+                image = pool.submit(render_qr, provisioning_uri, fmt, box_size).result(
+                    timeout=app.config['MFA_QR_RENDER_TIMEOUT']
+                )
+        except (BrokenProcessPool, FutureTimeoutError) as e:
+            app.logger.error(f"QR render pool failed, rendering in-process: {str(e)}")
+            QRService._reset_pool()
+            source = 'inline'
+            image = render_qr(provisioning_uri, fmt, box_size)
+
+        MFA_QR_RENDER_SECONDS.labels(format=fmt, source=source).observe(time.perf_counter() - start)
+        MFA_QR_SIZE_BYTES.labels(format=fmt).observe(len(image))
+
+        QRService._cache_set(app, key, image)
+        return image
+
+    @staticmethod
+    def prewarm(app):
+        # Start the pool processes and import qrcode/Pillow in them before the first request
+        pool = QRService._get_pool(app)
+        if pool is not None:
+            for future in [pool.submit(_warm) for _ in range(app.config['MFA_QR_RENDER_WORKERS'])]:
+                future.result()
+
+    @staticmethod
+    def _get_pool(app):
+        global _pool, _pool_pid
+        workers = app.config.get('MFA_QR_RENDER_WORKERS', 0)
+        if workers <= 0:
+            return None
+        # Like the email executor: a pool inherited through fork is unusable, build one per process
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                _pool_pid = os.getpid()
+                # Not forked from here: this process runs threads (gthread workers, executors)
+                # whose locks a forked child could inherit held. The fork server starts
+                # children from a clean, single-threaded process
+                start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                _pool = ProcessPoolExecutor(
+                    max_workers=workers, mp_context=multiprocessing.get_context(start_method), initializer=_warm
+                )
+            return _pool
+
+    @staticmethod
+    def _reset_pool():
+        global _pool
+        with _pool_lock:
+            if _pool is not None and _pool_pid == os.getpid():
+                _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+    @staticmethod
+    def _cache_get(app, key):
+        with _cache_lock:
+            entry = _cache.get(key)
+            if entry is None:
+                return None
+            image, stored_at = entry
+            if time.monotonic() - stored_at > app.config['MFA_QR_CACHE_TTL']:
+                del _cache[key]
+                return None
+            _cache.move_to_end(key)
+            return image
+
+    @staticmethod
+    def _cache_set(app, key, image):
+        max_size = app.config['MFA_QR_CACHE_SIZE']
+        if max_size <= 0:
+            return
+        with _cache_lock:
+            _cache[key] = (image, time.monotonic())
+            _cache.move_to_end(key)
+            while len(_cache) > max_size:
+                _cache.popitem(last=False)
@@ -0,0 +1,209 @@
+# app/services/scheduler.py
+# Periodic maintenance jobs. Every serving process runs a scheduler thread, but a job
+# only runs where its job_locks row could be claimed: the claim is a conditional UPDATE
+# (lock free or lease expired, and the job's interval elapsed since the last run), so
+# exactly one worker in the deployment wins each run, on any database. The lock rows
+# live on the default database; the jobs themselves run against every tenant shard.
+import os
+import random
+import socket
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
+from app.models import db, User, AuditLog, JobLock, TokenBlocklist, UserChange
+from app.services.auth_service import AuthService
+from app.utils.batching import chunked_delete, chunked_update
+from app.utils.metrics import JOB_RUN_SECONDS, JOB_ROWS
+from app.utils.tenancy import shard_keys, shard_scope
+
+JOBS = OrderedDict()
+
+_scheduler_pid = None
+_scheduler_lock = threading.Lock()
+_job_rows_ready = False
+
+
+class Job:
+    def __init__(self, name, func, interval_key):
+        self.name = name
+        self.func = func
+        self.interval_key = interval_key
+        self.description = (func.__doc__ or '').strip()
+
+    def interval(self, app):
+        return app.config.get(self.interval_key, 0)
+
+
+def job(name, interval_key):
+    """Register a maintenance job; it runs every ``app.config[interval_key]`` seconds (0 disables it)."""
+    def decorator(func):
+        JOBS[name] = Job(name, func, interval_key)
+        return func
+    return decorator
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+@job('purge_token_blocklist', 'JOB_TOKEN_BLOCKLIST_INTERVAL')
+def purge_token_blocklist(app):
+    """Delete blocklist entries for tokens that have expired anyway."""
+    return chunked_delete(
+        TokenBlocklist, TokenBlocklist.expires_at < datetime.utcnow(),
+        app.config['JOB_BATCH_SIZE'], app.config['JOB_MAX_BATCHES']
+    )
+
+
+@job('purge_password_resets', 'PASSWORD_RESET_SWEEP_INTERVAL')
+def purge_password_resets(app):
+    """Delete used and expired password reset tokens."""
+    return AuthService.sweep_password_resets(app.config['JOB_BATCH_SIZE'], app.config['JOB_MAX_BATCHES'])
+
+
+@job('clear_expired_locks', 'JOB_EXPIRED_LOCKS_INTERVAL')
+def clear_expired_locks(app):
+    """Reset login attempts of accounts whose lockout has expired."""
+    # An expired lockout is not a profile change: keep updated_at (the column's onupdate
+    # default would otherwise bump it, even for a Core UPDATE)
+    return chunked_update(
+        User, User.locked_until <= datetime.utcnow(),
+        {'locked_until': None, 'login_attempts': 0, 'updated_at': User.updated_at},
+        app.config['JOB_BATCH_SIZE'], app.config['JOB_MAX_BATCHES']
+    )
+
+
+@job('purge_audit_logs', 'JOB_AUDIT_LOG_INTERVAL')
+def purge_audit_logs(app):
+    """Delete audit rows older than AUDIT_LOG_RETENTION_DAYS (0 keeps them forever)."""
+    retention_days = app.config['AUDIT_LOG_RETENTION_DAYS']
+    if retention_days <= 0:
+        return 0
+    return chunked_delete(
+        AuditLog, AuditLog.timestamp < datetime.utcnow() - timedelta(days=retention_days),
+        app.config['JOB_BATCH_SIZE'], app.config['JOB_MAX_BATCHES']
+    )
+
+
+@job('purge_user_changes', 'JOB_USER_CHANGES_INTERVAL')
+def purge_user_changes(app):
+    """Delete change feed rows older than USER_CHANGES_RETENTION_DAYS (0 keeps them forever)."""
+    retention_days = app.config['USER_CHANGES_RETENTION_DAYS']
+    if retention_days <= 0:
+        return 0
+    return chunked_delete(
+        UserChange, UserChange.created_at < datetime.utcnow() - timedelta(days=retention_days),
+        app.config['JOB_BATCH_SIZE'], app.config['JOB_MAX_BATCHES']
+    )
+
+
+def ensure_job_rows():
+    global _job_rows_ready
+    if _job_rows_ready:
+        return
+    existing = {name for (name,) in db.session.query(JobLock.name)}
+    for name in JOBS:
+        if name not in existing:
+            db.session.add(JobLock(name=name))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Another worker inserted the same rows first
+        db.session.rollback()
+    _job_rows_ready = True
+
+
+def claim(job, interval, lease, force=False):
+    now = datetime.utcnow()
+    conditions = [
+        JobLock.name == job.name,
+        or_(JobLock.locked_until.is_(None), JobLock.locked_until < now)
+    ]
+    if not force:
+        conditions.append(or_(JobLock.last_run_at.is_(None), JobLock.last_run_at <= now - timedelta(seconds=interval)))
+
+    claimed = db.session.execute(
+        update(JobLock).where(*conditions).values(locked_by=worker_id(), locked_until=now + timedelta(seconds=lease))
+    ).rowcount
+    db.session.commit()
+    return claimed == 1
+
+
+def release(job, status, duration, rows):
+    db.session.execute(
+        update(JobLock).where(JobLock.name == job.name, JobLock.locked_by == worker_id()).values(
+            locked_until=None,
+            last_run_at=datetime.utcnow(),
+            last_status=status,
+            last_duration_ms=int(duration * 1000),
+            last_rows=rows
+        )
+    )
+    db.session.commit()
+
+
+def run_job(app, job, force=False):
+    """Run ``job`` if this worker can claim it; returns (status, rows) or None if not claimed."""
+    ensure_job_rows()
+    if not claim(job, job.interval(app), app.config['JOB_LOCK_LEASE_SECONDS'], force):
+        return None
+
+    start = time.perf_counter()
+    status, rows = 'success', 0
+    try:
+        # Jobs clean up after every tenant: run them once per shard
+        for bind_key in shard_keys():
+            with shard_scope(bind_key):
+                rows += job.func(app) or 0
+    except Exception as e:
+        db.session.rollback()
+        app.logger.error(f"Scheduled job {job.name} failed: {str(e)}")
+        status = 'failed'
+    finally:
+        duration = time.perf_counter() - start
+        JOB_RUN_SECONDS.labels(job=job.name, status=status).observe(duration)
+        JOB_ROWS.labels(job=job.name).inc(rows)
+        release(job, status, duration, rows)
+
+    if rows:
+        app.logger.info(f"Scheduled job {job.name}: {rows} rows in {duration:.2f}s")
+    return status, rows
+
+
+def run_pending(app):
+    for job in JOBS.values():
+        if job.interval(app) > 0:
+            run_job(app, job)
+
+
+def _loop(app):
+    tick = app.config['SCHEDULER_TICK_SECONDS']
+    while True:
+        # Jittered so workers started together do not all poll the lock rows at once
+        time.sleep(tick * random.uniform(0.5, 1.5))
+        with app.app_context():
+            try:
+                run_pending(app)
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f"Scheduler tick failed: {str(e)}")
+
+
+def init_scheduler(app):
+    if not app.config.get('SCHEDULER_ENABLED'):
+        return
+
+    @app.before_request
+    def start_scheduler():
+        global _scheduler_pid
+        # Started on the first request rather than in create_app: a thread started in
+        # a preloading gunicorn master would not survive the fork into the workers
+        if _scheduler_pid == os.getpid():
+            return
+        with _scheduler_lock:
+            if _scheduler_pid != os.getpid():
+                _scheduler_pid = os.getpid()
+                threading.Thread(target=_loop, args=(app,), name='scheduler', daemon=True).start()
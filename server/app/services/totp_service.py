@@ -0,0 +1,181 @@
+# app/services/totp_service.py
+# RFC 6238 TOTP verification (SHA-1, 6 digits, 30s steps: the pyotp defaults used for
+# enrollment) with replay protection: a code is accepted only for a time step newer than
+# the last one the user authenticated with.
+import base64
+import hashlib
+import hmac
+import struct
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from flask import current_app
+from app.utils.metrics import MFA_VERIFICATIONS
+from app.utils.tenancy import current_tenant
+
+TOTP_INTERVAL = 30
+TOTP_DIGITS = 6
+# MFA_REPLAY_STORAGE_URL schemes with a replay store; memory:// is per process
+SHARED_REPLAY_SCHEMES = ('redis', 'rediss')
+REPLAY_SCHEMES = ('memory',) + SHARED_REPLAY_SCHEMES
+
+_window_cache = OrderedDict()
+_window_lock = threading.Lock()
+_replay_stores = {}
+_replay_stores_lock = threading.Lock()
+
+
+@lru_cache(maxsize=4096)
+def decode_secret(secret):
+    secret = secret.upper()
+    return base64.b32decode(secret + '=' * (-len(secret) % 8))
+
+
+def totp_code(key, step):
+    digest = hmac.new(key, struct.pack('>Q', step), hashlib.sha1).digest()
+    offset = digest[-1] & 0x0F
+    code = struct.unpack('>I', digest[offset:offset + 4])[0] & 0x7FFFFFFF
+    return str(code % 10 ** TOTP_DIGITS).zfill(TOTP_DIGITS)
+
+
+class MemoryReplayStore:
+    """Last used time step per user, for a single process."""
+
+    def __init__(self, ttl_steps):
+        self.ttl_steps = ttl_steps
+        self.steps = {}
+        self.pruned_at = 0
+        self.lock = threading.Lock()
+
+    def claim(self, user_id, step):
+        with self.lock:
+            if step <= self.steps.get(user_id, -1):
+                return False
+            self.steps[user_id] = step
+            if step - self.pruned_at >= self.ttl_steps:
+                self._prune(step)
+            return True
+
+    def _prune(self, step):
+        # Steps older than the window can never match again, so their entries are dead weight
+        self.steps = {uid: s for uid, s in self.steps.items() if s > step - self.ttl_steps}
+        self.pruned_at = step
+
+
+class RedisReplayStore:
+    """Last used time step per user, shared by every worker through Redis."""
+
+    # Compare-and-set so two workers cannot both accept the same code
+    CLAIM_SCRIPT = """
+    local last = tonumber(redis.call('GET', KEYS[1]) or '-1')
+    if tonumber(ARGV[1]) <= last then
+        return 0
+    end
+    redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+    return 1
+    """
+
+    def __init__(self, url, ttl_steps):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.claim_script = self.client.register_script(self.CLAIM_SCRIPT)
+        self.ttl = ttl_steps * TOTP_INTERVAL
+
+    def claim(self, user_id, step):
+        return bool(self.claim_script(keys=[f'mfa:last_step:{user_id}'], args=[step, self.ttl]))
+
+
+class TOTPService:
+    @staticmethod
+    def verify(secret, token, user_id=None, for_time=None):
+        """Check ``token`` against the current step +/- MFA_TOTP_WINDOW.
+
+        With a ``user_id`` the matched step is claimed in the replay store, and a code
+        for a step at or before the user's last successful one is rejected.
+        """
+        app = current_app._get_current_object()
+        step = int((for_time if for_time is not None else time.time()) // TOTP_INTERVAL)
+        matched = TOTPService._match(secret, token, step, app.config['MFA_TOTP_WINDOW'])
+
+        if matched is None:
+            MFA_VERIFICATIONS.labels(result='invalid').inc()
+            return False
+        # User ids repeat across tenant shards
+        if user_id is not None and not TOTPService._replay_store(app).claim(f'{current_tenant()}:{user_id}', matched):
+            MFA_VERIFICATIONS.labels(result='replay').inc()
+            return False
+        MFA_VERIFICATIONS.labels(result='valid').inc()
+        return True
+
+    @staticmethod
+    def verify_batch(attempts, for_time=None):
+        """Verify ``(user_id, secret, token)`` tuples against one clock reading (load tests)."""
+        for_time = for_time if for_time is not None else time.time()
+        return [TOTPService.verify(secret, token, user_id, for_time) for user_id, secret, token in attempts]
+
+    @staticmethod
+    def _match(secret, token, step, window):
+        if not token or len(token) != TOTP_DIGITS or not token.isdigit():
+            return None
+        codes = TOTPService._window_codes(secret, step, window)
+        matched = None
+        # Compare against every code so timing does not reveal which step matched
+        for code, code_step in codes:
+            if hmac.compare_digest(code, token) and matched is None:
+                matched = code_step
+        return matched
+
+    @staticmethod
+    def _window_codes(secret, step, window):
+        # Codes for the whole window are computed once per step and shared by every
+        # attempt in that step, instead of one HMAC per candidate on every request
+        key = (secret, step, window)
+        with _window_lock:
+            codes = _window_cache.get(key)
+            if codes is not None:
+                _window_cache.move_to_end(key)
+                return codes
+
+        try:
+            secret_key = decode_secret(secret)
+        except ValueError:
+            return ()
+        codes = tuple((totp_code(secret_key, s), s) for s in range(step - window, step + window + 1))
+
+        with _window_lock:
+            _window_cache[key] = codes
+            while len(_window_cache) > current_app.config['MFA_TOTP_CACHE_SIZE']:
+                _window_cache.popitem(last=False)
+        return codes
+
+    @staticmethod
+    def _replay_store(app):
+        url = app.config['MFA_REPLAY_STORAGE_URL']
+        with _replay_stores_lock:
+            store = _replay_stores.get(url)
+            if store is None:
+                # A step stays replayable until it falls out of the window
+                ttl_steps = 2 * app.config['MFA_TOTP_WINDOW'] + 2
+                if _scheme(url) in SHARED_REPLAY_SCHEMES:
+                    store = RedisReplayStore(url, ttl_steps)
+                else:
+                    store = MemoryReplayStore(ttl_steps)
+                _replay_stores[url] = store
+            return store
+
+
+def _scheme(url):
+    return url.partition('://')[0].lower()
+
+
+def init_totp(app):
+    # Any other scheme (redis+sentinel://, memcached://, ...) would quietly get a per-process
+    # store, so it is refused here rather than on the first MFA verification
+    url = app.config['MFA_REPLAY_STORAGE_URL']
+    if _scheme(url) not in REPLAY_SCHEMES:
+        raise RuntimeError(
+            f"MFA_REPLAY_STORAGE_URL={url} is not supported: use one of "
+            f"{', '.join(scheme + '://' for scheme in REPLAY_SCHEMES)} (set MFA_REPLAY_STORAGE_URL "
+            "when RATELIMIT_STORAGE_URL uses another store)"
+        )
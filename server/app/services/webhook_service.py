@@ -0,0 +1,375 @@
+# app/services/webhook_service.py
+# Identity event webhooks for company apps. User lifecycle and security events are derived
+# from User inserts/updates, whichever route made them, and queued in process once their
+# transaction commits: the request that caused them never waits on delivery. A dispatcher
+# thread per process fans events out to the tenant's subscribed apps, batches them per app
+# (WEBHOOK_BATCH_SIZE events, or whatever arrived within WEBHOOK_BATCH_WINDOW seconds) and
+# hands batches to a pool of delivery threads that keep connections alive between POSTs.
+# Each POST is signed with the app's client_secret; failed ones are retried with
+# exponential backoff, and each endpoint has at most WEBHOOK_MAX_CONCURRENCY deliveries in
+# flight. Events live in memory only: whatever is queued when a process dies is lost.
+# Webhook URLs are set by tenant admins, so the host is resolved when each connection is
+# opened and the connection goes to the address that was checked: loopback, private,
+# link-local and other non-public addresses are refused (WEBHOOK_ALLOW_PRIVATE_ADDRESSES
+# lifts this for local development), even for a name that resolved elsewhere when saved.
+import hashlib
+import heapq
+import hmac
+import ipaddress
+import json
+import os
+import queue
+import random
+import socket
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from app.models import db, User, CompanyApp, UNUSABLE_PASSWORD
+from app.utils.metrics import WEBHOOK_DELIVERIES, WEBHOOK_DELIVERY_SECONDS
+from app.utils.tenancy import tenant_scope
+
+EVENT_TYPES = (
+    'user.created', 'user.updated', 'user.deactivated', 'user.reactivated', 'user.role_changed',
+    'user.password_changed', 'user.locked', 'user.mfa_enabled', 'user.mfa_disabled'
+)
+PROFILE_FIELDS = ('email', 'first_name', 'last_name')
+SIGNATURE_HEADER = 'X-Hub-Signature'
+
+_events = queue.Queue()
+_state_lock = threading.Lock()
+_outboxes = {}
+_retries = []
+_inflight = defaultdict(int)
+_subscriptions = {}
+_local = threading.local()
+_wake = threading.Event()
+_dispatcher_pid = None
+_dispatcher_lock = threading.Lock()
+_executor = None
+
+
+def sign(secret, timestamp, body):
+    """Signature header value: HMAC-SHA256 of ``"<timestamp>.<body>"`` keyed with the app's client_secret."""
+    digest = hmac.new(secret.encode(), f'{timestamp}.'.encode() + body, hashlib.sha256).hexdigest()
+    return f't={timestamp},v1={digest}'
+
+
+class BlockedAddress(ValueError):
+    """The webhook host resolves to an address deliveries may not go to."""
+
+
+def public_address(host, port):
+    """The first address of ``host``, refused unless every address it resolves to is public."""
+    addresses = [info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)]
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split('%', 1)[0])
+        ip = getattr(ip, 'ipv4_mapped', None) or ip
+        if not ip.is_global or ip.is_multicast:
+            raise BlockedAddress(f'{host} resolves to non-public address {address}')
+    return addresses[0]
+
+
+class _PublicOnly:
+    def _new_conn(self):
+        # Resolved and checked here, then connected to by address: a DNS answer that changes
+        # in between cannot redirect the request. TLS still verifies the certificate for the host
+        host = self._dns_host
+        self._dns_host = public_address(host, self.port)
+        try:
+            return super()._new_conn()
+        finally:
+            self._dns_host = host
+
+
+class _PublicHTTPConnection(_PublicOnly, HTTPConnection):
+    pass
+
+
+class _PublicHTTPSConnection(_PublicOnly, HTTPSConnection):
+    pass
+
+
+class _PublicHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _PublicHTTPConnection
+
+
+class _PublicHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _PublicHTTPSConnection
+
+
+class PublicOnlyAdapter(HTTPAdapter):
+    """Refuses connections to non-public addresses (BlockedAddress)."""
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _PublicHTTPConnectionPool, 'https': _PublicHTTPSConnectionPool
+        }
+
+
+class WebhookService:
+    @staticmethod
+    def subscribes_to(events, event_type):
+        return not events or event_type in events
+
+    @staticmethod
+    def invalidate(tenant_id):
+        """Forget the cached subscribers of ``tenant_id``; other processes see the change within WEBHOOK_SUBSCRIPTION_TTL."""
+        _subscriptions.pop(tenant_id, None)
+
+    @staticmethod
+    def pending():
+        """Events and batches not delivered yet (queued, batching, in flight or awaiting retry)."""
+        with _state_lock:
+            return (_events.qsize() + sum(len(outbox['events']) for outbox in _outboxes.values())
+                    + len(_retries) + sum(_inflight.values()))
+
+
+def _changed(state, field):
+    history = state.attrs[field].history
+    if history.added and list(history.added) != list(history.deleted):
+        return (history.deleted[0] if history.deleted else None), history.added[0]
+    return None
+
+
+def _stage(target, event_type, data):
+    Session.object_session(target).info.setdefault('webhook_events', []).append({
+        'id': uuid.uuid4().hex,
+        'type': event_type,
+        'occurred_at': datetime.utcnow().isoformat() + 'Z',
+        'tenant_id': target.tenant_id,
+        'user': {'id': target.id, 'email': target.email},
+        'data': data
+    })
+
+
+def _user_inserted(mapper, connection, target):
+    _stage(target, 'user.created', {
+        'first_name': target.first_name,
+        'last_name': target.last_name,
+        'role': target.role,
+        'is_active': target.is_active
+    })
+
+
+def _user_updated(mapper, connection, target):
+    state = inspect(target)
+    change = _changed(state, 'is_active')
+    if change:
+        _stage(target, 'user.reactivated' if change[1] else 'user.deactivated', {})
+    change = _changed(state, 'role')
+    if change:
+        _stage(target, 'user.role_changed', {'from': change[0], 'to': change[1]})
+    profile = {field: change[1] for field in PROFILE_FIELDS if (change := _changed(state, field))}
+    if profile:
+        _stage(target, 'user.updated', profile)
+    change = _changed(state, 'password_hash')
+    # set_password stamps password_changed_at; a rehash of the same password does not
+    if change and change[1] != UNUSABLE_PASSWORD and _changed(state, 'password_changed_at'):
+        _stage(target, 'user.password_changed', {})
+    change = _changed(state, 'locked_until')
+    if change and change[1] is not None and change[0] is None:
+        _stage(target, 'user.locked', {'until': change[1].isoformat() + 'Z'})
+    change = _changed(state, 'mfa_enabled')
+    if change:
+        _stage(target, 'user.mfa_enabled' if change[1] else 'user.mfa_disabled', {})
+
+
+def _after_commit(session):
+    staged = session.info.pop('webhook_events', None)
+    if not staged:
+        return
+    for webhook_event in staged:
+        try:
+            _events.put_nowait(webhook_event)
+        except queue.Full:
+            # Dispatcher far behind (or endpoints down for long): shed rather than grow without bound
+            WEBHOOK_DELIVERIES.labels(status='dropped').inc()
+    _wake.set()
+
+
+def _after_rollback(session):
+    session.info.pop('webhook_events', None)
+
+
+def _subscribers(app, tenant_id):
+    # (app id, url, secret, events) of the tenant's apps with a webhook, cached for a while
+    cached = _subscriptions.get(tenant_id)
+    if cached and time.monotonic() - cached[0] < app.config['WEBHOOK_SUBSCRIPTION_TTL']:
+        return cached[1]
+    with app.app_context(), tenant_scope(tenant_id):
+        rows = db.session.execute(
+            select(CompanyApp.id, CompanyApp.webhook_url, CompanyApp.webhook_events, CompanyApp.client_secret)
+            .where(CompanyApp.is_active == True, CompanyApp.webhook_url.isnot(None))
+        ).all()
+    subscribers = [(row.id, row.webhook_url, set(row.webhook_events or ()), row.client_secret) for row in rows]
+    _subscriptions[tenant_id] = (time.monotonic(), subscribers)
+    return subscribers
+
+
+def _route(app, webhook_event):
+    now = time.monotonic()
+    for app_id, url, events, secret in _subscribers(app, webhook_event['tenant_id']):
+        if not WebhookService.subscribes_to(events, webhook_event['type']):
+            continue
+        with _state_lock:
+            outbox = _outboxes.setdefault((webhook_event['tenant_id'], app_id), {'events': [], 'since': now})
+            if not outbox['events']:
+                outbox['since'] = now
+            outbox.update(url=url, secret=secret)
+            outbox['events'].append(webhook_event)
+
+
+def _submit(app, batch):
+    # Caller holds _state_lock
+    _inflight[batch['url']] += 1
+    future = _executor.submit(_deliver, app, batch)
+    future.add_done_callback(lambda f: _delivered(app, batch, f))
+
+
+def _send_ready(app):
+    config = app.config
+    now = time.monotonic()
+    batch_size = config['WEBHOOK_BATCH_SIZE']
+    max_concurrency = config['WEBHOOK_MAX_CONCURRENCY']
+    with _state_lock:
+        # Retries first: they have waited longest
+        postponed = []
+        while _retries and _retries[0][0] <= now:
+            entry = heapq.heappop(_retries)
+            if _inflight[entry[2]['url']] < max_concurrency:
+                _submit(app, entry[2])
+            else:
+                postponed.append(entry)
+        for entry in postponed:
+            heapq.heappush(_retries, entry)
+
+        for (tenant_id, app_id), outbox in _outboxes.items():
+            events = outbox['events']
+            if not events or (len(events) < batch_size and now - outbox['since'] < config['WEBHOOK_BATCH_WINDOW']):
+                continue
+            while events and _inflight[outbox['url']] < max_concurrency:
+                batch, outbox['events'] = events[:batch_size], events[batch_size:]
+                events = outbox['events']
+                outbox['since'] = now
+                _submit(app, {
+                    'id': uuid.uuid4().hex,
+                    'tenant_id': tenant_id,
+                    'app_id': app_id,
+                    'url': outbox['url'],
+                    'secret': outbox['secret'],
+                    'events': batch,
+                    'attempt': 0
+                })
+
+
+def _http_session(app):
+    # One keep-alive session per delivery thread
+    session = getattr(_local, 'session', None)
+    if session is None:
+        session = _local.session = requests.Session()
+        adapter_class = HTTPAdapter
+        if not app.config['WEBHOOK_ALLOW_PRIVATE_ADDRESSES']:
+            # Also redirects. A proxy from the environment would be the address checked instead
+            adapter_class = PublicOnlyAdapter
+            session.trust_env = False
+        adapter = adapter_class(pool_connections=16, pool_maxsize=app.config['WEBHOOK_MAX_CONCURRENCY'])
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+    return session
+
+
+def _deliver(app, batch):
+    body = json.dumps({'delivery_id': batch['id'], 'app_id': batch['app_id'], 'events': batch['events']}).encode()
+    timestamp = str(int(time.time()))
+    start = time.perf_counter()
+    response = _http_session(app).post(batch['url'], data=body, timeout=app.config['WEBHOOK_TIMEOUT'], headers={
+        'Content-Type': 'application/json',
+        'User-Agent': 'CompanyHub-Webhooks/1.0',
+        'X-Hub-Delivery': batch['id'],
+        'X-Hub-Timestamp': timestamp,
+        SIGNATURE_HEADER: sign(batch['secret'], timestamp, body)
+    })
+    WEBHOOK_DELIVERY_SECONDS.observe(time.perf_counter() - start)
+    return response.status_code
+
+
+def _delivered(app, batch, future):
+    config = app.config
+    error = future.exception()
+    status_code = None if error else future.result()
+    with _state_lock:
+        _inflight[batch['url']] -= 1
+
+        if status_code is not None and 200 <= status_code < 300:
+            status = 'delivered'
+        elif isinstance(error, BlockedAddress) or (
+            status_code is not None and 400 <= status_code < 500 and status_code not in (408, 429)
+        ):
+            # The endpoint refused the payload itself, or may not be sent to: sending it again will not help
+            status = 'rejected'
+        elif batch['attempt'] + 1 < config['WEBHOOK_MAX_ATTEMPTS']:
+            status = 'retried'
+            delay = min(config['WEBHOOK_RETRY_BASE_DELAY'] * 2 ** batch['attempt'], config['WEBHOOK_RETRY_MAX_DELAY'])
+            batch['attempt'] += 1
+            heapq.heappush(_retries, (time.monotonic() + delay * random.uniform(0.5, 1.5), batch['id'], batch))
+        else:
+            status = 'failed'
+    WEBHOOK_DELIVERIES.labels(status=status).inc()
+    if status in ('rejected', 'failed'):
+        app.logger.error(
+            f"Webhook delivery {batch['id']} to app {batch['app_id']} {status} after {batch['attempt'] + 1} "
+            f"attempt(s): {error or status_code}"
+        )
+    _wake.set()
+
+
+def _dispatch_loop(app):
+    tick = app.config['WEBHOOK_BATCH_WINDOW'] / 4
+    while True:
+        _wake.wait(tick)
+        _wake.clear()
+        try:
+            while True:
+                try:
+                    _route(app, _events.get_nowait())
+                except queue.Empty:
+                    break
+            _send_ready(app)
+        except Exception as e:
+            app.logger.error(f"Webhook dispatch failed: {str(e)}")
+
+
+def init_webhooks(app):
+    global _events
+    if not app.config.get('WEBHOOK_ENABLED', True):
+        return
+
+    _events = queue.Queue(maxsize=app.config['WEBHOOK_MAX_QUEUE'])
+    if not event.contains(User, 'after_insert', _user_inserted):
+        event.listen(User, 'after_insert', _user_inserted)
+        event.listen(User, 'after_update', _user_updated)
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_rollback', _after_rollback)
+
+    @app.before_request
+    def start_webhook_dispatcher():
+        global _dispatcher_pid, _executor
+        # One dispatcher and delivery pool per process (see init_scheduler)
+        if _dispatcher_pid == os.getpid():
+            return
+        with _dispatcher_lock:
+            if _dispatcher_pid != os.getpid():
+                _dispatcher_pid = os.getpid()
+                _executor = ThreadPoolExecutor(
+                    max_workers=app.config['WEBHOOK_WORKERS'], thread_name_prefix='webhook'
+                )
+                threading.Thread(target=_dispatch_loop, args=(app,), name='webhook-dispatch', daemon=True).start()
@@ -0,0 +1,34 @@
+# app/utils/batching.py
+from sqlalchemy import delete, select, update
+from app.extensions import db
+
+
+def _chunked(model, condition, statement, batch_size, max_batches):
+    # Rows are picked by primary key in small batches and each batch is its own
+    # transaction, so a large backlog never holds long locks or one huge transaction
+    total = 0
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        ids = select(model.id).where(condition).limit(batch_size).scalar_subquery()
+        count = db.session.execute(
+            statement.where(model.id.in_(ids)).execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+        total += count
+        batches += 1
+        if count < batch_size:
+            break
+    return total
+
+
+def chunked_delete(model, condition, batch_size, max_batches=None):
+    """Delete rows matching ``condition`` in batches; returns the number deleted."""
+    return _chunked(model, condition, delete(model), batch_size, max_batches)
+
+
+def chunked_update(model, condition, values, batch_size, max_batches=None):
+    """Update rows matching ``condition`` in batches; returns the number updated.
+
+    ``condition`` must stop matching once ``values`` are applied, or this never ends.
+    """
+    return _chunked(model, condition, update(model).values(**values), batch_size, max_batches)
@@ -0,0 +1,209 @@
+# app/utils/breached_passwords.py
+# Known-breached passwords, checked offline. A SHA-1 hash dump (Have I Been Pwned's
+# "HASH:count" lines, or any list of SHA-1 hex digests) is built once, with
+# `flask passwords build-breached`, into a blocked Bloom filter file: every hash sets k bits
+# in one 64-byte block, so a lookup reads a single cache line (and at most one page). The
+# file is memory-mapped read-only: workers share it through the page cache and only touch
+# the pages their lookups hit. False positives (a fresh password reported as breached) occur
+# at the rate the filter was built for; breached passwords are always reported.
+# SHA-1 digests are already uniform, so the block and bit positions are read straight from
+# the digest instead of hashing again.
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from math import ceil, log
+from flask import current_app
+
+MAGIC = b'CHBLOOM1'
+HEADER = struct.Struct('<8sIIQQ')  # magic, block bytes, k, blocks, entries
+BLOCK_BYTES = 64
+BLOCK_BITS = BLOCK_BYTES * 8
+PROBE_BITS = 9  # log2(BLOCK_BITS)
+MAX_HASHES = 96 // PROBE_BITS  # probes come from the digest's last 12 bytes
+
+_filter = None
+_filter_lock = threading.Lock()
+_checked_at = None
+
+
+def filter_size(entries, fp_rate):
+    """``(blocks, k)`` for ``entries`` hashes at about ``fp_rate`` false positives."""
+    # Blocking costs some accuracy: 10% more bits than a classic Bloom filter makes up for it
+    bits = -max(entries, 1) * log(fp_rate) / log(2) ** 2 * 1.1
+    k = min(max(round(-log(fp_rate) / log(2)), 1), MAX_HASHES)
+    return max(ceil(bits / BLOCK_BITS), 1), k
+
+
+def _probe(digest, blocks, k):
+    """Block index and bit mask of one SHA-1 digest."""
+    # Big-endian, so the block can also be read off the hex digest (see _in_range)
+    block = int.from_bytes(digest[:8], 'big') % blocks
+    probes = int.from_bytes(digest[8:20], 'little')
+    mask = 0
+    for _ in range(k):
+        mask |= 1 << (probes & (BLOCK_BITS - 1))
+        probes >>= PROBE_BITS
+    return block, mask
+
+
+class BloomFilter:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            stat = os.fstat(f.fileno())
+        self.identity = (stat.st_ino, stat.st_mtime_ns)
+        magic, block_bytes, self.k, self.blocks, self.entries = HEADER.unpack_from(self.map)
+        if magic != MAGIC or block_bytes != BLOCK_BYTES:
+            raise ValueError(f'{path} is not a breached password filter')
+        if len(self.map) < HEADER.size + self.blocks * BLOCK_BYTES:
+            raise ValueError(f'{path} is truncated')
+        if hasattr(self.map, 'madvise'):
+            # Lookups land anywhere: read-ahead would only evict other pages
+            self.map.madvise(mmap.MADV_RANDOM)
+
+    def contains_digest(self, digest):
+        block, mask = _probe(digest, self.blocks, self.k)
+        offset = HEADER.size + block * BLOCK_BYTES
+        return int.from_bytes(self.map[offset:offset + BLOCK_BYTES], 'little') & mask == mask
+
+    def __contains__(self, password):
+        return self.contains_digest(hashlib.sha1(password.encode('utf-8')).digest())
+
+    def close(self):
+        self.map.close()
+
+
+def _fill(digests, blocks, k, first=0, count=None, progress=None):
+    """Bits of blocks ``first`` to ``first + count`` (all by default) set by ``digests``; returns them and how many digests landed there."""
+    count = blocks - first if count is None else count
+    bits = bytearray(count * BLOCK_BYTES)
+    added = 0
+    for digest in digests:
+        # Parallel builds see every digest: skip other ranges before working out the mask
+        if not first <= int.from_bytes(digest[:8], 'big') % blocks < first + count:
+            continue
+        block, mask = _probe(digest, blocks, k)
+        block -= first
+        offset = block * BLOCK_BYTES
+        bits[offset:offset + BLOCK_BYTES] = (
+            int.from_bytes(bits[offset:offset + BLOCK_BYTES], 'little') | mask
+        ).to_bytes(BLOCK_BYTES, 'little')
+        added += 1
+        if progress and added % 10_000_000 == 0:
+            progress(added)
+    return bits, added
+
+
+def _write(path, blocks, k, entries, slices):
+    # Written beside the target and renamed over it: running workers keep their old mapping
+    # until they reopen
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    with open(tmp_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, BLOCK_BYTES, k, blocks, entries))
+        for bits in slices:
+            f.write(bits)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def build_filter(digests, entries, path, fp_rate, progress=None):
+    """Write a filter sized for ``entries`` from an iterable of 20-byte SHA-1 digests."""
+    blocks, k = filter_size(entries, fp_rate)
+    bits, added = _fill(digests, blocks, k, progress=progress)
+    _write(path, blocks, k, added, [bits])
+    return added, blocks, k
+
+
+def _in_range(lines, blocks, first, count):
+    # Dump lines whose block is in the range, from the hex prefix: far cheaper than parsing
+    # every line a worker is going to skip
+    for line in lines:
+        try:
+            if first <= int(line[:16], 16) % blocks < first + count:
+                yield line
+        except ValueError:
+            continue
+
+
+def _fill_from_file(source, plaintext, min_count, blocks, k, first, count):
+    with open(source, 'rb', buffering=1 << 20) as lines:
+        if not plaintext:
+            lines = _in_range(lines, blocks, first, count)
+        return _fill(read_digests(lines, plaintext, min_count), blocks, k, first, count)
+
+
+def build_filter_from_file(source, entries, path, fp_rate, workers=1, plaintext=False, min_count=1, progress=None):
+    """Like build_filter, from a dump file, on ``workers`` processes: each reads the whole
+    file but only sets the bits of its own range of blocks, so memory stays at one filter."""
+    blocks, k = filter_size(entries, fp_rate)
+    if workers <= 1:
+        with open(source, 'rb', buffering=1 << 20) as lines:
+            bits, added = _fill(read_digests(lines, plaintext, min_count), blocks, k, progress=progress)
+        _write(path, blocks, k, added, [bits])
+        return added, blocks, k
+
+    import multiprocessing
+    share = ceil(blocks / workers)
+    ranges = [(first, min(share, blocks - first)) for first in range(0, blocks, share)]
+    with multiprocessing.Pool(len(ranges)) as pool:
+        results = pool.starmap(_fill_from_file, [
+            (source, plaintext, min_count, blocks, k, first, count) for first, count in ranges
+        ])
+    added = sum(added for _, added in results)
+    _write(path, blocks, k, added, [bits for bits, _ in results])
+    return added, blocks, k
+
+
+def read_digests(lines, plaintext=False, min_count=1):
+    """SHA-1 digests from dump lines (``HASH`` or ``HASH:count``), or of the lines themselves with ``plaintext``."""
+    for line in lines:
+        line = line.rstrip(b'\r\n')
+        if not line:
+            continue
+        if plaintext:
+            yield hashlib.sha1(line).digest()
+            continue
+        if min_count > 1:
+            count = line[41:]
+            if count and int(count) < min_count:
+                continue
+        try:
+            yield bytes.fromhex(line[:40].decode('ascii'))
+        except ValueError:
+            continue
+
+
+def get_filter(app=None):
+    """This process's mapping of BREACHED_PASSWORDS_FILE, reopened when the file is rebuilt; None when there is none."""
+    global _filter, _checked_at
+    config = (app or current_app).config
+    path = config.get('BREACHED_PASSWORDS_FILE')
+    if not path:
+        return None
+    now = time.monotonic()
+    recheck = config['BREACHED_PASSWORDS_RECHECK']
+    if _checked_at is not None and now - _checked_at < recheck:
+        return _filter
+    with _filter_lock:
+        if _checked_at is not None and now - _checked_at < recheck:
+            return _filter
+        _checked_at = now
+        try:
+            stat = os.stat(path)
+            if _filter is None or _filter.identity != (stat.st_ino, stat.st_mtime_ns):
+                # The old mapping is left to the garbage collector: a lookup may still be reading it
+                _filter = BloomFilter(path)
+        except (OSError, ValueError) as e:
+            # Keeps the mapping it had, if any
+            (app or current_app).logger.error(f'Breached password filter unavailable: {str(e)}')
+    return _filter
+
+
+def is_breached(password):
+    """Whether ``password`` is in the breached password filter (False when none is configured)."""
+    breached = get_filter()
+    return breached is not None and password in breached
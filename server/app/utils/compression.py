@@ -0,0 +1,107 @@
+# app/utils/compression.py
+# Response compression negotiated from the client's accepted encodings: brotli when the
+# brotli package is installed and the client accepts it, gzip otherwise. Small bodies are
+# sent as is (below COMPRESSION_MIN_SIZE the framing costs more than it saves) and streamed
+# responses are compressed chunk by chunk, flushed so every chunk still goes out at once.
+import zlib
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/json', 'text/', 'image/svg+xml', 'application/javascript')
+
+
+class GzipStream:
+    def __init__(self, level):
+        # wbits=31: zlib stream with a gzip header and trailer
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self.compressor.flush()
+
+
+class BrotliStream:
+    def __init__(self, quality):
+        self.compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self.compressor.process(data) + self.compressor.flush()
+
+    def finish(self):
+        return self.compressor.finish()
+
+
+def negotiate_encoding():
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return request.accept_encodings.best_match(offered)
+
+
+def compress_body(data, encoding, config):
+    if encoding == 'br':
+        return brotli.compress(data, quality=config['COMPRESSION_BROTLI_QUALITY'])
+    return zlib.compress(data, config['COMPRESSION_LEVEL'], wbits=31)
+
+
+def open_stream(encoding, config):
+    if encoding == 'br':
+        return BrotliStream(config['COMPRESSION_BROTLI_QUALITY'])
+    return GzipStream(config['COMPRESSION_LEVEL'])
+
+
+def _compressed_chunks(stream, chunks):
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            if chunk:
+                yield stream.compress(chunk)
+        yield stream.finish()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def _should_compress(response):
+    if response.status_code < 200 or response.status_code in (204, 304):
+        return False
+    if 'Content-Encoding' in response.headers or request.method == 'HEAD':
+        return False
+    return (response.mimetype or '').startswith(COMPRESSIBLE_TYPES)
+
+
+def init_compression(app):
+    if not app.config.get('COMPRESSION_ENABLED', True):
+        return
+
+    @app.after_request
+    def compress_response(response):
+        if not _should_compress(response):
+            return response
+        response.vary.add('Accept-Encoding')
+
+        encoding = negotiate_encoding()
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = _compressed_chunks(open_stream(encoding, app.config), response.response)
+            response.direct_passthrough = False
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < app.config['COMPRESSION_MIN_SIZE']:
+                return response
+            response.set_data(compress_body(data, encoding, app.config))
+
+        response.headers['Content-Encoding'] = encoding
+        # The compressed bytes differ per encoding, so a strong validator would be wrong
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -2,8 +2,9 @@ from functools import wraps
 from flask import jsonify, request, current_app
 from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity, get_jwt
 from marshmallow import ValidationError
-from app.models import User
 from app.extensions import limiter
+from app.utils.tenancy import tenant_scope, token_tenant
+from app.utils.user_status import user_status
 
 def role_required(required_role):
     def decorator(f):
@@ -12,14 +13,18 @@ def role_required(required_role):
             try:
                 verify_jwt_in_request()
                 current_user_id = get_jwt_identity()
-                user = User.query.get(current_user_id)
+                # The user row lives in their own tenant, whichever tenant the request targets.
+                # The host's status snapshot answers without a query (see user_status)
+                with tenant_scope(token_tenant()):
+                    status = user_status(current_user_id)
                 
-                if not user:
-                    return jsonify({"error": "User not found"}), 404
+                if status is None or not status.is_active:
+                    return jsonify({"error": "User not found or inactive"}), 404
+                role = status.role
                 
                 # Role hierarchy: super_admin > admin > user
                 role_hierarchy = {'user': 0, 'admin': 1, 'super_admin': 2}
-                user_role_level = role_hierarchy.get(user.role, 0)
+                user_role_level = role_hierarchy.get(role, 0)
                 required_role_level = role_hierarchy.get(required_role, 0)
                 
                 if user_role_level < required_role_level:
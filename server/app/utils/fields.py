@@ -0,0 +1,20 @@
+# app/utils/fields.py
+from flask import request
+
+
+def requested_fields(allowed):
+    """Fields picked with ``?fields=id,email``, or None for all. Raises ValueError on unknown names."""
+    raw = request.args.get('fields', '')
+    fields = [field.strip() for field in raw.split(',') if field.strip()]
+    if not fields:
+        return None
+    unknown = [field for field in fields if field not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Allowed: {', '.join(allowed)}")
+    return fields
+
+
+def pick(data, fields):
+    if fields is None:
+        return data
+    return {field: data[field] for field in fields}
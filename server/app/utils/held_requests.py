@@ -0,0 +1,48 @@
+# app/utils/held_requests.py
+# Requests the Flask app holds open (audit stream, change feed long-polls) each keep a
+# worker thread for up to WSGI_MAX_HOLD_SECONDS. At most WSGI_MAX_HELD_REQUESTS of them are
+# held per process so the remaining threads keep serving everything else; beyond that the
+# client is answered 503 with a Retry-After. The ASGI front holds them on its event loop
+# and does not count here.
+import os
+import threading
+from flask import current_app, jsonify
+
+_slots = None
+_slots_key = None
+_slots_lock = threading.Lock()
+
+
+def _semaphore():
+    global _slots, _slots_key
+    key = (os.getpid(), current_app.config['WSGI_MAX_HELD_REQUESTS'])
+    with _slots_lock:
+        if _slots_key != key:
+            _slots = threading.BoundedSemaphore(key[1])
+            _slots_key = key
+        return _slots
+
+
+def hold():
+    """Take a held-request slot: returns the callable that gives it back (safe to call more
+    than once), or None when every slot is taken."""
+    slots = _semaphore()
+    if not slots.acquire(blocking=False):
+        return None
+    released = []
+
+    def release():
+        with _slots_lock:
+            if released:
+                return
+            released.append(True)
+        slots.release()
+
+    return release
+
+
+def busy_response():
+    response = jsonify({'error': 'Too many open connections, retry later'})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(current_app.config['WSGI_HELD_RETRY_AFTER'])
+    return response
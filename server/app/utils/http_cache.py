@@ -0,0 +1,179 @@
+# app/utils/http_cache.py
+# Conditional GETs for rarely changing resources. A route declares the row versions its
+# body is built from; the ETag is derived from them, and a matching If-None-Match (or
+# If-Modified-Since) is answered with 304 before the view runs, so nothing is loaded or
+# serialized. Versions are cached per process for HTTP_CACHE_VERSION_TTL seconds and
+# dropped as soon as a local commit changes the row, so a cached 304 costs no query at
+# all; changes made by other workers show up within the TTL.
+import hashlib
+import threading
+import time
+from datetime import datetime
+from functools import wraps
+from flask import current_app, make_response, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+from app.models import db, User, UserOnboarding, CompanyApp
+from app.services.activity_service import ActivityService
+from app.utils.tenancy import current_tenant
+
+_versions = {}
+_versions_lock = threading.Lock()
+
+
+def make_etag(*parts):
+    return hashlib.blake2b(repr(parts).encode(), digest_size=12).hexdigest()
+
+
+def view_etag(endpoint, *versions):
+    # Whose view it is, too: equal row versions of two users (or tenants) never share an ETag
+    return make_etag(endpoint, current_tenant(), get_jwt_identity(), *versions)
+
+
+def cached_version(key, load):
+    """Return the version stored under ``key``, calling ``load`` on a miss or after the TTL."""
+    ttl = current_app.config['HTTP_CACHE_VERSION_TTL']
+    now = time.monotonic()
+    with _versions_lock:
+        entry = _versions.get(key)
+    if entry is not None and now - entry[1] <= ttl:
+        return entry[0]
+
+    version = load()
+    if version is not None and ttl > 0:
+        with _versions_lock:
+            _versions[key] = (version, now)
+    return version
+
+
+def invalidate(*keys):
+    with _versions_lock:
+        for key in keys:
+            _versions.pop(key, None)
+
+
+def user_version():
+    user_id = get_jwt_identity()
+    row = cached_version(
+        f'user:{current_tenant()}:{user_id}',
+        lambda: db.session.execute(select(User.updated_at, User.last_login).where(User.id == user_id)).one_or_none()
+    )
+    # No row: let the view produce its 404
+    if row is None:
+        return None
+    updated_at, last_login = row
+    # Logins do not touch updated_at and reach the row later (write-behind), but the body
+    # shows last_login: version it too, as this process's users see it
+    last_login = ActivityService.staged(current_tenant(), user_id).get('last_login', last_login)
+    return (updated_at, last_login), max(filter(None, (updated_at, last_login)), default=None)
+
+
+def onboarding_version():
+    user_id = get_jwt_identity()
+    # A user without an onboarding row gets a fixed default body, which is a version too
+    updated_at = cached_version(
+        f'onboarding:{current_tenant()}:{user_id}',
+        lambda: db.session.execute(
+            select(UserOnboarding.updated_at).where(UserOnboarding.user_id == user_id)
+        ).scalar() or 'none'
+    )
+    return updated_at, updated_at if isinstance(updated_at, datetime) else None
+
+
+def onboarding_etag(updated_at):
+    """ETag of GET /api/user/onboarding at this version; saves compare If-Match with it."""
+    return view_etag('user.get_onboarding', updated_at or 'none')
+
+
+def apps_version():
+    # Count and newest change over all apps: covers edits, (de)activation, inserts and deletes
+    count, updated_at = cached_version(
+        f'apps:{current_tenant()}',
+        lambda: tuple(db.session.execute(select(func.count(CompanyApp.id), func.max(CompanyApp.updated_at))).one())
+    )
+    return (count, updated_at), updated_at
+
+
+def conditional(*version_funcs, cache_control='private, no-cache', on_not_modified=None):
+    """ETag/Last-Modified support for a GET view whose body depends only on ``version_funcs``.
+
+    Each version function returns ``(version, last_modified)`` or None when there is
+    nothing to version (the view then runs unconditionally). Must sit under @jwt_required:
+    the ETag includes the current identity.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if not current_app.config.get('HTTP_CACHE_ENABLED', True):
+                return f(*args, **kwargs)
+
+            versions = [version_func() for version_func in version_funcs]
+            if any(version is None for version in versions):
+                return f(*args, **kwargs)
+
+            etag = view_etag(request.endpoint, *(version for version, _ in versions))
+            modified = [last_modified for _, last_modified in versions if last_modified is not None]
+            last_modified = max(modified).replace(microsecond=0) if len(modified) == len(versions) else None
+
+            if request.if_none_match:
+                # Weak comparison (RFC 7232): compressed responses carry the weak form
+                not_modified = request.if_none_match.contains_weak(etag)
+            else:
+                not_modified = bool(last_modified and request.if_modified_since
+                                    and last_modified <= request.if_modified_since.replace(tzinfo=None))
+
+            if not_modified:
+                if on_not_modified:
+                    on_not_modified()
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            if last_modified:
+                response.last_modified = last_modified
+            response.headers['Cache-Control'] = cache_control
+            response.vary.add('Authorization')
+            return response
+        return decorated_function
+    return decorator
+
+
+def _version_keys(target):
+    # Ids repeat across shards: every key is qualified by the tenant
+    if isinstance(target, User):
+        return [f'user:{target.tenant_id}:{target.id}']
+    if isinstance(target, UserOnboarding):
+        return [f'onboarding:{current_tenant()}:{target.user_id}']
+    if isinstance(target, CompanyApp):
+        return [f'apps:{target.tenant_id}']
+    return []
+
+
+def _track_change(mapper, connection, target):
+    keys = _version_keys(target)
+    if keys:
+        Session.object_session(target).info.setdefault('http_cache_keys', set()).update(keys)
+
+
+def _after_commit(session):
+    keys = session.info.pop('http_cache_keys', None)
+    if keys:
+        invalidate(*keys)
+
+
+def _after_rollback(session):
+    session.info.pop('http_cache_keys', None)
+
+
+def init_http_cache(app):
+    for model in (User, UserOnboarding, CompanyApp):
+        for name in ('after_insert', 'after_update', 'after_delete'):
+            if not event.contains(model, name, _track_change):
+                event.listen(model, name, _track_change)
+    if not event.contains(Session, 'after_commit', _after_commit):
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_rollback', _after_rollback)
@@ -0,0 +1,109 @@
+# app/utils/ip_policy.py
+# IP allowlists for company apps. An app's allowed_ips entries (addresses, IPv4/IPv6 CIDRs
+# and "first-last" ranges) are compiled once per app version into sorted, merged integer
+# intervals, so a check is one bisect however many ranges the app allows.
+import ipaddress
+import threading
+from bisect import bisect_right
+from collections import OrderedDict
+from flask import current_app, has_app_context, request
+
+_policies = OrderedDict()
+_policies_lock = threading.Lock()
+DEFAULT_CACHE_SIZE = 1024
+
+
+def client_address(forwarded_for, peer, trusted_proxies):
+    """The client's address: the peer, or with ``trusted_proxies`` proxies in front, the
+    X-Forwarded-For entry the outermost of them appended (ProxyFix's rule). Entries further
+    left are whatever the client sent."""
+    if trusted_proxies and forwarded_for:
+        hops = [hop.strip() for hop in forwarded_for.split(',')]
+        if len(hops) >= trusted_proxies:
+            return hops[-trusted_proxies]
+    return peer
+
+
+def get_client_ip():
+    """Address of the client. remote_addr is already resolved from X-Forwarded-For by
+    ProxyFix when TRUSTED_PROXY_COUNT proxies are in front (see create_app)."""
+    return request.remote_addr
+
+
+def parse_entry(entry):
+    """``(version, first, last)`` integers for one allowlist entry. Raises ValueError."""
+    entry = entry.strip()
+    if '-' in entry:
+        first, last = (ipaddress.ip_address(part.strip()) for part in entry.split('-', 1))
+        if first.version != last.version or first > last:
+            raise ValueError(f'Invalid IP range: {entry}')
+        return first.version, int(first), int(last)
+    network = ipaddress.ip_network(entry, strict=False)
+    return network.version, int(network.network_address), int(network.broadcast_address)
+
+
+def _normalize(ip_address):
+    address = ipaddress.ip_address(ip_address.strip())
+    # A dual-stack socket reports IPv4 clients as ::ffff:a.b.c.d
+    if address.version == 6 and address.ipv4_mapped is not None:
+        address = address.ipv4_mapped
+    return address.version, int(address)
+
+
+class IPPolicy:
+    def __init__(self, entries):
+        intervals = {4: [], 6: []}
+        self.invalid = []
+        for entry in entries or ():
+            try:
+                version, first, last = parse_entry(str(entry))
+            except ValueError:
+                self.invalid.append(entry)
+                continue
+            intervals[version].append((first, last))
+
+        self.starts, self.ends = {}, {}
+        for version, ranges in intervals.items():
+            merged = []
+            for first, last in sorted(ranges):
+                if merged and first <= merged[-1][1] + 1:
+                    merged[-1][1] = max(merged[-1][1], last)
+                else:
+                    merged.append([first, last])
+            self.starts[version] = [first for first, _ in merged]
+            self.ends[version] = [last for _, last in merged]
+        # An empty list allows everyone; a list of only invalid entries allows no one
+        self.allow_all = not entries
+
+    def allows(self, ip_address):
+        if self.allow_all:
+            return True
+        try:
+            version, value = _normalize(ip_address or '')
+        except ValueError:
+            return False
+        index = bisect_right(self.starts[version], value) - 1
+        return index >= 0 and value <= self.ends[version][index]
+
+
+def policy_for(app):
+    """Compiled policy of a CompanyApp, rebuilt when the app's updated_at changes."""
+    key = (app.tenant_id, app.id)
+    with _policies_lock:
+        cached = _policies.get(key)
+        if cached is not None and cached[0] == app.updated_at:
+            _policies.move_to_end(key)
+            return cached[1]
+
+    policy = IPPolicy(app.allowed_ips)
+    if policy.invalid and has_app_context():
+        current_app.logger.warning(f"App {app.id} has invalid allowed_ips entries: {policy.invalid}")
+
+    max_size = current_app.config.get('IP_POLICY_CACHE_SIZE', DEFAULT_CACHE_SIZE) if has_app_context() \
+        else DEFAULT_CACHE_SIZE
+    with _policies_lock:
+        _policies[key] = (app.updated_at, policy)
+        _policies.move_to_end(key)
+        while len(_policies) > max_size:
+            _policies.popitem(last=False)
+    return policy
@@ -0,0 +1,193 @@
+# app/utils/metrics.py
+import os
+import time
+from contextlib import contextmanager
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from prometheus_client import (
+    Counter, Histogram, CollectorRegistry, REGISTRY,
+    generate_latest, CONTENT_TYPE_LATEST, multiprocess
+)
+
+# Latency buckets tuned for an API that mostly answers in a few ms,
+# with a long tail for bcrypt and outbound email calls.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+SIZE_BUCKETS = (256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536)
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds',
+    'HTTP request latency by blueprint and endpoint',
+    ['blueprint', 'endpoint', 'method', 'status'],
+    buckets=LATENCY_BUCKETS
+)
+REQUEST_DB_QUERIES = Histogram(
+    'http_request_db_queries',
+    'Number of SQL statements executed per request',
+    ['blueprint', 'endpoint'],
+    buckets=QUERY_COUNT_BUCKETS
+)
+REQUEST_DB_SECONDS = Histogram(
+    'http_request_db_seconds',
+    'Time spent executing SQL statements per request',
+    ['blueprint', 'endpoint'],
+    buckets=LATENCY_BUCKETS
+)
+BCRYPT_SECONDS = Histogram(
+    'bcrypt_duration_seconds',
+    'Time spent hashing or checking passwords',
+    ['operation'],
+    buckets=LATENCY_BUCKETS
+)
+EMAIL_SEND_SECONDS = Histogram(
+    'email_send_duration_seconds',
+    'Time spent delivering emails',
+    ['status'],
+    buckets=LATENCY_BUCKETS
+)
+MFA_QR_RENDER_SECONDS = Histogram(
+    'mfa_qr_render_duration_seconds',
+    'Time spent rendering MFA enrollment QR codes',
+    ['format', 'source'],
+    buckets=LATENCY_BUCKETS
+)
+MFA_QR_SIZE_BYTES = Histogram(
+    'mfa_qr_size_bytes',
+    'Size of rendered MFA enrollment QR codes',
+    ['format'],
+    buckets=SIZE_BUCKETS
+)
+MFA_VERIFICATIONS = Counter(
+    'mfa_verifications_total',
+    'TOTP verification attempts by outcome',
+    ['result']
+)
+JOB_RUN_SECONDS = Histogram(
+    'scheduler_job_duration_seconds',
+    'Run time of scheduled maintenance jobs',
+    ['job', 'status'],
+    buckets=LATENCY_BUCKETS + (30.0, 60.0, 300.0)
+)
+JOB_ROWS = Counter(
+    'scheduler_job_rows_total',
+    'Rows deleted or updated by scheduled maintenance jobs',
+    ['job']
+)
+USER_ACTIVITY_FLUSHED = Counter(
+    'user_activity_flushed_rows_total',
+    'Users rows written by the last_login / login attempt write-behind buffer'
+)
+USER_ACTIVITY_FLUSH_SECONDS = Histogram(
+    'user_activity_flush_duration_seconds',
+    'Time to flush the user activity write-behind buffer',
+    buckets=LATENCY_BUCKETS
+)
+RATE_LIMIT_REJECTIONS = Counter(
+    'rate_limit_rejections_total',
+    'Requests rejected by the rate limiter',
+    ['endpoint']
+)
+PASSWORD_REHASHES = Counter(
+    'password_rehashes_total',
+    'Password hashes upgraded to the current hashing policy on login, by new scheme',
+    ['scheme']
+)
+WEBHOOK_DELIVERIES = Counter(
+    'webhook_deliveries_total',
+    'Webhook batches by outcome (delivered, retried, rejected, failed) and events dropped on a full queue',
+    ['status']
+)
+WEBHOOK_DELIVERY_SECONDS = Histogram(
+    'webhook_delivery_duration_seconds',
+    'Time for a company app endpoint to answer a webhook POST',
+    buckets=LATENCY_BUCKETS
+)
+
+
+@contextmanager
+def observe_duration(histogram, **labels):
+    """Time the wrapped block and record it on ``histogram``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.labels(**labels).observe(time.perf_counter() - start)
+
+
+def record_rate_limit_breach(request_limit):
+    if not has_request_context():
+        return
+    # A request can breach several limits at once; count the rejection once
+    if g.get('rate_limit_breach_recorded'):
+        return
+    g.rate_limit_breach_recorded = True
+    RATE_LIMIT_REJECTIONS.labels(endpoint=request.endpoint or 'none').inc()
+
+
+def metrics_payload():
+    """Render all metrics in the Prometheus text exposition format.
+
+    Under gunicorn every worker writes its samples to PROMETHEUS_MULTIPROC_DIR,
+    so a scrape has to aggregate all of them instead of reading this process only.
+    """
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_time', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start_times = conn.info.get('query_start_time')
+    if not start_times:
+        return
+    elapsed = time.perf_counter() - start_times.pop()
+
+    if has_request_context() and 'request_start_time' in g:
+        g.db_query_count = g.get('db_query_count', 0) + 1
+        g.db_query_seconds = g.get('db_query_seconds', 0.0) + elapsed
+
+
+def _start_timer():
+    g.request_start_time = time.perf_counter()
+    g.db_query_count = 0
+    g.db_query_seconds = 0.0
+
+
+def _record_request(response):
+    start = g.pop('request_start_time', None)
+    if start is None:
+        return response
+
+    blueprint = request.blueprint or 'none'
+    endpoint = request.endpoint or 'none'
+
+    REQUEST_LATENCY.labels(
+        blueprint=blueprint,
+        endpoint=endpoint,
+        method=request.method,
+        status=response.status_code
+    ).observe(time.perf_counter() - start)
+    REQUEST_DB_QUERIES.labels(blueprint=blueprint, endpoint=endpoint).observe(g.db_query_count)
+    REQUEST_DB_SECONDS.labels(blueprint=blueprint, endpoint=endpoint).observe(g.db_query_seconds)
+
+    return response
+
+
+def init_metrics(app):
+    if not app.config.get('METRICS_ENABLED', True):
+        return
+
+    # Listen on the Engine class so every engine (and bind) is covered
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    app.before_request(_start_timer)
+    app.after_request(_record_request)
@@ -0,0 +1,175 @@
+# app/utils/passwords.py
+# Password hashing policy. Hashes carry their scheme and parameters ("$2b$12$..." for
+# bcrypt, "$argon2id$v=19$m=65536,t=3,p=1$..." for argon2id), so any stored hash can be
+# verified whatever the current policy, and a hash weaker than the policy (or from another
+# scheme) is replaced the next time its password is verified. Hashes are only ever upgraded:
+# hosts calibrated to slightly different costs do not keep rehashing each other's work.
+# The cost is either configured or calibrated to PASSWORD_HASH_TARGET_MS on this hardware,
+# at startup (PASSWORD_HASH_CALIBRATE) or with `flask passwords calibrate`, which prints
+# settings to pin: a higher target buys security with login throughput. argon2id needs the
+# argon2-cffi package; its memory cost and parallelism are configured, calibration only
+# picks the number of passes.
+import re
+import secrets
+import time
+import bcrypt
+from app.utils.metrics import BCRYPT_SECONDS, observe_duration
+
+try:
+    import argon2
+    from argon2.low_level import Type, hash_secret, verify_secret
+except ImportError:
+    argon2 = None
+
+SCHEMES = ('bcrypt', 'argon2id')
+# Calibration never goes below these (OWASP minimums)
+MIN_BCRYPT_ROUNDS = 10
+MIN_ARGON2_TIME_COST = 2
+ARGON2_SALT_BYTES = 16
+ARGON2_HASH_BYTES = 32
+ARGON2_PARAMS_RE = re.compile(r'^\$argon2id\$v=\d+\$m=(\d+),t=(\d+),p=(\d+)\$')
+
+_policy = {
+    'scheme': 'bcrypt',
+    'bcrypt_rounds': 12,
+    'argon2_time_cost': 3,
+    'argon2_memory_cost': 65536,
+    'argon2_parallelism': 1
+}
+
+
+def scheme_of(password_hash):
+    if password_hash.startswith('$argon2id$'):
+        return 'argon2id'
+    if password_hash.startswith(('$2a$', '$2b$', '$2y$')):
+        return 'bcrypt'
+    return None
+
+
+def _require_argon2():
+    if argon2 is None:
+        raise RuntimeError('argon2id password hashes need the argon2-cffi package')
+
+
+def _bcrypt_hash(password, rounds):
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=rounds)).decode('utf-8')
+
+
+def _argon2_hash(password, time_cost, memory_cost, parallelism):
+    _require_argon2()
+    return hash_secret(
+        password.encode('utf-8'), secrets.token_bytes(ARGON2_SALT_BYTES), time_cost=time_cost,
+        memory_cost=memory_cost, parallelism=parallelism, hash_len=ARGON2_HASH_BYTES, type=Type.ID
+    ).decode('ascii')
+
+
+def hash_password(password):
+    """Hash ``password`` with the current policy."""
+    policy = _policy
+    with observe_duration(BCRYPT_SECONDS, operation='hash'):
+        if policy['scheme'] == 'argon2id':
+            return _argon2_hash(
+                password, policy['argon2_time_cost'], policy['argon2_memory_cost'], policy['argon2_parallelism']
+            )
+        return _bcrypt_hash(password, policy['bcrypt_rounds'])
+
+
+def verify_password(password, password_hash):
+    """Whether ``password`` matches ``password_hash``, of any supported scheme."""
+    scheme = scheme_of(password_hash)
+    with observe_duration(BCRYPT_SECONDS, operation='check'):
+        if scheme == 'argon2id':
+            _require_argon2()
+            try:
+                return verify_secret(password_hash.encode('ascii'), password.encode('utf-8'), Type.ID)
+            except (argon2.exceptions.VerificationError, argon2.exceptions.InvalidHash):
+                return False
+        if scheme == 'bcrypt':
+            return bcrypt.checkpw(password.encode('utf-8'), password_hash.encode('utf-8'))
+    return False
+
+
+def needs_rehash(password_hash):
+    """Whether ``password_hash`` is of another scheme than the policy's, or cheaper than it."""
+    policy = _policy
+    scheme = scheme_of(password_hash)
+    if scheme is None:
+        return False
+    if scheme != policy['scheme']:
+        return True
+    if scheme == 'bcrypt':
+        return int(password_hash[4:6]) < policy['bcrypt_rounds']
+    match = ARGON2_PARAMS_RE.match(password_hash)
+    if not match:
+        return True
+    memory_cost, time_cost, parallelism = (int(value) for value in match.groups())
+    # Upgrades only, parallelism included: hosts configured with fewer lanes would otherwise
+    # keep rewriting the hashes of hosts with more, and the other way round
+    return memory_cost < policy['argon2_memory_cost'] or time_cost < policy['argon2_time_cost'] \
+        or parallelism < policy['argon2_parallelism']
+
+
+def _timed(fn, *args):
+    start = time.perf_counter()
+    fn(*args)
+    return time.perf_counter() - start
+
+
+def calibrate(scheme, target_ms, argon2_memory_cost=65536, argon2_parallelism=1):
+    """Policy settings for ``scheme`` whose hash takes at most about ``target_ms`` here
+    (never below the minimums), with the measured time in ms."""
+    target = target_ms / 1000
+    if scheme == 'bcrypt':
+        # Each round doubles the work: time one cheap hash and extrapolate, then check
+        base = min(_timed(_bcrypt_hash, 'calibration', 8) for _ in range(3))
+        rounds = 8
+        while rounds < 31 and base * 2 ** (rounds + 1 - 8) <= target:
+            rounds += 1
+        rounds = max(rounds, MIN_BCRYPT_ROUNDS)
+        return {'bcrypt_rounds': rounds}, _timed(_bcrypt_hash, 'calibration', rounds) * 1000
+
+    if scheme != 'argon2id':
+        raise ValueError(f'Unknown password hash scheme {scheme}')
+    _require_argon2()
+    # Memory is the real defence and is set by deployment; spend the budget on passes
+    time_cost = 1
+    elapsed = _timed(_argon2_hash, 'calibration', time_cost, argon2_memory_cost, argon2_parallelism)
+    while elapsed * (time_cost + 1) / time_cost <= target:
+        time_cost += 1
+        elapsed = _timed(_argon2_hash, 'calibration', time_cost, argon2_memory_cost, argon2_parallelism)
+    time_cost = max(time_cost, MIN_ARGON2_TIME_COST)
+    elapsed = _timed(_argon2_hash, 'calibration', time_cost, argon2_memory_cost, argon2_parallelism)
+    return {
+        'argon2_time_cost': time_cost,
+        'argon2_memory_cost': argon2_memory_cost,
+        'argon2_parallelism': argon2_parallelism
+    }, elapsed * 1000
+
+
+def current_policy():
+    return dict(_policy)
+
+
+def init_passwords(app):
+    global _policy
+    config = app.config
+    scheme = config['PASSWORD_HASH_SCHEME']
+    if scheme not in SCHEMES:
+        raise RuntimeError(f"PASSWORD_HASH_SCHEME must be one of {', '.join(SCHEMES)}")
+    if scheme == 'argon2id':
+        _require_argon2()
+
+    policy = {
+        'scheme': scheme,
+        'bcrypt_rounds': config['PASSWORD_BCRYPT_ROUNDS'],
+        'argon2_time_cost': config['PASSWORD_ARGON2_TIME_COST'],
+        'argon2_memory_cost': config['PASSWORD_ARGON2_MEMORY_COST'],
+        'argon2_parallelism': config['PASSWORD_ARGON2_PARALLELISM']
+    }
+    if config['PASSWORD_HASH_CALIBRATE']:
+        settings, elapsed_ms = calibrate(
+            scheme, config['PASSWORD_HASH_TARGET_MS'], policy['argon2_memory_cost'], policy['argon2_parallelism']
+        )
+        policy.update(settings)
+        app.logger.info(f"Password hashing calibrated: {scheme} {settings} ({elapsed_ms:.0f} ms)")
+    _policy = policy
@@ -0,0 +1,226 @@
+# app/utils/query_profiler.py
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from flask import current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_local = threading.local()
+
+_WHITESPACE_RE = re.compile(r'\s+')
+_IN_LIST_RE = re.compile(r'\bIN\s*\((?:[^()]|\([^()]*\))*\)', re.IGNORECASE)
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'\b\d+(?:\.\d+)?\b')
+
+
+class QueryBudgetExceeded(Exception):
+    pass
+
+
+def statement_shape(statement):
+    """Normalize a statement so queries differing only by parameters compare equal."""
+    shape = _WHITESPACE_RE.sub(' ', statement).strip()
+    shape = _STRING_RE.sub('?', shape)
+    shape = _NUMBER_RE.sub('?', shape)
+    return _IN_LIST_RE.sub('IN (...)', shape)
+
+
+class QueryProfile:
+    def __init__(self, label=None):
+        self.label = label
+        self.queries = []
+        self.commits = 0
+
+    def record(self, statement, duration, plan=None):
+        self.queries.append({
+            'statement': statement,
+            'shape': statement_shape(statement),
+            'duration_ms': duration * 1000,
+            'plan': plan
+        })
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def total_ms(self):
+        return sum(q['duration_ms'] for q in self.queries)
+
+    def repeated_shapes(self, threshold):
+        counts = Counter(q['shape'] for q in self.queries)
+        return [(shape, n) for shape, n in counts.most_common() if n >= threshold]
+
+    def slow_queries(self, threshold_ms):
+        return [q for q in self.queries if q['duration_ms'] >= threshold_ms]
+
+    def assert_max_commits(self, budget):
+        if self.commits > budget:
+            raise QueryBudgetExceeded(f"{self.label or 'block'} committed {self.commits} times (budget {budget})")
+
+    def assert_max_queries(self, budget):
+        if self.count > budget:
+            raise QueryBudgetExceeded(
+                f"{self.label or 'block'} ran {self.count} queries (budget {budget}):\n"
+                + '\n'.join(q['statement'] for q in self.queries)
+            )
+
+
+def _active_profiles():
+    if not hasattr(_local, 'profiles'):
+        _local.profiles = []
+    return _local.profiles
+
+
+@contextmanager
+def profile_queries(label=None, budget=None):
+    """Record every statement run in this thread, e.g. around test client calls.
+
+        with profile_queries('dashboard', budget=3):
+            client.get('/api/user/dashboard', headers=headers)
+
+    ``profile.commits`` counts the transactions committed, e.g. to check that a flow
+    commits once (``profile.assert_max_commits(1)``).
+    """
+    _register_listeners()
+    profile = QueryProfile(label)
+    profiles = _active_profiles()
+    profiles.append(profile)
+    try:
+        yield profile
+    finally:
+        profiles.remove(profile)
+
+    if budget is not None:
+        profile.assert_max_queries(budget)
+
+
+def query_budget(max_queries):
+    """Declare the maximum number of statements a view may run per request."""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            return f(*args, **kwargs)
+        decorated_function._query_budget = max_queries
+        return decorated_function
+    return decorator
+
+
+def _explain(cursor, statement, parameters):
+    if not statement.lstrip().upper().startswith('SELECT'):
+        return None
+
+    dbapi_connection = cursor.connection
+    prefix = 'EXPLAIN QUERY PLAN ' if type(dbapi_connection).__module__.startswith('sqlite3') else 'EXPLAIN '
+
+    # Use a raw DBAPI cursor so the EXPLAIN itself does not fire engine events
+    explain_cursor = dbapi_connection.cursor()
+    try:
+        explain_cursor.execute(prefix + statement, parameters)
+        return [' '.join(str(col) for col in row) for row in explain_cursor.fetchall()]
+    except Exception as e:
+        return [f'EXPLAIN failed: {e}']
+    finally:
+        explain_cursor.close()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _active_profiles():
+        conn.info.setdefault('profiler_start_time', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profiles = _active_profiles()
+    start_times = conn.info.get('profiler_start_time')
+    if not profiles or not start_times:
+        return
+    duration = time.perf_counter() - start_times.pop()
+
+    plan = None
+    threshold_ms = getattr(_local, 'slow_query_threshold_ms', None)
+    if threshold_ms is not None and duration * 1000 >= threshold_ms and not executemany:
+        plan = _explain(cursor, statement, parameters)
+
+    for profile in profiles:
+        profile.record(statement, duration, plan)
+
+
+def _on_commit(conn):
+    for profile in _active_profiles():
+        profile.commits += 1
+
+
+def _register_listeners():
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'commit', _on_commit)
+
+
+def _start_request_profile():
+    g.query_profile = QueryProfile(request.endpoint)
+    _active_profiles().append(g.query_profile)
+    _local.slow_query_threshold_ms = current_app.config['SLOW_QUERY_THRESHOLD_MS']
+
+
+def _finish_request_profile(response):
+    profile = g.pop('query_profile', None)
+    if profile is None:
+        return response
+
+    profiles = _active_profiles()
+    if profile in profiles:
+        profiles.remove(profile)
+
+    config = current_app.config
+    logger = current_app.logger
+    endpoint = request.endpoint or request.path
+
+    for shape, n in profile.repeated_shapes(config['N_PLUS_ONE_THRESHOLD']):
+        logger.warning(f'[QUERY] Possible N+1 in {endpoint}: {n}x {shape}')
+
+    for query in profile.slow_queries(config['SLOW_QUERY_THRESHOLD_MS']):
+        plan = '\n    '.join(query['plan'] or [])
+        logger.warning(
+            f"[QUERY] Slow query in {endpoint} ({query['duration_ms']:.1f} ms): "
+            f"{query['statement']}\n    {plan}"
+        )
+
+    response.headers['X-Query-Count'] = str(profile.count)
+    response.headers['X-Query-Time-Ms'] = f'{profile.total_ms:.2f}'
+    response.headers['X-Commit-Count'] = str(profile.commits)
+
+    view = current_app.view_functions.get(request.endpoint)
+    budget = getattr(view, '_query_budget', None)
+    if budget is None:
+        budget = config['QUERY_BUDGETS'].get(request.endpoint)
+
+    if budget is not None and profile.count > budget:
+        message = f'{endpoint} ran {profile.count} queries (budget {budget})'
+        if config['QUERY_BUDGET_STRICT']:
+            raise QueryBudgetExceeded(message)
+        logger.warning(f'[QUERY] {message}')
+
+    return response
+
+
+def _discard_request_profile(exc):
+    # after_request is skipped on unhandled errors; never leak a profile into the next request
+    profile = g.pop('query_profile', None)
+    profiles = _active_profiles()
+    if profile in profiles:
+        profiles.remove(profile)
+
+
+def init_query_profiler(app):
+    if not app.config.get('QUERY_PROFILING_ENABLED'):
+        return
+
+    _register_listeners()
+    app.before_request(_start_request_profile)
+    app.after_request(_finish_request_profile)
+    app.teardown_request(_discard_request_profile)
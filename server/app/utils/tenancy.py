@@ -0,0 +1,192 @@
+# app/utils/tenancy.py
+# Tenant-aware data routing. Every request runs for one tenant (the JWT "tenant" claim, or
+# the X-Tenant-ID header before login). TENANT_SHARDS maps a tenant to a bind key from
+# SQLALCHEMY_BINDS; unmapped tenants live on the default database. TenantSession picks
+# the engine per statement and the tenant filter is added to every ORM query on tenant
+# scoped models, so tenants sharing a database never see each other's rows.
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from flask import current_app, g, has_app_context, jsonify, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import Column, String, event
+from sqlalchemy.orm import with_loader_criteria
+
+TENANT_ID_RE = re.compile(r'^[A-Za-z0-9_-]{1,50}$')
+# Shared by all tenants, always on the default database
+GLOBAL_TABLES = {'job_locks'}
+
+_fanout_executor = None
+_fanout_pid = None
+_fanout_lock = threading.Lock()
+
+
+class TenantMixin:
+    """Tenant scoped model: rows are stamped with, and queries filtered by, the current tenant."""
+    tenant_id = Column(String(50), nullable=False, default=lambda: current_tenant(), index=True)
+
+
+def default_tenant():
+    return current_app.config.get('DEFAULT_TENANT', 'default') if has_app_context() else 'default'
+
+
+def current_tenant():
+    if has_app_context() and g.get('tenant_id'):
+        return g.tenant_id
+    return default_tenant()
+
+
+def token_tenant():
+    """Tenant the authenticated user belongs to (differs from current_tenant() when a
+    super admin works in another tenant through the tenant header)."""
+    return g.get('token_tenant') or current_tenant()
+
+
+def shard_for_tenant(tenant_id):
+    return current_app.config['TENANT_SHARDS'].get(tenant_id)
+
+
+def shard_keys():
+    """Bind key of every shard, None being the default database."""
+    return [None] + sorted(set(current_app.config['TENANT_SHARDS'].values()))
+
+
+def current_bind_key():
+    if g.get('shard_override'):
+        return g.shard_key
+    return shard_for_tenant(current_tenant())
+
+
+@contextmanager
+def tenant_scope(tenant_id):
+    previous = g.get('tenant_id')
+    g.tenant_id = tenant_id
+    try:
+        yield
+    finally:
+        g.tenant_id = previous
+
+
+@contextmanager
+def shard_scope(bind_key):
+    """Run against one shard with the tenant filter off (maintenance jobs, admin fan-out)."""
+    previous = g.get('shard_override', False), g.get('shard_key')
+    g.shard_override, g.shard_key = True, bind_key
+    try:
+        yield
+    finally:
+        g.shard_override, g.shard_key = previous
+
+
+def is_super_admin(user_id, tenant_id):
+    """Whether the user is an active super admin now. From the user status snapshot, not the
+    token's role claim: a super admin demoted since the token was issued is not one any more."""
+    # Imported here: user_status builds on this module
+    from app.utils.user_status import user_status
+    with tenant_scope(tenant_id):
+        status = user_status(user_id)
+    return bool(status and status.is_active and status.role == 'super_admin')
+
+
+def is_cross_tenant_request():
+    # Super admins see every tenant unless they pick one with the tenant header
+    from flask_jwt_extended import get_jwt_identity
+    return current_app.config['TENANT_HEADER'] not in request.headers and \
+        is_super_admin(get_jwt_identity(), token_tenant())
+
+
+def fan_out(func):
+    """Call ``func`` once per shard in parallel; returns (results, unavailable bind keys).
+
+    Shards that fail or miss TENANT_FANOUT_TIMEOUT are left out of the results rather
+    than holding up the response, so one slow or large tenant cannot stall the others.
+    """
+    app = current_app._get_current_object()
+
+    def run(bind_key):
+        with app.app_context(), shard_scope(bind_key):
+            return func()
+
+    futures = {_get_fanout_executor(app).submit(run, key): key for key in shard_keys()}
+    done, _ = wait(futures, timeout=app.config['TENANT_FANOUT_TIMEOUT'])
+
+    results, unavailable = [], []
+    for future, bind_key in futures.items():
+        if future in done and future.exception() is None:
+            results.append(future.result())
+        else:
+            if future in done:
+                app.logger.error(f"Shard {bind_key or 'default'} query failed: {str(future.exception())}")
+            unavailable.append(bind_key or 'default')
+    return results, unavailable
+
+
+def _get_fanout_executor(app):
+    global _fanout_executor, _fanout_pid
+    with _fanout_lock:
+        # Threads do not survive a fork: build the pool per process
+        if _fanout_executor is None or _fanout_pid != os.getpid():
+            _fanout_pid = os.getpid()
+            _fanout_executor = ThreadPoolExecutor(
+                max_workers=app.config['TENANT_FANOUT_WORKERS'], thread_name_prefix='tenant-fanout'
+            )
+        return _fanout_executor
+
+
+class TenantSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            table = getattr(mapper, 'local_table', None) if mapper is not None else None
+            if table is None or table.name not in GLOBAL_TABLES:
+                bind_key = current_bind_key()
+                if bind_key is not None:
+                    return self._db.engines[bind_key]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _add_tenant_criteria(execute_state):
+    if not (execute_state.is_select or execute_state.is_update or execute_state.is_delete):
+        return
+    if not has_app_context() or g.get('shard_override') or execute_state.execution_options.get('all_tenants'):
+        return
+    tenant_id = current_tenant()
+    execute_state.statement = execute_state.statement.options(
+        with_loader_criteria(TenantMixin, lambda cls: cls.tenant_id == tenant_id, include_aliases=True)
+    )
+
+
+def _resolve_tenant():
+    tenant_id = request.headers.get(current_app.config['TENANT_HEADER'])
+    if tenant_id is None:
+        g.tenant_id = default_tenant()
+    elif TENANT_ID_RE.match(tenant_id):
+        g.tenant_id = tenant_id
+    else:
+        return jsonify({'error': 'Invalid tenant id'}), 400
+
+
+def init_tenancy(app):
+    from app.extensions import jwt
+
+    if not event.contains(TenantSession, 'do_orm_execute', _add_tenant_criteria):
+        event.listen(TenantSession, 'do_orm_execute', _add_tenant_criteria)
+
+    app.before_request(_resolve_tenant)
+
+    @jwt.additional_claims_loader
+    def add_tenant_claim(identity):
+        return {'tenant': token_tenant()}
+
+    @jwt.token_verification_loader
+    def bind_token_tenant(jwt_header, jwt_data):
+        # The token decides the tenant: user ids are only unique within one tenant's shard
+        tenant_id = g.token_tenant = jwt_data.get('tenant') or default_tenant()
+        requested = request.headers.get(app.config['TENANT_HEADER'])
+        if requested and requested != tenant_id:
+            if not is_super_admin(jwt_data[app.config['JWT_IDENTITY_CLAIM']], tenant_id):
+                return False
+            tenant_id = requested
+        g.tenant_id = tenant_id
+        return True
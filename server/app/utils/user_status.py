@@ -0,0 +1,241 @@
+# app/utils/user_status.py
+# Host-wide snapshot of every user's status (exists, active, role, authz version), so auth
+# checks that only need those answer without a database round-trip. The snapshot is an
+# mmap'd file, one per database, shared by all workers on the host: a 2 byte record per
+# user id (2 MB at a million users) behind a small header. One worker at a time refreshes
+# it incrementally from users.updated_at; a worker that commits a user change writes the
+# new record at once. Lookups the snapshot cannot answer (unknown id, stale snapshot) go
+# to the database.
+import fcntl
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+from app.models import db, User
+from app.utils.tenancy import current_bind_key, shard_keys, shard_scope
+
+UserStatus = namedtuple('UserStatus', ['is_active', 'role', 'version'])
+
+MAGIC = b'USRSTAT1'
+# magic, capacity (records), watermark (users.updated_at, epoch seconds), refreshed_at
+HEADER = struct.Struct('<8sQdd')
+RECORD_SIZE = 2
+MIN_CAPACITY = 1024
+
+EXISTS = 0x01
+ACTIVE = 0x02
+ROLES = ('user', 'admin', 'super_admin')
+EPOCH = datetime(1970, 1, 1)
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+_refresher_pid = None
+_refresher_lock = threading.Lock()
+
+
+def _timestamp(value):
+    return (value - EPOCH).total_seconds() if value else 0.0
+
+
+def encode(is_active, role):
+    flags = EXISTS | (ACTIVE if is_active else 0)
+    return flags | (ROLES.index(role) << 2 if role in ROLES else 0)
+
+
+class StatusSnapshot:
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        with self._file_lock():
+            if os.fstat(self.fd).st_size < HEADER.size:
+                os.ftruncate(self.fd, HEADER.size + MIN_CAPACITY * RECORD_SIZE)
+                os.pwrite(self.fd, HEADER.pack(MAGIC, MIN_CAPACITY, 0.0, 0.0), 0)
+        self.map = None
+        self.capacity = 0
+        self._remap()
+
+    @contextmanager
+    def _file_lock(self, blocking=True):
+        try:
+            fcntl.flock(self.fd, fcntl.LOCK_EX | (0 if blocking else fcntl.LOCK_NB))
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def header(self):
+        return HEADER.unpack_from(self.map, 0)
+
+    def _remap(self):
+        # Another worker may have grown the file; the header says how far
+        with self.lock:
+            size = os.fstat(self.fd).st_size
+            self.map = mmap.mmap(self.fd, size)
+            self.capacity = (size - HEADER.size) // RECORD_SIZE
+
+    def lookup(self, user_id, max_age):
+        """UserStatus, None for a user the snapshot has not seen, False if it is too old to trust."""
+        magic, capacity, _, refreshed_at = self.header()
+        if magic != MAGIC or time.time() - refreshed_at > max_age:
+            return False
+        if capacity != self.capacity:
+            self._remap()
+        if not 0 < user_id < self.capacity:
+            return None
+        offset = HEADER.size + user_id * RECORD_SIZE
+        flags, version = self.map[offset], self.map[offset + 1]
+        if not flags & EXISTS:
+            return None
+        return UserStatus(bool(flags & ACTIVE), ROLES[flags >> 2 & 0x03], version)
+
+    def write(self, rows):
+        """Store ``(id, is_active, role)`` rows; the authz version moves when active/role change."""
+        rows = list(rows)
+        if not rows:
+            return
+        needed = max(user_id for user_id, _, _ in rows) + 1
+        if needed > self.capacity:
+            self._grow(needed)
+        for user_id, is_active, role in rows:
+            offset = HEADER.size + user_id * RECORD_SIZE
+            flags = encode(is_active, role)
+            old_flags, version = self.map[offset], self.map[offset + 1]
+            if old_flags != flags:
+                if old_flags & EXISTS:
+                    version = (version + 1) % 256
+                self.map[offset:offset + 2] = bytes((flags, version))
+
+    def _grow(self, needed):
+        with self._file_lock():
+            capacity = HEADER.unpack(os.pread(self.fd, HEADER.size, 0))[1]
+            if capacity < needed:
+                capacity = max(needed, capacity * 2)
+                os.ftruncate(self.fd, HEADER.size + capacity * RECORD_SIZE)
+                os.pwrite(self.fd, struct.pack('<Q', capacity), 8)
+        self._remap()
+
+    def refresh(self, overlap):
+        """Apply users changed since the last refresh; returns rows read, None if another worker holds the lock."""
+        with self._file_lock(blocking=False) as locked:
+            if not locked:
+                return None
+            _, _, watermark, _ = self.header()
+            since = EPOCH + timedelta(seconds=max(watermark - overlap, 0))
+            rows = db.session.execute(
+                select(User.id, User.is_active, User.role, User.updated_at)
+                .where(User.updated_at >= since)
+                .execution_options(yield_per=10000)
+            )
+            count = 0
+            newest = watermark
+            batch = []
+            for user_id, is_active, role, updated_at in rows:
+                batch.append((user_id, is_active, role))
+                newest = max(newest, _timestamp(updated_at))
+                count += 1
+                if len(batch) >= 10000:
+                    self.write(batch)
+                    batch = []
+            self.write(batch)
+            db.session.rollback()
+            HEADER.pack_into(self.map, 0, MAGIC, self.capacity, newest, time.time())
+            return count
+
+
+def snapshot_for(app, bind_key):
+    with _snapshots_lock:
+        snapshot = _snapshots.get(bind_key)
+        if snapshot is None:
+            url = str(db.engines[bind_key].url)
+            digest = hashlib.blake2b(url.encode(), digest_size=6).hexdigest()
+            directory = app.config.get('USER_STATUS_DIR') or app.instance_path
+            os.makedirs(directory, exist_ok=True)
+            snapshot = _snapshots[bind_key] = StatusSnapshot(
+                os.path.join(directory, f'user_status_{digest}.bin')
+            )
+        return snapshot
+
+
+def user_status(user_id):
+    """Status of ``user_id`` in the current shard, or None if there is no such user."""
+    app = current_app
+    user_id = int(user_id)
+    if app.config.get('USER_STATUS_ENABLED', True):
+        status = snapshot_for(app, current_bind_key()).lookup(user_id, app.config['USER_STATUS_MAX_AGE'])
+        if status:
+            return status
+
+    row = db.session.execute(select(User.is_active, User.role).where(User.id == user_id)).first()
+    return UserStatus(row.is_active, row.role, None) if row else None
+
+
+def refresh_all(app):
+    for bind_key in shard_keys():
+        with shard_scope(bind_key):
+            snapshot_for(app, bind_key).refresh(app.config['USER_STATUS_OVERLAP'])
+
+
+def _track_user(mapper, connection, target):
+    Session.object_session(target).info.setdefault('user_status_rows', []).append(
+        (current_bind_key(), target.id, target.is_active, target.role)
+    )
+
+
+def _after_commit(session):
+    rows = session.info.pop('user_status_rows', None)
+    if not rows or not current_app.config.get('USER_STATUS_ENABLED', True):
+        return
+    for bind_key, user_id, is_active, role in rows:
+        snapshot_for(current_app, bind_key).write([(user_id, is_active, role)])
+
+
+def _after_rollback(session):
+    session.info.pop('user_status_rows', None)
+
+
+def _refresh_loop(app):
+    interval = app.config['USER_STATUS_REFRESH_INTERVAL']
+    while True:
+        with app.app_context():
+            try:
+                refresh_all(app)
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error(f"User status refresh failed: {str(e)}")
+        time.sleep(interval)
+
+
+def init_user_status(app):
+    if not app.config.get('USER_STATUS_ENABLED', True):
+        return
+
+    for name in ('after_insert', 'after_update'):
+        if not event.contains(User, name, _track_user):
+            event.listen(User, name, _track_user)
+    if not event.contains(Session, 'after_commit', _after_commit):
+        event.listen(Session, 'after_commit', _after_commit)
+        event.listen(Session, 'after_rollback', _after_rollback)
+
+    @app.before_request
+    def start_status_refresher():
+        global _refresher_pid
+        # One refresher thread per process (see init_scheduler); the file lock lets only
+        # one of them refresh at a time
+        if _refresher_pid == os.getpid():
+            return
+        with _refresher_lock:
+            if _refresher_pid != os.getpid():
+                _refresher_pid = os.getpid()
+                threading.Thread(target=_refresh_loop, args=(app,), name='user-status', daemon=True).start()
@@ -1,4 +1,5 @@
 import re
+from app.utils.breached_passwords import is_breached
 
 def validate_password_strength(password):
     if len(password) < 8:
@@ -9,4 +10,6 @@ def validate_password_strength(password):
         return False, "Password must contain at least one lowercase letter"
     if not re.search(r"\d", password):
         return False, "Password must contain at least one digit"
+    if is_breached(password):
+        return False, "This password has appeared in a data breach; choose a different one"
     return True, "Password is strong"
\ No newline at end of file
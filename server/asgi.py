@@ -0,0 +1,14 @@
+import os
+from dotenv import load_dotenv
+
+# Load .env first
+load_dotenv()
+
+from app import create_app
+from app.asgi import create_asgi_app
+
+# ASGI entry point, e.g.:
+#   uvicorn asgi:app --workers 4
+#   gunicorn -k uvicorn.workers.UvicornWorker asgi:app
+config_name = os.getenv("FLASK_CONFIG") or "default"
+app = create_asgi_app(create_app(config_name))
@@ -0,0 +1,120 @@
+# benchmarks/bench_asgi.py
+"""Concurrency per worker: WSGI (gunicorn, one sync worker) vs ASGI (uvicorn, one worker).
+
+Run from the ``server`` directory:
+
+    python -m benchmarks.bench_asgi --levels 1,8,32,64 --output results/asgi.json
+    python -m benchmarks.bench_asgi --database-url postgresql://localhost/hub_bench
+
+Both servers get a single worker process against the same seeded database, so the numbers
+show how much concurrent work one worker can keep in flight. The ASGI front serves only the
+change feed and the audit stream natively (everything else goes through Flask in both), so
+the change feed is what is measured. The gap grows with database latency, so a networked
+PostgreSQL shows it much better than a local SQLite file.
+"""
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import requests
+
+from benchmarks.bench_http import prepare_contexts, request_for
+from benchmarks.common import boot_app, result_metadata, run_load, save_results, seed_database
+
+SERVERS = {
+    'wsgi': ['gunicorn', '-c', 'gunicorn.conf.py', '--workers', '1', '--worker-class', 'sync', 'run:app'],
+    'asgi': ['uvicorn', 'asgi:app', '--workers', '1', '--no-access-log']
+}
+SCENARIOS = ['user_changes']
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def seeded_app_credentials(app, app_id):
+    from app.extensions import db
+    from app.models import CompanyApp
+
+    with app.app_context():
+        company_app = db.session.get(CompanyApp, app_id)
+        return company_app.client_id, company_app.client_secret
+
+
+def start_server(kind, database_url):
+    port = free_port()
+    command = list(SERVERS[kind])
+    if kind == 'wsgi':
+        command[1:1] = ['--bind', f'127.0.0.1:{port}']
+    else:
+        command += ['--host', '127.0.0.1', '--port', str(port)]
+
+    env = dict(os.environ, DATABASE_URL=database_url, FLASK_CONFIG='benchmark',
+               GUNICORN_BOOTSTRAP='false', METRICS_ENABLED='false')
+    process = subprocess.Popen(command, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    base_url = f'http://127.0.0.1:{port}'
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            requests.get(f'{base_url}/api/auth/health', timeout=1)
+            return process, base_url
+        except requests.RequestException:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f'{kind} server did not start')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', help='Dropped and re-seeded! Defaults to a temporary SQLite file')
+    parser.add_argument('--levels', default='1,8,32,64', help='Comma separated concurrency levels')
+    parser.add_argument('-d', '--duration', type=float, default=5.0, help='Seconds per level and scenario')
+    parser.add_argument('-o', '--output', help='Write JSON results to this path')
+    args = parser.parse_args(argv)
+
+    database_url = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='hub-bench-'), 'bench.db')
+    levels = [int(level) for level in args.levels.split(',')]
+
+    app = boot_app(database_url)
+    emails = seed_database(app, users=max(levels), bcrypt_rounds=4)
+    app_credentials = seeded_app_credentials(app, 1)
+
+    results = {}
+    for kind in SERVERS:
+        process, base_url = start_server(kind, database_url)
+        try:
+            for level in levels:
+                contexts = prepare_contexts(base_url, emails, level, app_id=1)
+                for context in contexts:
+                    context['app_credentials'] = app_credentials
+                for scenario in SCENARIOS:
+                    stats = run_load(request_for(scenario), contexts, args.duration)
+                    results[f'{kind}/{scenario}/c{level}'] = stats
+                    print(
+                        f"{kind:<5} {scenario:<13} c={level:<4} {stats['throughput_rps']:>9.1f} rps  "
+                        f"p50 {stats['p50_ms']:>8.2f} ms  p99 {stats['p99_ms']:>8.2f} ms  errors {stats['errors']}"
+                    )
+        finally:
+            process.terminate()
+            process.wait()
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        save_results(args.output, {
+            'meta': result_metadata(benchmark='asgi', database=database_url.split(':', 1)[0],
+                                    levels=levels, duration_s=args.duration),
+            'scenarios': results
+        })
+        print(f'Results written to {args.output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
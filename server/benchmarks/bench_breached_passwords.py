@@ -0,0 +1,99 @@
+# benchmarks/bench_breached_passwords.py
+"""Breached password filter benchmark: build rate, lookup cost and false positive rate of
+app/utils/breached_passwords.py.
+
+Run from the ``server`` directory:
+
+    python -m benchmarks.bench_breached_passwords --entries 10000000 --output results/breached.json
+    python -m benchmarks.bench_http compare results/breached-before.json results/breached.json
+
+The filter is built from SHA-1 hashes of synthetic passwords into a temporary file, then
+memory-mapped the way workers map it. ``lookup_breached`` checks passwords that are in the
+dump (every one must be reported: a miss is a mismatch); ``lookup_fresh`` checks passwords
+that are not, and the share reported anyway is compared with ``--fp-rate``. ``build`` times
+chunks of ``--chunk`` entries; a full HIBP dump (~900M hashes) builds in about
+900M / (entries/s) seconds and needs the printed size in memory while building.
+"""
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import time
+
+from benchmarks.common import result_metadata, save_results, summarize
+from app.utils.breached_passwords import BloomFilter, build_filter, filter_size
+
+
+def digests(count, chunk, latencies):
+    t = time.perf_counter()
+    for i in range(count):
+        yield hashlib.sha1(f'breached-{i}'.encode()).digest()
+        if (i + 1) % chunk == 0:
+            now = time.perf_counter()
+            latencies.append(now - t)
+            t = now
+
+
+def time_calls(fn, args_list):
+    latencies = []
+    start = time.perf_counter()
+    for args in args_list:
+        t = time.perf_counter()
+        fn(*args)
+        latencies.append(time.perf_counter() - t)
+    return summarize(latencies, 0, time.perf_counter() - start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--entries', type=int, default=2000000, help='Hashes in the dump')
+    parser.add_argument('--fp-rate', type=float, default=0.001)
+    parser.add_argument('--lookups', type=int, default=200000)
+    parser.add_argument('--chunk', type=int, default=100000, help='Entries per timed build chunk')
+    parser.add_argument('-o', '--output', help='Write JSON results to this path')
+    args = parser.parse_args(argv)
+
+    blocks, k = filter_size(args.entries, args.fp_rate)
+    print(f'{args.entries} entries: {blocks * 64 / 2**20:.1f} MiB, k={k}')
+    fd, path = tempfile.mkstemp(suffix='.bloom')
+    os.close(fd)
+    try:
+        chunks = []
+        start = time.perf_counter()
+        build_filter(digests(args.entries, args.chunk, chunks), args.entries, path, args.fp_rate)
+        build_seconds = time.perf_counter() - start
+        scenarios = {'build': summarize(chunks, 0, build_seconds)}
+
+        breached = BloomFilter(path)
+        known = [(f'breached-{i * (args.entries // args.lookups or 1) % args.entries}',) for i in range(args.lookups)]
+        fresh = [(f'fresh-{i}',) for i in range(args.lookups)]
+        scenarios['lookup_breached'] = time_calls(breached.__contains__, known)
+        scenarios['lookup_fresh'] = time_calls(breached.__contains__, fresh)
+
+        mismatches = sum(password not in breached for password, in known)
+        false_positives = sum(password in breached for password, in fresh) / len(fresh)
+        breached.close()
+    finally:
+        os.unlink(path)
+
+    for name, stats in scenarios.items():
+        print(f"{name:<16} {stats['throughput_rps']:>12.1f} ops/s  p50 {stats['p50_ms']:>9.4f} ms  "
+              f"p99 {stats['p99_ms']:>9.4f} ms")
+    print(f'build {args.entries / build_seconds:.0f} entries/s; false positives {false_positives:.4%} '
+          f'(target {args.fp_rate:.4%}); {mismatches} breached passwords missed')
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        save_results(args.output, {
+            'meta': result_metadata(benchmark='breached_passwords', entries=args.entries, fp_rate=args.fp_rate,
+                                    false_positive_rate=false_positives,
+                                    build_entries_per_second=round(args.entries / build_seconds)),
+            'scenarios': scenarios
+        })
+        print(f'Results written to {args.output}')
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,182 @@
+# benchmarks/bench_http.py
+"""HTTP benchmark for the auth, SSO and admin hot paths.
+
+Run from the ``server`` directory:
+
+    python -m benchmarks.bench_http run --output results/sqlite.json
+    python -m benchmarks.bench_http run --database-url postgresql://localhost/hub_bench -c 32
+    python -m benchmarks.bench_http compare results/before.json results/after.json
+
+The app is booted with ``create_app('benchmark')`` (rate limiting off, SendGrid stubbed)
+against a freshly seeded database and served on a local port. Pass ``--url`` to drive an
+already running server (e.g. gunicorn) that points at the same database instead.
+"""
+import argparse
+import os
+import sys
+import tempfile
+
+from benchmarks.common import (
+    ADMIN_EMAIL, BENCH_PASSWORD, ServerThread, boot_app, compare_results,
+    result_metadata, run_load, save_results, seed_database
+)
+
+SCENARIOS = ['login', 'refresh', 'dashboard', 'sso_generate', 'sso_validate', 'audit_logs', 'change_password']
+
+
+def _login(session, base_url, email):
+    response = session.post(f'{base_url}/api/auth/login', json={'email': email, 'password': BENCH_PASSWORD})
+    response.raise_for_status()
+    return response.json()
+
+
+def seeded_login_emails(app, count):
+    """Pick users from a database loaded by benchmarks.seed that can log in without MFA."""
+    from app.models import User
+
+    with app.app_context():
+        users = User.query.filter_by(is_active=True, mfa_enabled=False, role='user') \
+            .order_by(User.id).limit(count).all()
+        return [user.email for user in users]
+
+
+def prepare_contexts(base_url, emails, concurrency, app_id):
+    """Log one user in per worker so every thread carries its own tokens."""
+    import requests
+
+    session = requests.Session()
+    admin_tokens = _login(session, base_url, ADMIN_EMAIL)
+    contexts = []
+    for i in range(concurrency):
+        email = emails[i % len(emails)]
+        tokens = _login(session, base_url, email)
+        auth = {'Authorization': f"Bearer {tokens['access_token']}"}
+        sso = session.post(f'{base_url}/api/sso/generate-token', json={'app_id': app_id}, headers=auth)
+        sso.raise_for_status()
+        contexts.append({
+            'base_url': base_url,
+            'email': email,
+            'auth': auth,
+            'refresh_auth': {'Authorization': f"Bearer {tokens['refresh_token']}"},
+            'admin_auth': {'Authorization': f"Bearer {admin_tokens['access_token']}"},
+            'sso_token': sso.json()['sso_token'],
+            'app_id': app_id
+        })
+    return contexts
+
+
+def request_for(scenario):
+    if scenario == 'login':
+        return lambda s, c: s.post(
+            f"{c['base_url']}/api/auth/login", json={'email': c['email'], 'password': BENCH_PASSWORD}
+        )
+    if scenario == 'refresh':
+        return lambda s, c: s.post(f"{c['base_url']}/api/auth/refresh", headers=c['refresh_auth'])
+    if scenario == 'dashboard':
+        return lambda s, c: s.get(f"{c['base_url']}/api/user/dashboard", headers=c['auth'])
+    if scenario == 'sso_generate':
+        return lambda s, c: s.post(
+            f"{c['base_url']}/api/sso/generate-token", json={'app_id': c['app_id']}, headers=c['auth']
+        )
+    if scenario == 'sso_validate':
+        return lambda s, c: s.post(f"{c['base_url']}/api/sso/validate", json={'token': c['sso_token']})
+    if scenario == 'change_password':
+        # Re-sets the same password: a full bcrypt hash plus one write transaction
+        return lambda s, c: s.post(
+            f"{c['base_url']}/api/auth/change-password",
+            json={'current_password': BENCH_PASSWORD, 'new_password': BENCH_PASSWORD}, headers=c['auth']
+        )
+    if scenario == 'user_changes':
+        # Needs the app's client credentials in the context (bench_asgi adds them)
+        return lambda s, c: s.get(f"{c['base_url']}/api/sso/changes", auth=c['app_credentials'])
+    if scenario == 'audit_logs':
+        return lambda s, c: s.get(f"{c['base_url']}/api/admin/audit-logs?per_page=20", headers=c['admin_auth'])
+    raise ValueError(f'Unknown scenario: {scenario}')
+
+
+def run(args):
+    database_url = args.database_url
+    if not database_url:
+        database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='hub-bench-'), 'bench.db')
+
+    app = boot_app(database_url)
+    if args.skip_seed:
+        emails = seeded_login_emails(app, args.concurrency)
+    else:
+        emails = seed_database(app, users=args.users, apps=args.apps, audit_rows=args.audit_rows,
+                               bcrypt_rounds=args.bcrypt_rounds)
+
+    server = None
+    base_url = args.url
+    if not base_url:
+        server = ServerThread(app)
+        server.start()
+        base_url = server.url
+
+    try:
+        contexts = prepare_contexts(base_url, emails, args.concurrency, app_id=1)
+        scenarios = args.scenarios.split(',') if args.scenarios else SCENARIOS
+        results = {}
+        for scenario in scenarios:
+            stats = run_load(request_for(scenario), contexts, args.duration)
+            results[scenario] = stats
+            print(
+                f"{scenario:<14} {stats['throughput_rps']:>9.1f} rps  "
+                f"p50 {stats['p50_ms']:>8.2f} ms  p95 {stats['p95_ms']:>8.2f} ms  "
+                f"p99 {stats['p99_ms']:>8.2f} ms  errors {stats['errors']}"
+            )
+    finally:
+        if server:
+            server.shutdown()
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        save_results(args.output, {
+            'meta': result_metadata(
+                benchmark='http',
+                database=database_url.split(':', 1)[0],
+                concurrency=args.concurrency,
+                duration_s=args.duration,
+                users=None if args.skip_seed else args.users,
+                bcrypt_rounds=args.bcrypt_rounds,
+                server=args.url or 'werkzeug-threaded'
+            ),
+            'scenarios': results
+        })
+        print(f'Results written to {args.output}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = sub.add_parser('run', help='Seed a database and benchmark the hot paths')
+    run_parser.add_argument('--database-url',
+                            help='Dropped and re-seeded! Defaults to a temporary SQLite file')
+    run_parser.add_argument('--skip-seed', action='store_true',
+                            help='Use a database already loaded with benchmarks.seed')
+    run_parser.add_argument('--url', help='Benchmark an already running server instead of an in-process one')
+    run_parser.add_argument('-c', '--concurrency', type=int, default=8)
+    run_parser.add_argument('-d', '--duration', type=float, default=10.0, help='Seconds per scenario')
+    run_parser.add_argument('--scenarios', help=f"Comma separated subset of: {','.join(SCENARIOS)}")
+    run_parser.add_argument('--users', type=int, default=200)
+    run_parser.add_argument('--apps', type=int, default=5)
+    run_parser.add_argument('--audit-rows', type=int, default=1000)
+    run_parser.add_argument('--bcrypt-rounds', type=int, default=12)
+    run_parser.add_argument('-o', '--output', help='Write JSON results to this path')
+
+    compare_parser = sub.add_parser('compare', help='Compare two result files')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('candidate')
+    compare_parser.add_argument('--threshold', type=float, default=10.0,
+                                help='Allowed p95/throughput change in percent before failing')
+
+    args = parser.parse_args(argv)
+    if args.command == 'run':
+        run(args)
+        return 0
+    return 1 if compare_results(args.baseline, args.candidate, args.threshold) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,114 @@
+# benchmarks/bench_ip_policy.py
+"""IP allowlist benchmark: compile time and per-check cost of app/utils/ip_policy.py.
+
+Run from the ``server`` directory:
+
+    python -m benchmarks.bench_ip_policy --ranges 5000 --lookups 100000 --output results/ip_policy.json
+    python -m benchmarks.bench_http compare results/ip_policy-before.json results/ip_policy.json
+
+Each app allowlist mixes IPv4 CIDRs, IPv4 ranges and IPv6 prefixes; lookups are half
+allowed, half denied addresses. ``naive_scan`` is the old behaviour extended to CIDRs:
+every check walks the whole list.
+"""
+import argparse
+import ipaddress
+import os
+import random
+import sys
+import time
+
+from benchmarks.common import result_metadata, save_results, summarize
+from app.utils.ip_policy import IPPolicy
+
+
+def make_allowlist(rng, count):
+    entries = []
+    for i in range(count):
+        kind = i % 3
+        if kind == 0:
+            base = ipaddress.IPv4Address(rng.getrandbits(32) & 0xFFFFFF00)
+            entries.append(f'{base}/{rng.choice((24, 26, 28, 32))}')
+        elif kind == 1:
+            first = rng.getrandbits(32)
+            last = min(first + rng.randrange(1, 500), 2**32 - 1)
+            entries.append(f'{ipaddress.IPv4Address(first)}-{ipaddress.IPv4Address(last)}')
+        else:
+            base = ipaddress.IPv6Address(rng.getrandbits(128) & ~((1 << 80) - 1))
+            entries.append(f'{base}/48')
+    return entries
+
+
+def make_lookups(rng, entries, count):
+    networks = [ipaddress.ip_network(e, strict=False) for e in entries if '-' not in e]
+    addresses = []
+    for i in range(count):
+        if i % 2 == 0:
+            network = rng.choice(networks)
+            addresses.append(str(network.network_address + rng.randrange(network.num_addresses)))
+        else:
+            addresses.append(str(ipaddress.IPv4Address(rng.getrandbits(32))))
+    return addresses
+
+
+def naive_allows(entries, ip_address):
+    address = ipaddress.ip_address(ip_address)
+    for entry in entries:
+        if '-' in entry:
+            first, last = (ipaddress.ip_address(part) for part in entry.split('-'))
+            if first.version == address.version and first <= address <= last:
+                return True
+        else:
+            network = ipaddress.ip_network(entry, strict=False)
+            if network.version == address.version and address in network:
+                return True
+    return False
+
+
+def time_calls(fn, args_list):
+    latencies = []
+    start = time.perf_counter()
+    for args in args_list:
+        t = time.perf_counter()
+        fn(*args)
+        latencies.append(time.perf_counter() - t)
+    return summarize(latencies, 0, time.perf_counter() - start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--ranges', type=int, default=5000, help='Allowlist entries per app')
+    parser.add_argument('--lookups', type=int, default=100000)
+    parser.add_argument('--naive-lookups', type=int, default=200, help='The linear scan is slow; sample fewer')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('-o', '--output', help='Write JSON results to this path')
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    entries = make_allowlist(rng, args.ranges)
+    lookups = make_lookups(rng, entries, args.lookups)
+
+    scenarios = {'compile': time_calls(IPPolicy, [(entries,)] * 20)}
+    policy = IPPolicy(entries)
+    scenarios['compiled_lookup'] = time_calls(policy.allows, [(ip,) for ip in lookups])
+    scenarios['naive_scan'] = time_calls(
+        lambda ip: naive_allows(entries, ip), [(ip,) for ip in lookups[:args.naive_lookups]]
+    )
+
+    mismatches = sum(policy.allows(ip) != naive_allows(entries, ip) for ip in lookups[:args.naive_lookups])
+    for name, stats in scenarios.items():
+        print(f"{name:<16} {stats['throughput_rps']:>12.1f} ops/s  p50 {stats['p50_ms']:>9.4f} ms  "
+              f"p99 {stats['p99_ms']:>9.4f} ms")
+    print(f'{args.ranges} entries, {mismatches} mismatches against the linear scan')
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        save_results(args.output, {
+            'meta': result_metadata(benchmark='ip_policy', ranges=args.ranges, lookups=args.lookups),
+            'scenarios': scenarios
+        })
+        print(f'Results written to {args.output}')
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
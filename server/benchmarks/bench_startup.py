@@ -0,0 +1,74 @@
+# benchmarks/bench_startup.py
+"""Cold-start benchmark: time to import the app package and build it with create_app.
+
+Run from the ``server`` directory:
+
+    python -m benchmarks.bench_startup --runs 20 --output results/startup.json
+    python -m benchmarks.bench_http compare results/startup-before.json results/startup.json
+
+Every run is a fresh interpreter, like a new gunicorn worker without preloading.
+``--config development`` includes the per-process bootstrap (tables, super admin).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.common import result_metadata, save_results, summarize
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+create_app(sys.argv[1])
+created = time.perf_counter()
+heavy = [m for m in ('qrcode', 'PIL', 'pyotp', 'sendgrid') if m in sys.modules]
+print(json.dumps({'import': imported - start, 'create_app': created - imported,
+                  'total': created - start, 'heavy_modules': heavy}))
+"""
+
+
+def probe(config_name, env):
+    output = subprocess.check_output(
+        [sys.executable, '-c', PROBE, config_name], env=env, stderr=subprocess.DEVNULL, text=True
+    )
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--config', default='production')
+    parser.add_argument('--database-url', help='Defaults to a temporary SQLite file')
+    parser.add_argument('-o', '--output', help='Write JSON results to this path')
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ)
+    env['DATABASE_URL'] = args.database_url or 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'startup.db')
+    env['PYTHONPATH'] = os.getcwd() + os.pathsep + env.get('PYTHONPATH', '')
+
+    samples = [probe(args.config, env) for _ in range(args.runs)]
+
+    scenarios = {}
+    for phase in ('import', 'create_app', 'total'):
+        values = [sample[phase] for sample in samples]
+        scenarios[phase] = summarize(values, 0, sum(values))
+        print(f"{phase:<11} p50 {scenarios[phase]['p50_ms']:>8.1f} ms  p95 {scenarios[phase]['p95_ms']:>8.1f} ms")
+    print(f"heavy modules loaded at startup: {', '.join(samples[-1]['heavy_modules']) or 'none'}")
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        save_results(args.output, {
+            'meta': result_metadata(benchmark='startup', config=args.config, runs=args.runs,
+                                    heavy_modules=samples[-1]['heavy_modules']),
+            'scenarios': scenarios
+        })
+        print(f'Results written to {args.output}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,114 @@
+# benchmarks/bench_validation.py
+"""Request validation benchmark: per-body cost of app/utils/validation.py.
+
+Run from the ``server`` directory:
+
+    python -m benchmarks.bench_validation --bodies 100000 --output results/validation.json
+    python -m benchmarks.bench_http compare results/validation-before.json results/validation.json
+
+Bodies are the login, change-password and enroll-user payloads, a quarter of them
+invalid (missing, mistyped, too short or unknown fields). ``schema_per_request`` is the old
+behaviour: a new Schema instance per request; ``schema_load`` reuses one instance;
+``compiled`` is what @validate_body runs. Every body is also checked for the same result
+(or the same errors) as ``Schema.load``.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+from marshmallow import ValidationError
+
+from benchmarks.common import result_metadata, save_results, summarize
+from app.schemas.admin_schemas import EnrollUserSchema
+from app.schemas.auth_schemas import LoginSchema, ChangePasswordSchema
+from app.utils.validation import compile_schema
+
+SCHEMAS = (LoginSchema, ChangePasswordSchema, EnrollUserSchema)
+
+
+def make_body(rng, schema, valid):
+    if schema is LoginSchema:
+        body = {'email': f'user{rng.randrange(10**6)}@example.com', 'password': 'Passw0rd!'}
+    elif schema is ChangePasswordSchema:
+        body = {'current_password': 'Passw0rd!', 'new_password': 'N3w-Passw0rd!'}
+    else:
+        body = {'email': f'new{rng.randrange(10**6)}@example.com', 'first_name': 'Ada', 'last_name': 'Lovelace',
+                'role': rng.choice(('user', 'admin'))}
+    if not valid:
+        key = rng.choice(sorted(body))
+        defect = rng.randrange(4)
+        if defect == 0:
+            del body[key]
+        elif defect == 1:
+            body[key] = 12345
+        elif defect == 2:
+            body[key] = ''
+        else:
+            body['is_admin'] = True
+    return body
+
+
+def outcome(fn, body):
+    try:
+        return 'ok', fn(body)
+    except ValidationError as e:
+        return 'error', e.messages
+
+
+def time_calls(fn, args_list):
+    latencies = []
+    start = time.perf_counter()
+    for args in args_list:
+        t = time.perf_counter()
+        try:
+            fn(*args)
+        except ValidationError:
+            pass
+        latencies.append(time.perf_counter() - t)
+    return summarize(latencies, 0, time.perf_counter() - start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--bodies', type=int, default=100000)
+    parser.add_argument('--invalid', type=float, default=0.25, help='Share of invalid bodies')
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('-o', '--output', help='Write JSON results to this path')
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    bodies = []
+    for _ in range(args.bodies):
+        schema = rng.choice(SCHEMAS)
+        bodies.append((schema, make_body(rng, schema, rng.random() >= args.invalid)))
+
+    instances = {schema: schema() for schema in SCHEMAS}
+    compiled = {schema: compile_schema(schema) for schema in SCHEMAS}
+    scenarios = {
+        'schema_per_request': time_calls(lambda schema, body: schema().load(body), bodies),
+        'schema_load': time_calls(lambda schema, body: instances[schema].load(body), bodies),
+        'compiled': time_calls(lambda schema, body: compiled[schema](body), bodies)
+    }
+
+    mismatches = sum(
+        outcome(compiled[schema], body) != outcome(instances[schema].load, body) for schema, body in bodies
+    )
+    for name, stats in scenarios.items():
+        print(f"{name:<20} {stats['throughput_rps']:>12.1f} ops/s  p50 {stats['p50_ms']:>9.4f} ms  "
+              f"p99 {stats['p99_ms']:>9.4f} ms")
+    print(f'{args.bodies} bodies, {mismatches} mismatches against Schema.load')
+
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        save_results(args.output, {
+            'meta': result_metadata(benchmark='validation', bodies=args.bodies, invalid=args.invalid),
+            'scenarios': scenarios
+        })
+        print(f'Results written to {args.output}')
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
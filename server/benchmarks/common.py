@@ -0,0 +1,214 @@
+# benchmarks/common.py
+"""Shared pieces of the benchmark harness: app boot, seeding, load driving and result files."""
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import bcrypt
+import requests
+
+BENCH_PASSWORD = 'Bench-Passw0rd'
+ADMIN_EMAIL = 'bench-admin@example.com'
+
+
+def boot_app(database_url, config_name='benchmark'):
+    """Create the Flask app against ``database_url`` with outbound email stubbed out."""
+    # Config reads the environment at import time, so set it before importing the app
+    os.environ['DATABASE_URL'] = database_url
+    os.environ.setdefault('METRICS_ENABLED', 'false')
+
+    from app import create_app
+    from app.services.email_service import EmailService
+
+    EmailService._send_email = staticmethod(lambda to_email, subject, html_content: None)
+    return create_app(config_name)
+
+
+def seed_database(app, users=200, apps=5, audit_rows=1000, bcrypt_rounds=12):
+    """Create the schema and a small deterministic dataset. Returns the seeded emails."""
+    from app.extensions import db
+    from app.models import User, CompanyApp, AuditLog
+
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+
+        # Hash once and share it: seeding should not be dominated by bcrypt
+        password_hash = bcrypt.hashpw(
+            BENCH_PASSWORD.encode('utf-8'), bcrypt.gensalt(rounds=bcrypt_rounds)
+        ).decode('utf-8')
+
+        emails = [f'bench-user-{i}@example.com' for i in range(users)]
+        common = dict(
+            password_hash=password_hash, last_name='Bench', is_verified=True,
+            first_login=False, onboarding_completed=True, login_attempts=0
+        )
+        db.session.add(User(email=ADMIN_EMAIL, first_name='Admin', role='admin', **common))
+        db.session.bulk_save_objects([
+            User(email=email, first_name=f'User{i}', role='user', **common)
+            for i, email in enumerate(emails)
+        ])
+        db.session.bulk_save_objects([
+            CompanyApp(
+                name=f'App {i}', description='Benchmark app',
+                app_url=f'https://app{i}.example.com',
+                sso_callback_url=f'https://app{i}.example.com/sso/callback'
+            )
+            for i in range(apps)
+        ])
+        db.session.commit()
+
+        admin_id = User.query.filter_by(email=ADMIN_EMAIL).first().id
+        db.session.bulk_save_objects([
+            AuditLog(
+                user_id=admin_id, action='login_success', ip_address='127.0.0.1',
+                user_agent='benchmark', details=f'seed row {i}'
+            )
+            for i in range(audit_rows)
+        ])
+        db.session.commit()
+
+    return emails
+
+
+class ServerThread(threading.Thread):
+    """Serve the app with werkzeug's threaded server on a free local port."""
+
+    def __init__(self, app):
+        super().__init__(daemon=True)
+        from werkzeug.serving import make_server
+        # Per-request access logging would dominate the measurement
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+        self.server = make_server('127.0.0.1', 0, app, threaded=True)
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+
+    def run(self):
+        self.server.serve_forever()
+
+    def shutdown(self):
+        self.server.shutdown()
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    k = (len(sorted_values) - 1) * pct / 100
+    lower = int(k)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (k - lower)
+
+
+def summarize(latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    ms = lambda v: round(v * 1000, 3)
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'mean_ms': ms(statistics.fmean(latencies)) if latencies else 0.0,
+        'p50_ms': ms(percentile(latencies, 50)),
+        'p95_ms': ms(percentile(latencies, 95)),
+        'p99_ms': ms(percentile(latencies, 99)),
+        'max_ms': ms(latencies[-1]) if latencies else 0.0
+    }
+
+
+def run_load(request_fn, contexts, duration):
+    """Call ``request_fn(session, context)`` from one thread per context for ``duration`` seconds.
+
+    ``request_fn`` returns a ``requests.Response``; anything other than 2xx/3xx counts as an error.
+    """
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.perf_counter() + duration
+
+    def worker(context):
+        session = requests.Session()
+        local_latencies = []
+        local_errors = 0
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                response = request_fn(session, context)
+                ok = response.status_code < 400
+            except requests.RequestException:
+                ok = False
+            local_latencies.append(time.perf_counter() - start)
+            if not ok:
+                local_errors += 1
+        with lock:
+            latencies.extend(local_latencies)
+            errors[0] += local_errors
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=len(contexts)) as pool:
+        list(pool.map(worker, contexts))
+    return summarize(latencies, errors[0], time.perf_counter() - started)
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL, text=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def result_metadata(**extra):
+    return {
+        'git_revision': git_revision(),
+        'timestamp': datetime.utcnow().isoformat(),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        **extra
+    }
+
+
+def save_results(path, results):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def compare_results(baseline_path, candidate_path, threshold_pct):
+    """Print per-scenario deltas. Returns True when any scenario regressed beyond the threshold."""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    with open(candidate_path) as f:
+        candidate = json.load(f)
+
+    print(f"baseline {baseline['meta'].get('git_revision')} -> candidate {candidate['meta'].get('git_revision')}")
+    print(f"{'scenario':<24}{'p95 ms':>22}{'delta':>9}{'rps':>22}{'delta':>9}")
+
+    regressed = False
+    for name, new in candidate['scenarios'].items():
+        old = baseline['scenarios'].get(name)
+        if not old:
+            continue
+        p95_delta = _pct_change(old['p95_ms'], new['p95_ms'])
+        rps_delta = _pct_change(old['throughput_rps'], new['throughput_rps'])
+        flag = ''
+        if p95_delta > threshold_pct or rps_delta < -threshold_pct:
+            regressed = True
+            flag = '  REGRESSION'
+        print(
+            f"{name:<24}{old['p95_ms']:>10.2f} -> {new['p95_ms']:<9.2f}{p95_delta:>+8.1f}%"
+            f"{old['throughput_rps']:>10.1f} -> {new['throughput_rps']:<9.1f}{rps_delta:>+8.1f}%{flag}"
+        )
+    return regressed
+
+
+def _pct_change(old, new):
+    if not old:
+        return 0.0
+    return (new - old) / old * 100
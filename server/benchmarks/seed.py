@@ -0,0 +1,353 @@
+# benchmarks/seed.py
+"""Bulk data generator for scale testing.
+
+Run from the ``server`` directory:
+
+    python -m benchmarks.seed --database-url postgresql://localhost/hub_scale \\
+        --users 1000000 --audit-rows 100000000 --workers 8 --reset
+
+Rows are generated in fixed-size chunks, each from its own RNG derived from ``--seed``,
+so the same arguments always produce the same data regardless of ``--workers``.
+Timestamps are spread backwards from ``--epoch`` (default: today, midnight UTC); pin it
+to reproduce a dataset on another day.
+PostgreSQL chunks are streamed with COPY from parallel worker processes; SQLite chunks
+are written with executemany from a single process (SQLite allows one writer anyway).
+
+Passwords are never hashed per user: a small pool of bcrypt hashes of
+``benchmarks.common.BENCH_PASSWORD`` is computed up front and assigned round-robin, so
+every seeded user can log in with that password. User id 1 is the benchmark admin.
+"""
+import argparse
+import io
+import json
+import multiprocessing
+import random
+import sqlite3
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+import bcrypt
+from sqlalchemy.engine import make_url
+
+from benchmarks.common import ADMIN_EMAIL, BENCH_PASSWORD
+
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+DEFAULT_CHUNK_SIZE = 100_000
+
+FIRST_NAMES = [
+    'James', 'Mary', 'Thabo', 'Lerato', 'Sipho', 'Naledi', 'John', 'Patricia', 'Michael', 'Linda',
+    'David', 'Zanele', 'Pieter', 'Anele', 'Sarah', 'Kagiso', 'Ahmed', 'Priya', 'Chen', 'Fatima',
+    'Daniel', 'Nomsa', 'Lebo', 'Emma', 'Johan', 'Ayanda', 'Grace', 'Musa', 'Olivia', 'Tumelo'
+]
+LAST_NAMES = [
+    'Smith', 'Nkosi', 'Dlamini', 'Botha', 'Naidoo', 'Mokoena', 'Van der Merwe', 'Khumalo', 'Pillay',
+    'Ndlovu', 'Johnson', 'Williams', 'Mahlangu', 'Pretorius', 'Mthembu', 'Brown', 'Sithole', 'Patel',
+    'Zulu', 'Molefe', 'Jacobs', 'Fourie', 'Radebe', 'Chetty', 'Meyer'
+]
+AUDIT_ACTIONS = [
+    ('login_success', 30), ('view_user_dashboard', 25), ('token_refreshed', 15),
+    ('sso_token_generated', 8), ('sso_token_validated', 8), ('login_failed', 5), ('logout', 4),
+    ('profile_updated', 1), ('onboarding_progress', 1), ('password_changed', 1),
+    ('mfa_verification_success', 1), ('password_reset_requested', 1)
+]
+USER_AGENTS = [
+    'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0 Safari/537.36',
+    'Mozilla/5.0 (Macintosh; Intel Mac OS X 14_5) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/17.5 Safari/605.1.15',
+    'Mozilla/5.0 (iPhone; CPU iPhone OS 17_5 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) Mobile/15E148',
+    'Dart/3.4 (dart:io)',
+    'Mozilla/5.0 (X11; Linux x86_64; rv:127.0) Gecko/20100101 Firefox/127.0'
+]
+BASE32_ALPHABET = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ234567'
+SEED_TENANT = 'default'
+
+TABLE_COLUMNS = {
+    'users': [
+        'id', 'email', 'password_hash', 'first_name', 'last_name', 'role', 'is_active', 'is_verified',
+        'mfa_enabled', 'mfa_secret', 'onboarding_completed', 'first_login', 'last_login', 'created_at',
+        'updated_at', 'login_attempts', 'locked_until', 'password_changed_at', 'tenant_id'
+    ],
+    'company_apps': [
+        'id', 'name', 'description', 'app_url', 'sso_callback_url', 'is_active', 'created_at',
+        'updated_at', 'client_id', 'client_secret', 'allowed_roles', 'allowed_ips', 'tenant_id'
+    ],
+    'audit_logs': [
+        'id', 'user_id', 'action', 'resource', 'resource_id', 'ip_address', 'user_agent', 'timestamp',
+        'details', 'status', 'endpoint', 'method', 'tenant_id'
+    ],
+    'password_resets': ['id', 'user_id', 'token', 'expires_at', 'is_used', 'created_at', 'ip_address', 'user_agent'],
+    'token_blocklist': ['id', 'jti', 'token_type', 'user_id', 'expires_at', 'created_at']
+}
+
+
+def seed_user_email(user_id):
+    if user_id == 1:
+        return ADMIN_EMAIL
+    first = FIRST_NAMES[user_id % len(FIRST_NAMES)].lower()
+    last = LAST_NAMES[(user_id // len(FIRST_NAMES)) % len(LAST_NAMES)].lower().replace(' ', '')
+    return f'{first}.{last}.{user_id}@example.com'
+
+
+def password_pool(size, rounds):
+    return [
+        bcrypt.hashpw(BENCH_PASSWORD.encode('utf-8'), bcrypt.gensalt(rounds=rounds)).decode('utf-8')
+        for _ in range(size)
+    ]
+
+
+def _ts(rng, epoch, days_back):
+    return epoch - timedelta(seconds=rng.randrange(days_back * 86400))
+
+
+def _ip(rng):
+    return f'{rng.choice((10, 41, 102, 105, 196))}.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(1, 255)}'
+
+
+def generate_users(rng, start_id, count, ctx):
+    pool = ctx['password_pool']
+    for user_id in range(start_id, start_id + count):
+        created_at = _ts(rng, ctx['epoch'], 3 * 365)
+        mfa_enabled = rng.random() < 0.2
+        role = 'admin' if user_id == 1 or rng.random() < 0.02 else 'user'
+        last_login = created_at + timedelta(seconds=rng.randrange(90 * 86400)) if rng.random() < 0.9 else None
+        yield (
+            user_id, seed_user_email(user_id), pool[user_id % len(pool)],
+            FIRST_NAMES[user_id % len(FIRST_NAMES)],
+            LAST_NAMES[(user_id // len(FIRST_NAMES)) % len(LAST_NAMES)],
+            role, user_id == 1 or rng.random() < 0.97, True,
+            mfa_enabled and user_id != 1,
+            ''.join(rng.choice(BASE32_ALPHABET) for _ in range(32)) if mfa_enabled and user_id != 1 else None,
+            True, False, last_login, created_at, last_login or created_at, 0, None, created_at, SEED_TENANT
+        )
+
+
+def generate_company_apps(rng, start_id, count, ctx):
+    for app_id in range(start_id, start_id + count):
+        created_at = _ts(rng, ctx['epoch'], 3 * 365)
+        yield (
+            app_id, f'App {app_id}', f'Internal application #{app_id}',
+            f'https://app{app_id}.example.com', f'https://app{app_id}.example.com/sso/callback',
+            rng.random() < 0.9, created_at, created_at,
+            str(uuid.UUID(int=rng.getrandbits(128), version=4)), '%032x' % rng.getrandbits(128),
+            '[]', '[]', SEED_TENANT
+        )
+
+
+def generate_audit_logs(rng, start_id, count, ctx):
+    users = ctx['users']
+    actions, weights = zip(*AUDIT_ACTIONS)
+    # Draw all actions for the chunk at once; choices() is much faster than per-row calls
+    chosen = rng.choices(actions, weights=weights, k=count)
+    for offset, row_id in enumerate(range(start_id, start_id + count)):
+        action = chosen[offset]
+        status = 'failed' if action == 'login_failed' else 'success'
+        resource_id = str(rng.randrange(1, ctx['apps'] + 1)) if action.startswith('sso') else None
+        yield (
+            row_id, rng.randrange(1, users + 1), action, 'app' if resource_id else None, resource_id,
+            _ip(rng), rng.choice(USER_AGENTS), _ts(rng, ctx['epoch'], 365), None, status, None, None,
+            SEED_TENANT
+        )
+
+
+def generate_password_resets(rng, start_id, count, ctx):
+    for row_id in range(start_id, start_id + count):
+        created_at = _ts(rng, ctx['epoch'], 180)
+        yield (
+            row_id, rng.randrange(1, ctx['users'] + 1), '%064x' % rng.getrandbits(256),
+            created_at + timedelta(hours=1), rng.random() < 0.7, created_at, _ip(rng), rng.choice(USER_AGENTS)
+        )
+
+
+def generate_token_blocklist(rng, start_id, count, ctx):
+    for row_id in range(start_id, start_id + count):
+        created_at = _ts(rng, ctx['epoch'], 60)
+        token_type = 'refresh' if rng.random() < 0.3 else 'access'
+        lifetime = timedelta(days=30) if token_type == 'refresh' else timedelta(hours=1)
+        yield (
+            row_id, str(uuid.UUID(int=rng.getrandbits(128), version=4)), token_type,
+            rng.randrange(1, ctx['users'] + 1), created_at + lifetime, created_at
+        )
+
+
+GENERATORS = {
+    'users': generate_users,
+    'company_apps': generate_company_apps,
+    'audit_logs': generate_audit_logs,
+    'password_resets': generate_password_resets,
+    'token_blocklist': generate_token_blocklist
+}
+
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    if value is True:
+        return 't'
+    if value is False:
+        return 'f'
+    if isinstance(value, datetime):
+        return value.strftime(TIMESTAMP_FORMAT)
+    return str(value)
+
+
+def _sqlite_value(value):
+    if isinstance(value, datetime):
+        return value.strftime(TIMESTAMP_FORMAT)
+    return value
+
+
+def _postgres_dsn(database_url):
+    return make_url(database_url).set(drivername='postgresql').render_as_string(hide_password=False)
+
+
+def write_chunk(job):
+    """Generate and load one chunk. Runs inside a worker process for PostgreSQL."""
+    table, chunk_index, start_id, count, ctx = job
+    rng = random.Random(f"{ctx['seed']}:{table}:{chunk_index}")
+    rows = GENERATORS[table](rng, start_id, count, ctx)
+    columns = TABLE_COLUMNS[table]
+
+    if ctx['dialect'] == 'postgresql':
+        import psycopg2
+
+        buffer = io.StringIO()
+        buffer.writelines('\t'.join(_copy_value(v) for v in row) + '\n' for row in rows)
+        buffer.seek(0)
+        connection = psycopg2.connect(_postgres_dsn(ctx['database_url']))
+        try:
+            with connection, connection.cursor() as cursor:
+                cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+        finally:
+            connection.close()
+    else:
+        connection = sqlite3.connect(ctx['sqlite_path'])
+        try:
+            with connection:
+                connection.executemany(
+                    f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})",
+                    ([_sqlite_value(v) for v in row] for row in rows)
+                )
+        finally:
+            connection.close()
+    return count
+
+
+def seed_table(table, total, ctx, workers, chunk_size):
+    if total <= 0:
+        return
+    jobs = [
+        (table, index, start + 1, min(chunk_size, total - start), ctx)
+        for index, start in enumerate(range(0, total, chunk_size))
+    ]
+
+    started = time.perf_counter()
+    done = 0
+    if workers > 1:
+        with multiprocessing.Pool(workers) as pool:
+            for count in pool.imap_unordered(write_chunk, jobs):
+                done += count
+                _progress(table, done, total, started)
+    else:
+        for job in jobs:
+            done += write_chunk(job)
+            _progress(table, done, total, started)
+    print()
+
+
+def _progress(table, done, total, started):
+    elapsed = time.perf_counter() - started
+    rate = done / elapsed if elapsed else 0
+    print(f'\r{table:<16} {done:>12,}/{total:,} rows  {rate:>10,.0f} rows/s  {elapsed:>7.1f}s', end='', flush=True)
+
+
+def prepare_schema(database_url, reset):
+    from benchmarks.common import boot_app
+
+    app = boot_app(database_url)
+    from app.extensions import db
+    with app.app_context():
+        if reset:
+            db.drop_all()
+        db.create_all()
+
+
+def finish(ctx):
+    """Bring sequences in line with the explicit ids and refresh planner statistics."""
+    if ctx['dialect'] != 'postgresql':
+        connection = sqlite3.connect(ctx['sqlite_path'])
+        connection.execute('ANALYZE')
+        connection.close()
+        return
+
+    import psycopg2
+
+    connection = psycopg2.connect(_postgres_dsn(ctx['database_url']))
+    connection.autocommit = True
+    with connection.cursor() as cursor:
+        for table in TABLE_COLUMNS:
+            cursor.execute(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 1)) FROM {table}"
+            )
+            cursor.execute(f'ANALYZE {table}')
+    connection.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', required=True)
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--apps', type=int, default=20)
+    parser.add_argument('--audit-rows', type=int, default=100_000)
+    parser.add_argument('--password-resets', type=int, default=10_000)
+    parser.add_argument('--blocklist', type=int, default=10_000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--epoch', type=datetime.fromisoformat,
+                        default=datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0),
+                        help='Newest timestamp in the dataset, e.g. 2026-01-01')
+    parser.add_argument('--workers', type=int, default=multiprocessing.cpu_count())
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--password-pool', type=int, default=16, help='Number of distinct bcrypt hashes')
+    parser.add_argument('--bcrypt-rounds', type=int, default=12)
+    parser.add_argument('--reset', action='store_true', help='Drop all tables before seeding')
+    args = parser.parse_args(argv)
+
+    url = make_url(args.database_url)
+    dialect = url.get_backend_name()
+    if dialect not in ('postgresql', 'sqlite'):
+        parser.error('Only PostgreSQL and SQLite are supported')
+
+    prepare_schema(args.database_url, args.reset)
+
+    ctx = {
+        'seed': args.seed,
+        'epoch': args.epoch,
+        'dialect': dialect,
+        'database_url': args.database_url,
+        'sqlite_path': url.database if dialect == 'sqlite' else None,
+        'users': args.users,
+        'apps': args.apps,
+        'password_pool': password_pool(args.password_pool, args.bcrypt_rounds)
+    }
+    workers = args.workers if dialect == 'postgresql' else 1
+
+    started = time.perf_counter()
+    seed_table('users', args.users, ctx, workers, args.chunk_size)
+    seed_table('company_apps', args.apps, ctx, workers, args.chunk_size)
+    seed_table('audit_logs', args.audit_rows, ctx, workers, args.chunk_size)
+    seed_table('password_resets', args.password_resets, ctx, workers, args.chunk_size)
+    seed_table('token_blocklist', args.blocklist, ctx, workers, args.chunk_size)
+    finish(ctx)
+
+    print(json.dumps({
+        'seed': args.seed,
+        'epoch': args.epoch.isoformat(),
+        'users': args.users,
+        'audit_rows': args.audit_rows,
+        'elapsed_s': round(time.perf_counter() - started, 1)
+    }))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,4 +1,5 @@
 # config.py
+import json
 import os
 from datetime import timedelta
 
@@ -10,6 +11,21 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or 'sqlite:///instance/app.db'
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Multi-tenancy: the tenant comes from the JWT "tenant" claim (X-Tenant-ID before login).
+    # TENANT_SHARDS maps tenants to SQLALCHEMY_BINDS keys, e.g. {"acme": "shard1"} with
+    # {"shard1": "postgresql://..."}; other tenants stay on DATABASE_URL
+    DEFAULT_TENANT = os.environ.get('DEFAULT_TENANT', 'default')
+    TENANT_HEADER = os.environ.get('TENANT_HEADER', 'X-Tenant-ID')
+    SQLALCHEMY_BINDS = json.loads(os.environ.get('SQLALCHEMY_BINDS', '{}'))
+    TENANT_SHARDS = json.loads(os.environ.get('TENANT_SHARDS', '{}'))
+    # Super admin views query every shard in parallel; slower shards are reported as unavailable
+    TENANT_FANOUT_WORKERS = int(os.environ.get('TENANT_FANOUT_WORKERS', '8'))
+    TENANT_FANOUT_TIMEOUT = float(os.environ.get('TENANT_FANOUT_TIMEOUT', '5'))
+    # Every shard returns the first page * per_page rows for the merge: cross-tenant lists
+    # stop at this depth, and pages are at most MAX_PAGE_SIZE rows
+    TENANT_FANOUT_MAX_ROWS = int(os.environ.get('TENANT_FANOUT_MAX_ROWS', '1000'))
+    TENANT_FANOUT_MAX_PAGE_SIZE = int(os.environ.get('TENANT_FANOUT_MAX_PAGE_SIZE', '100'))
+    
     # JWT
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-super-secret-key'
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
@@ -17,6 +33,9 @@ class Config:
     
     SUPER_ADMIN_EMAIL = os.environ.get('SUPER_ADMIN_EMAIL')
 
+    # Create dev tables / super admin inside create_app (every worker) instead of once
+    BOOTSTRAP_ON_STARTUP = os.environ.get('BOOTSTRAP_ON_STARTUP', 'false').lower() == 'true'
+
     # ----------------------------
     # SendGrid Email Configuration
     # ----------------------------
@@ -31,22 +50,233 @@ class Config:
     # SSO
     SSO_JWT_SECRET = os.environ.get('SSO_JWT_SECRET') or 'sso-shared-secret-key'
     
+    # Reverse proxies in front of the app that append to X-Forwarded-For. The client address
+    # is the entry the outermost of them added; anything left of it came from the client and
+    # is ignored. 0: the socket peer is the client (X-Forwarded-For is not trusted at all)
+    TRUSTED_PROXY_COUNT = int(os.environ.get('TRUSTED_PROXY_COUNT', '0'))
+    
+    # Compiled per-app IP allowlists kept in memory (one entry per app)
+    IP_POLICY_CACHE_SIZE = int(os.environ.get('IP_POLICY_CACHE_SIZE', '1024'))
+    
     # MFA
     MFA_ISSUER = os.environ.get('MFA_ISSUER', 'Company Hub')
+
+    # MFA enrollment QR codes: compact PNG or SVG, rendered on a small process pool
+    MFA_QR_FORMAT = os.environ.get('MFA_QR_FORMAT', 'png')
+    MFA_QR_BOX_SIZE = int(os.environ.get('MFA_QR_BOX_SIZE', '4'))
+    MFA_QR_RENDER_WORKERS = int(os.environ.get('MFA_QR_RENDER_WORKERS', '2'))  # 0 renders in-process
+    MFA_QR_RENDER_TIMEOUT = float(os.environ.get('MFA_QR_RENDER_TIMEOUT', '5'))
+    MFA_QR_PREWARM = os.environ.get('MFA_QR_PREWARM', 'false').lower() == 'true'
+    MFA_QR_CACHE_SIZE = int(os.environ.get('MFA_QR_CACHE_SIZE', '256'))
+    MFA_QR_CACHE_TTL = int(os.environ.get('MFA_QR_CACHE_TTL', '600'))
+
+    # TOTP verification: steps accepted either side of now, and where last used steps are
+    # kept to reject replays. Defaults to the rate limiter's storage. memory:// is per
+    # process: another worker would accept a used code again within the window, so
+    # gunicorn.conf.py refuses to start more than one worker with it (use redis://)
+    MFA_TOTP_WINDOW = int(os.environ.get('MFA_TOTP_WINDOW', '1'))
+    MFA_TOTP_CACHE_SIZE = int(os.environ.get('MFA_TOTP_CACHE_SIZE', '4096'))
+    MFA_REPLAY_STORAGE_URL = os.environ.get('MFA_REPLAY_STORAGE_URL') or \
+        os.environ.get('RATELIMIT_STORAGE_URL', 'memory://')
+    
+    # Password resets: tokens are stored hashed and lookups go through a short-lived cache.
+    # Used and expired rows are deleted by the purge_password_resets job (interval in seconds)
+    PASSWORD_RESET_EXPIRY_MINUTES = int(os.environ.get('PASSWORD_RESET_EXPIRY_MINUTES', '60'))
+    PASSWORD_RESET_CACHE_TTL = int(os.environ.get('PASSWORD_RESET_CACHE_TTL', '300'))
+    PASSWORD_RESET_CACHE_SIZE = int(os.environ.get('PASSWORD_RESET_CACHE_SIZE', '10000'))
+    PASSWORD_RESET_SWEEP_INTERVAL = int(os.environ.get('PASSWORD_RESET_SWEEP_INTERVAL', '600'))
+    PASSWORD_RESET_SWEEP_BATCH_SIZE = int(os.environ.get('PASSWORD_RESET_SWEEP_BATCH_SIZE', '1000'))
+    
+    # Maintenance jobs (app/services/scheduler.py): intervals in seconds, 0 disables a job
+    SCHEDULER_ENABLED = os.environ.get('SCHEDULER_ENABLED', 'true').lower() == 'true'
+    SCHEDULER_TICK_SECONDS = int(os.environ.get('SCHEDULER_TICK_SECONDS', '60'))
+    JOB_LOCK_LEASE_SECONDS = int(os.environ.get('JOB_LOCK_LEASE_SECONDS', '900'))
+    JOB_BATCH_SIZE = int(os.environ.get('JOB_BATCH_SIZE', '1000'))
+    JOB_MAX_BATCHES = int(os.environ.get('JOB_MAX_BATCHES', '100'))  # per run; the next run continues
+    JOB_TOKEN_BLOCKLIST_INTERVAL = int(os.environ.get('JOB_TOKEN_BLOCKLIST_INTERVAL', '3600'))
+    JOB_EXPIRED_LOCKS_INTERVAL = int(os.environ.get('JOB_EXPIRED_LOCKS_INTERVAL', '300'))
+    JOB_AUDIT_LOG_INTERVAL = int(os.environ.get('JOB_AUDIT_LOG_INTERVAL', '86400'))
+    AUDIT_LOG_RETENTION_DAYS = int(os.environ.get('AUDIT_LOG_RETENTION_DAYS', '0'))
+    
+    # last_login and login attempt resets are buffered per process and written in batches
+    # every FLUSH_INTERVAL seconds (sooner once MAX_PENDING users are waiting)
+    WRITE_BEHIND_ENABLED = os.environ.get('WRITE_BEHIND_ENABLED', 'true').lower() == 'true'
+    WRITE_BEHIND_FLUSH_INTERVAL = float(os.environ.get('WRITE_BEHIND_FLUSH_INTERVAL', '5'))
+    WRITE_BEHIND_MAX_PENDING = int(os.environ.get('WRITE_BEHIND_MAX_PENDING', '5000'))
+    WRITE_BEHIND_BATCH_SIZE = int(os.environ.get('WRITE_BEHIND_BATCH_SIZE', '500'))
+    
+    # Per-host user status snapshot (app/utils/user_status.py), an mmap file shared by the
+    # workers; DIR defaults to the instance folder. Lookups fall back to the database when
+    # it was last refreshed more than MAX_AGE seconds ago
+    USER_STATUS_ENABLED = os.environ.get('USER_STATUS_ENABLED', 'true').lower() == 'true'
+    USER_STATUS_DIR = os.environ.get('USER_STATUS_DIR')
+    USER_STATUS_REFRESH_INTERVAL = float(os.environ.get('USER_STATUS_REFRESH_INTERVAL', '2'))
+    USER_STATUS_MAX_AGE = float(os.environ.get('USER_STATUS_MAX_AGE', '30'))
+    # Re-read rows this many seconds behind the watermark: transactions commit out of order
+    USER_STATUS_OVERLAP = float(os.environ.get('USER_STATUS_OVERLAP', '60'))
+    
+    # SCIM 2.0 provisioning (/scim/v2). Bulk requests are committed CHUNK_SIZE operations
+    # at a time; new users are mailed set-password links from INVITATION_WORKERS threads
+    SCIM_RATE_LIMIT = os.environ.get('SCIM_RATE_LIMIT', '600 per minute')
+    SCIM_MAX_RESULTS = int(os.environ.get('SCIM_MAX_RESULTS', '200'))
+    SCIM_BULK_MAX_OPERATIONS = int(os.environ.get('SCIM_BULK_MAX_OPERATIONS', '10000'))
+    SCIM_BULK_MAX_PAYLOAD = int(os.environ.get('SCIM_BULK_MAX_PAYLOAD', str(10 * 1024 * 1024)))
+    SCIM_BULK_CHUNK_SIZE = int(os.environ.get('SCIM_BULK_CHUNK_SIZE', '500'))
+    SCIM_INVITATION_WORKERS = int(os.environ.get('SCIM_INVITATION_WORKERS', '2'))
+    SCIM_INVITATION_EXPIRY_HOURS = int(os.environ.get('SCIM_INVITATION_EXPIRY_HOURS', '72'))
+    
+    # User change feed for company apps (/api/sso/changes). Changes are served once they
+    # are SETTLE_SECONDS old by the database clock: a transaction that takes longer than
+    # that to commit after updating users has its changes skipped, so keep it well above
+    # the longest one. Long-polls re-check every POLL_INTERVAL for up to MAX_WAIT
+    # (Flask-served ones for WSGI_MAX_HOLD_SECONDS at most)
+    USER_CHANGES_SETTLE_SECONDS = float(os.environ.get('USER_CHANGES_SETTLE_SECONDS', '10'))
+    USER_CHANGES_POLL_INTERVAL = float(os.environ.get('USER_CHANGES_POLL_INTERVAL', '1'))
+    USER_CHANGES_MAX_WAIT = float(os.environ.get('USER_CHANGES_MAX_WAIT', '25'))
+    USER_CHANGES_PAGE_SIZE = int(os.environ.get('USER_CHANGES_PAGE_SIZE', '1000'))
+    USER_CHANGES_RATE_LIMIT = os.environ.get('USER_CHANGES_RATE_LIMIT', '120 per minute')
+    USER_CHANGES_RETENTION_DAYS = int(os.environ.get('USER_CHANGES_RETENTION_DAYS', '30'))
+    JOB_USER_CHANGES_INTERVAL = int(os.environ.get('JOB_USER_CHANGES_INTERVAL', '86400'))
+    
+    # Identity event webhooks to company apps. Events are batched per app (BATCH_SIZE, or
+    # whatever arrived within BATCH_WINDOW seconds); failed POSTs are retried with backoff
+    # from RETRY_BASE_DELAY up to MAX_ATTEMPTS times. Webhook URLs must be https outside
+    # DEBUG, and deliveries to loopback, private or link-local addresses are refused unless
+    # ALLOW_PRIVATE_ADDRESSES (for local development)
+    WEBHOOK_ENABLED = os.environ.get('WEBHOOK_ENABLED', 'true').lower() == 'true'
+    WEBHOOK_WORKERS = int(os.environ.get('WEBHOOK_WORKERS', '8'))
+    WEBHOOK_BATCH_SIZE = int(os.environ.get('WEBHOOK_BATCH_SIZE', '100'))
+    WEBHOOK_BATCH_WINDOW = float(os.environ.get('WEBHOOK_BATCH_WINDOW', '1'))
+    WEBHOOK_MAX_CONCURRENCY = int(os.environ.get('WEBHOOK_MAX_CONCURRENCY', '2'))
+    WEBHOOK_MAX_ATTEMPTS = int(os.environ.get('WEBHOOK_MAX_ATTEMPTS', '8'))
+    WEBHOOK_RETRY_BASE_DELAY = float(os.environ.get('WEBHOOK_RETRY_BASE_DELAY', '2'))
+    WEBHOOK_RETRY_MAX_DELAY = float(os.environ.get('WEBHOOK_RETRY_MAX_DELAY', '600'))
+    WEBHOOK_TIMEOUT = float(os.environ.get('WEBHOOK_TIMEOUT', '10'))
+    WEBHOOK_MAX_QUEUE = int(os.environ.get('WEBHOOK_MAX_QUEUE', '100000'))
+    WEBHOOK_SUBSCRIPTION_TTL = float(os.environ.get('WEBHOOK_SUBSCRIPTION_TTL', '30'))
+    WEBHOOK_ALLOW_PRIVATE_ADDRESSES = os.environ.get('WEBHOOK_ALLOW_PRIVATE_ADDRESSES', 'false').lower() == 'true'
+    
+    # Live audit stream (/api/admin/audit-logs/stream). Each process keeps the last
+    # BUFFER_SIZE events per watched tenant and polls for other workers' rows every
+    # POLL_INTERVAL; streams end after MAX_SECONDS and resume by Last-Event-ID (Flask-served
+    # ones after WSGI_MAX_HOLD_SECONDS at most)
+    AUDIT_STREAM_BUFFER_SIZE = int(os.environ.get('AUDIT_STREAM_BUFFER_SIZE', '1000'))
+    AUDIT_STREAM_POLL_INTERVAL = float(os.environ.get('AUDIT_STREAM_POLL_INTERVAL', '1'))
+    AUDIT_STREAM_POLL_OVERLAP = int(os.environ.get('AUDIT_STREAM_POLL_OVERLAP', '50'))
+    AUDIT_STREAM_HEARTBEAT = float(os.environ.get('AUDIT_STREAM_HEARTBEAT', '15'))
+    AUDIT_STREAM_MAX_SECONDS = float(os.environ.get('AUDIT_STREAM_MAX_SECONDS', '300'))
+    AUDIT_STREAM_RETRY_MS = int(os.environ.get('AUDIT_STREAM_RETRY_MS', '3000'))
+    AUDIT_STREAM_REPLAY_LIMIT = int(os.environ.get('AUDIT_STREAM_REPLAY_LIMIT', '500'))
+    
+    # Requests the Flask app holds open (audit stream, change feed long-polls) end after this
+    # long, a margin below gunicorn's worker timeout (GUNICORN_TIMEOUT, read by
+    # gunicorn.conf.py too). The ASGI front (asgi.py) holds them on the event loop instead
+    WSGI_MAX_HOLD_SECONDS = float(
+        os.environ.get('WSGI_MAX_HOLD_SECONDS', int(os.environ.get('GUNICORN_TIMEOUT', '30')) - 5)
+    )
+    # At most this many of them per process (half of GUNICORN_THREADS by default); more are
+    # answered 503, to retry after WSGI_HELD_RETRY_AFTER seconds
+    WSGI_MAX_HELD_REQUESTS = int(
+        os.environ.get('WSGI_MAX_HELD_REQUESTS', max(int(os.environ.get('GUNICORN_THREADS', '8')) // 2, 1))
+    )
+    WSGI_HELD_RETRY_AFTER = int(os.environ.get('WSGI_HELD_RETRY_AFTER', '5'))
+    
+    # Request bodies: a cap for every request (Flask rejects larger ones with 413 before
+    # reading them) and the tighter default for JSON bodies validated with @validate_body
+    MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', str(1024 * 1024)))
+    JSON_MAX_BODY_BYTES = int(os.environ.get('JSON_MAX_BODY_BYTES', str(16 * 1024)))
+    
+    # Onboarding saves: size cap for the stored profile_data JSON (bytes)
+    ONBOARDING_MAX_BYTES = int(os.environ.get('ONBOARDING_MAX_BYTES', str(64 * 1024)))
+    
+    # Password hashing: scheme for new hashes (bcrypt or argon2id, which needs argon2-cffi)
+    # and its cost, or PASSWORD_HASH_CALIBRATE to pick the cost at startup so a hash takes
+    # about PASSWORD_HASH_TARGET_MS (`flask passwords calibrate` prints settings to pin).
+    # Weaker hashes are upgraded on login, unless PASSWORD_REHASH_ON_LOGIN is off
+    PASSWORD_HASH_SCHEME = os.environ.get('PASSWORD_HASH_SCHEME', 'bcrypt')
+    PASSWORD_BCRYPT_ROUNDS = int(os.environ.get('PASSWORD_BCRYPT_ROUNDS', '12'))
+    PASSWORD_ARGON2_TIME_COST = int(os.environ.get('PASSWORD_ARGON2_TIME_COST', '3'))
+    PASSWORD_ARGON2_MEMORY_COST = int(os.environ.get('PASSWORD_ARGON2_MEMORY_COST', '65536'))  # KiB
+    PASSWORD_ARGON2_PARALLELISM = int(os.environ.get('PASSWORD_ARGON2_PARALLELISM', '1'))
+    PASSWORD_HASH_CALIBRATE = os.environ.get('PASSWORD_HASH_CALIBRATE', 'false').lower() == 'true'
+    PASSWORD_HASH_TARGET_MS = float(os.environ.get('PASSWORD_HASH_TARGET_MS', '250'))
+    PASSWORD_REHASH_ON_LOGIN = os.environ.get('PASSWORD_REHASH_ON_LOGIN', 'true').lower() == 'true'
+    
+    # Breached password filter built with `flask passwords build-breached` (unset: no check),
+    # and how often (seconds) workers look for a rebuilt file
+    BREACHED_PASSWORDS_FILE = os.environ.get('BREACHED_PASSWORDS_FILE')
+    BREACHED_PASSWORDS_RECHECK = int(os.environ.get('BREACHED_PASSWORDS_RECHECK', '60'))
     
     # Rate Limiting
-    RATELIMIT_STORAGE_URL = "memory://"  
+    RATELIMIT_STORAGE_URL = os.environ.get('RATELIMIT_STORAGE_URL', 'memory://')
     RATELIMIT_STRATEGY = "fixed-window"
     RATELIMIT_HEADERS_ENABLED = True
 
+    # Metrics (Prometheus exposition at /metrics). Served to METRICS_ALLOWED_IPS (addresses,
+    # CIDRs or ranges, comma-separated; empty allows no address) and to requests carrying
+    # "Authorization: Bearer <METRICS_TOKEN>" when a token is set
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_ALLOWED_IPS = os.environ.get('METRICS_ALLOWED_IPS', '127.0.0.1,::1')
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+    # ASGI mode (asgi.py): the held routes (change feed, audit stream) served natively on the event loop
+    ASGI_NATIVE_ROUTES = os.environ.get('ASGI_NATIVE_ROUTES', 'true').lower() == 'true'
+    ASGI_DB_POOL_SIZE = int(os.environ.get('ASGI_DB_POOL_SIZE', '20'))
+
+    # Email delivery on a background thread pool so requests never wait on SendGrid
+    EMAIL_ASYNC_DELIVERY = os.environ.get('EMAIL_ASYNC_DELIVERY', 'true').lower() == 'true'
+    EMAIL_DELIVERY_WORKERS = int(os.environ.get('EMAIL_DELIVERY_WORKERS', '4'))
+
+    # Conditional GETs (ETag / 304) for profile, onboarding, dashboard and app catalog.
+    # Row versions are cached per process for this many seconds (0 reads them every time)
+    HTTP_CACHE_ENABLED = os.environ.get('HTTP_CACHE_ENABLED', 'true').lower() == 'true'
+    HTTP_CACHE_VERSION_TTL = int(os.environ.get('HTTP_CACHE_VERSION_TTL', '10'))
+
+    # Response compression (gzip, or brotli when installed) for bodies of at least MIN_SIZE bytes
+    COMPRESSION_ENABLED = os.environ.get('COMPRESSION_ENABLED', 'true').lower() == 'true'
+    COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', '500'))
+    COMPRESSION_LEVEL = int(os.environ.get('COMPRESSION_LEVEL', '6'))
+    COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', '4'))
+
+    # Query profiling (N+1 / slow query detection, per-route query budgets)
+    QUERY_PROFILING_ENABLED = os.environ.get('QUERY_PROFILING_ENABLED', 'false').lower() == 'true'
+    SLOW_QUERY_THRESHOLD_MS = float(os.environ.get('SLOW_QUERY_THRESHOLD_MS', '100'))
+    N_PLUS_ONE_THRESHOLD = int(os.environ.get('N_PLUS_ONE_THRESHOLD', '5'))
+    QUERY_BUDGET_STRICT = os.environ.get('QUERY_BUDGET_STRICT', 'false').lower() == 'true'
+    QUERY_BUDGETS = {}  # e.g. {'user.user_dashboard': 4}
+
 class DevelopmentConfig(Config):
     DEBUG = True
+    BOOTSTRAP_ON_STARTUP = os.environ.get('BOOTSTRAP_ON_STARTUP', 'true').lower() == 'true'
 
 class ProductionConfig(Config):
     DEBUG = False
 
+class BenchmarkConfig(Config):
+    DEBUG = False
+    SUPER_ADMIN_EMAIL = None
+    RATELIMIT_ENABLED = False
+    SCHEDULER_ENABLED = False
+    # Logins keep the cost the database was seeded with (--bcrypt-rounds) instead of
+    # upgrading every hash to the policy's on its first login
+    PASSWORD_REHASH_ON_LOGIN = False
+
+class TestingConfig(Config):
+    TESTING = True
+    DEBUG = False
+    SUPER_ADMIN_EMAIL = None
+    RATELIMIT_ENABLED = False
+    SCHEDULER_ENABLED = False
+    QUERY_PROFILING_ENABLED = True
+    # Cheap hashes: the tests log in a lot
+    PASSWORD_BCRYPT_ROUNDS = 4
+    # Webhook tests deliver to a receiver on localhost
+    WEBHOOK_ALLOW_PRIVATE_ADDRESSES = True
+
 config = {
     'development': DevelopmentConfig,
     'production': ProductionConfig,
+    'benchmark': BenchmarkConfig,
+    'testing': TestingConfig,
     'default': DevelopmentConfig
 }
@@ -0,0 +1,63 @@
+# gunicorn.conf.py
+import os
+from dotenv import load_dotenv
+
+# The app loads .env too, but the defaults below are decided before it is imported
+load_dotenv()
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5001')
+# Per-process TOTP replay state would let a used code through on another worker: more than
+# one worker by default only once a shared store is configured (see when_ready)
+_shared_store = not (os.environ.get('MFA_REPLAY_STORAGE_URL') or
+                     os.environ.get('RATELIMIT_STORAGE_URL', 'memory://')).startswith('memory://')
+workers = int(os.environ.get('GUNICORN_WORKERS', '2' if _shared_store else '1'))
+
+# Threaded workers: a request held open (audit stream, change feed long-poll) ties up one
+# thread rather than the whole worker, and the worker keeps answering the arbiter's
+# heartbeat meanwhile. The app ends such requests WSGI_MAX_HOLD_SECONDS in, below timeout
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.environ.get('GUNICORN_THREADS', '8'))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '30'))
+
+# Import and build the app once in the master; workers are forked with it already loaded
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+
+def when_ready(server):
+    # An explicit GUNICORN_WORKERS above 1 still needs the shared store
+    replay_storage = server.app.wsgi().config['MFA_REPLAY_STORAGE_URL']
+    if server.cfg.workers > 1 and replay_storage.startswith('memory://'):
+        raise RuntimeError(
+            f'{server.cfg.workers} workers with MFA_REPLAY_STORAGE_URL={replay_storage}: set it (or '
+            'RATELIMIT_STORAGE_URL) to a shared store such as redis://, or run a single worker'
+        )
+
+    # Runs once in the master, so bootstrap is not repeated by every worker
+    if os.environ.get('GUNICORN_BOOTSTRAP', 'true').lower() != 'true':
+        return
+    from app.bootstrap import run_bootstrap
+    run_bootstrap(server.app.wsgi())
+
+
+def post_fork(server, worker):
+    # Connections opened in the master (preload, bootstrap) must not be shared
+    # across processes: drop them from the inherited pools without closing them
+    flask_app = getattr(server.app, 'callable', None)
+    if flask_app is None:
+        return
+
+    from app.extensions import db
+    with flask_app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+    if flask_app.config.get('MFA_QR_PREWARM'):
+        from app.services.qr_service import QRService
+        QRService.prewarm(flask_app)
+
+
+def child_exit(server, worker):
+    # Drop the dead worker's live samples from the multi-process metrics directory
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
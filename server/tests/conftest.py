@@ -0,0 +1,54 @@
+# tests/conftest.py
+# One app (on a temporary SQLite database) for the whole run: services keep per-process
+# state (write-behind buffer, caches, background threads) bound to the first app. Tests
+# create their own users instead of sharing fixture rows.
+import itertools
+import pytest
+from config import TestingConfig
+from app import create_app
+from app.extensions import db
+from app.models import User
+
+PASSWORD = 'Passw0rd!x'
+
+_emails = itertools.count(1)
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    TestingConfig.SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path_factory.mktemp('db') / 'app.db'}"
+    # Not the instance folder: user status snapshots would outlive the run
+    TestingConfig.USER_STATUS_DIR = str(tmp_path_factory.mktemp('user_status'))
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+    return app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def make_user(app):
+    def make_user(**fields):
+        with app.app_context():
+            user = User(**{
+                'email': f'user{next(_emails)}@example.com', 'first_name': 'Test', 'last_name': 'User',
+                'role': 'user', 'first_login': False, 'is_verified': True, **fields
+            })
+            user.set_password(PASSWORD)
+            db.session.add(user)
+            db.session.commit()
+            return user.id, user.email
+    return make_user
+
+
+@pytest.fixture
+def login(client):
+    def login(email, password=PASSWORD):
+        response = client.post('/api/auth/login', json={'email': email, 'password': password})
+        assert response.status_code == 200, response.json
+        return response.json
+    return login
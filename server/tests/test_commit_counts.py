@@ -0,0 +1,97 @@
+# tests/test_commit_counts.py
+# Each auth flow commits once, its audit entry in the same transaction (see
+# profile_queries: it counts the transactions committed in this thread).
+import pyotp
+import pytest
+from app.extensions import db
+from app.models import AuditLog, User
+from app.services.auth_service import AuthService
+from app.utils.query_profiler import profile_queries
+from tests.conftest import PASSWORD
+
+NEW_PASSWORD = 'N3w-Passw0rd!x'
+
+
+def audit_actions(app, user_id):
+    with app.app_context():
+        return [log.action for log in AuditLog.query.filter_by(user_id=user_id).order_by(AuditLog.id)]
+
+
+@pytest.mark.parametrize('write_behind', [True, False])
+def test_login_commits_once(app, client, make_user, monkeypatch, write_behind):
+    monkeypatch.setitem(app.config, 'WRITE_BEHIND_ENABLED', write_behind)
+    user_id, email = make_user()
+
+    with profile_queries('login') as profile:
+        response = client.post('/api/auth/login', json={'email': email, 'password': PASSWORD})
+
+    assert response.status_code == 200
+    profile.assert_max_commits(1)
+    assert response.headers['X-Commit-Count'] == '1'
+    assert audit_actions(app, user_id) == ['login_success']
+    if not write_behind:
+        with app.app_context():
+            assert db.session.get(User, user_id).last_login is not None
+
+
+def test_failed_login_commits_once(app, client, make_user):
+    user_id, email = make_user()
+
+    with profile_queries('failed login') as profile:
+        response = client.post('/api/auth/login', json={'email': email, 'password': 'Wrong-Passw0rd'})
+
+    assert response.status_code == 401
+    profile.assert_max_commits(1)
+    with app.app_context():
+        assert db.session.get(User, user_id).login_attempts == 1
+    assert audit_actions(app, user_id) == ['login_failed']
+
+
+def test_verify_mfa_commits_once(app, client, make_user, login):
+    secret = pyotp.random_base32()
+    user_id, email = make_user(mfa_enabled=True, mfa_secret=secret)
+    token = login(email)['mfa_session_token']
+
+    with profile_queries('verify-mfa') as profile:
+        response = client.post(
+            '/api/auth/verify-mfa', json={'mfa_code': pyotp.TOTP(secret).now()},
+            headers={'Authorization': f'Bearer {token}'}
+        )
+
+    assert response.status_code == 200, response.json
+    profile.assert_max_commits(1)
+    assert audit_actions(app, user_id) == ['login_mfa_required', 'mfa_verification_success']
+
+
+def test_change_password_commits_once(app, client, make_user, login):
+    user_id, email = make_user()
+    token = login(email)['access_token']
+
+    with profile_queries('change-password') as profile:
+        response = client.post(
+            '/api/auth/change-password', json={'current_password': PASSWORD, 'new_password': NEW_PASSWORD},
+            headers={'Authorization': f'Bearer {token}'}
+        )
+
+    assert response.status_code == 200, response.json
+    profile.assert_max_commits(1)
+    assert audit_actions(app, user_id)[-1] == 'password_changed'
+    login(email, NEW_PASSWORD)
+
+
+def test_reset_password_commits_once(app, client, make_user, login):
+    user_id, email = make_user()
+    with app.test_request_context():
+        reset_token = AuthService.generate_password_reset_token(user_id)
+
+    with profile_queries('reset-password') as profile:
+        response = client.post('/api/auth/reset-password', json={'token': reset_token, 'new_password': NEW_PASSWORD})
+
+    assert response.status_code == 200, response.json
+    profile.assert_max_commits(1)
+    assert audit_actions(app, user_id) == ['password_reset_completed']
+    login(email, NEW_PASSWORD)
+
+    # Spent with that one commit
+    response = client.post('/api/auth/reset-password', json={'token': reset_token, 'new_password': PASSWORD})
+    assert response.status_code == 400
@@ -0,0 +1,58 @@
+# tests/test_held_requests.py
+# Held requests (audit stream, change feed long-polls) are capped per process: beyond
+# WSGI_MAX_HELD_REQUESTS they are answered 503 instead of taking every worker thread.
+import base64
+import pytest
+from app.extensions import db
+from app.models import CompanyApp
+
+
+@pytest.fixture
+def admin_headers(make_user, login):
+    _, email = make_user(role='admin')
+    return {'Authorization': f"Bearer {login(email)['access_token']}"}
+
+
+@pytest.fixture
+def app_credentials(app):
+    with app.app_context():
+        company_app = CompanyApp(name='Change feed app', app_url='https://app.example.com',
+                                 sso_callback_url='https://app.example.com/callback')
+        db.session.add(company_app)
+        db.session.commit()
+        credentials = f'{company_app.client_id}:{company_app.client_secret}'
+    return {'Authorization': f"Basic {base64.b64encode(credentials.encode()).decode()}"}
+
+
+def test_audit_streams_beyond_the_cap_are_refused(app, client, monkeypatch, admin_headers):
+    monkeypatch.setitem(app.config, 'WSGI_MAX_HELD_REQUESTS', 1)
+
+    held = client.get('/api/admin/audit-logs/stream', headers=admin_headers, buffered=False)
+    assert held.status_code == 200
+
+    refused = client.get('/api/admin/audit-logs/stream', headers=admin_headers, buffered=False)
+    assert refused.status_code == 503
+    assert refused.headers['Retry-After'] == str(app.config['WSGI_HELD_RETRY_AFTER'])
+
+    # Closing the stream gives its slot back
+    held.close()
+    again = client.get('/api/admin/audit-logs/stream', headers=admin_headers, buffered=False)
+    assert again.status_code == 200
+    again.close()
+
+
+def test_only_long_polls_count_against_the_cap(app, client, monkeypatch, app_credentials):
+    monkeypatch.setitem(app.config, 'WSGI_MAX_HELD_REQUESTS', 0)
+
+    assert client.get('/api/sso/changes', headers=app_credentials).status_code == 200
+    response = client.get('/api/sso/changes?wait=5', headers=app_credentials)
+    assert response.status_code == 503
+    assert 'Retry-After' in response.headers
+
+
+def test_long_poll_gives_its_slot_back(app, client, monkeypatch, app_credentials):
+    monkeypatch.setitem(app.config, 'WSGI_MAX_HELD_REQUESTS', 1)
+    monkeypatch.setitem(app.config, 'USER_CHANGES_MAX_WAIT', 0.1)
+
+    for _ in range(2):
+        assert client.get('/api/sso/changes?wait=5', headers=app_credentials).status_code == 200
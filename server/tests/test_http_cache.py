@@ -0,0 +1,31 @@
+# tests/test_http_cache.py
+# Conditional GETs: a matching If-None-Match is answered 304, and an ETag is only ever
+# valid for the user it was issued to.
+
+
+def auth(login, email):
+    return {'Authorization': f"Bearer {login(email)['access_token']}"}
+
+
+def test_etag_is_per_user(client, make_user, login):
+    # The apps list is the same for both admins: the same row versions
+    first = auth(login, make_user(role='admin')[1])
+    second = auth(login, make_user(role='admin')[1])
+
+    response = client.get('/api/admin/apps', headers=first)
+    assert response.status_code == 200
+    etag = response.headers['ETag']
+
+    assert client.get('/api/admin/apps', headers={**first, 'If-None-Match': etag}).status_code == 304
+    response = client.get('/api/admin/apps', headers={**second, 'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_onboarding_saves_accept_the_get_etag(client, make_user, login):
+    headers = auth(login, make_user()[1])
+    client.post('/api/user/onboarding', headers=headers, json={'step': 1, 'profile_data': {}})
+    etag = client.get('/api/user/onboarding', headers=headers).headers['ETag']
+
+    response = client.patch('/api/user/onboarding', headers={**headers, 'If-Match': etag}, json={'step_completed': 2})
+    assert response.status_code == 200, response.json
@@ -0,0 +1,40 @@
+# tests/test_login_attempts.py
+# A correct password clears the failed attempts it saw, in the login's own transaction,
+# and never ones another worker recorded since.
+import pytest
+from sqlalchemy import update
+from app.extensions import db
+from app.models import User
+from app.services.activity_service import ActivityService
+from app.utils.query_profiler import profile_queries
+
+
+def stored_attempts(app, user_id):
+    with app.app_context():
+        return db.session.get(User, user_id).login_attempts
+
+
+@pytest.mark.parametrize('write_behind', [True, False])
+def test_login_clears_failed_attempts(app, client, make_user, login, monkeypatch, write_behind):
+    monkeypatch.setitem(app.config, 'WRITE_BEHIND_ENABLED', write_behind)
+    user_id, email = make_user(login_attempts=3)
+
+    with profile_queries('login') as profile:
+        login(email)
+
+    profile.assert_max_commits(1)
+    assert stored_attempts(app, user_id) == 0
+
+
+def test_failures_recorded_meanwhile_are_kept(app, make_user):
+    user_id, _ = make_user(login_attempts=3)
+
+    with app.app_context():
+        user = db.session.get(User, user_id)
+        # Another worker records a fourth failure after this one loaded the user
+        db.session.execute(update(User).where(User.id == user_id).values(login_attempts=4)
+                           .execution_options(synchronize_session=False))
+        ActivityService.reset_failures(user)
+        db.session.commit()
+
+    assert stored_attempts(app, user_id) == 4
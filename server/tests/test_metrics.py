@@ -0,0 +1,24 @@
+# tests/test_metrics.py
+import pytest
+
+OUTSIDE = {'REMOTE_ADDR': '203.0.113.7'}
+
+
+def test_metrics_served_to_allowed_addresses(client):
+    assert client.get('/metrics').status_code == 200
+    assert client.get('/metrics', environ_base=OUTSIDE).status_code == 403
+
+
+@pytest.mark.parametrize('allowed_ips', ['127.0.0.1,::1', ''])
+def test_metrics_token(app, client, monkeypatch, allowed_ips):
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', 's3cret-scrape-token')
+    monkeypatch.setitem(app.config, 'METRICS_ALLOWED_IPS', allowed_ips)
+
+    response = client.get('/metrics', environ_base=OUTSIDE)
+    assert response.status_code == 401
+    assert response.headers['WWW-Authenticate'] == 'Bearer'
+    assert client.get('/metrics', environ_base=OUTSIDE, headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    response = client.get('/metrics', environ_base=OUTSIDE, headers={'Authorization': 'Bearer s3cret-scrape-token'})
+    assert response.status_code == 200
+    # Loopback still scrapes without the token only while it is allowed
+    assert client.get('/metrics').status_code == (200 if allowed_ips else 401)
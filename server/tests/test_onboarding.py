@@ -0,0 +1,97 @@
+# tests/test_onboarding.py
+# Onboarding saves: RFC 7396 merge-patches, unchanged autosaves that write nothing, the
+# profile_data size cap, and conditional saves (If-Match, and a concurrent save landing
+# between this one's read and write).
+from datetime import datetime, timedelta
+import pytest
+from sqlalchemy import event, update
+from app.extensions import db
+from app.models import UserOnboarding
+from app.utils.query_profiler import profile_queries
+
+
+@pytest.fixture
+def headers(make_user, login):
+    _, email = make_user()
+    return {'Authorization': f"Bearer {login(email)['access_token']}"}
+
+
+def save(client, headers, document):
+    response = client.post('/api/user/onboarding', headers=headers, json=document)
+    assert response.status_code == 200, response.json
+    return response
+
+
+def test_patch_is_a_merge_patch(client, headers):
+    save(client, headers, {'step': 1, 'profile_data': {
+        'team': 'platform', 'address': {'city': 'Lyon', 'zip': '69001'}, 'nickname': 'ace'
+    }})
+
+    response = client.patch('/api/user/onboarding', headers=headers, json={
+        'step_completed': 2,
+        'profile_data': {'address': {'zip': None, 'country': 'FR'}, 'nickname': None}
+    })
+
+    assert response.status_code == 200, response.json
+    body = client.get('/api/user/onboarding', headers=headers).json
+    assert body['step_completed'] == 2
+    assert body['profile_data'] == {'team': 'platform', 'address': {'city': 'Lyon', 'country': 'FR'}}
+
+    # null for a whole member clears it
+    client.patch('/api/user/onboarding', headers=headers, json={'step_completed': None, 'profile_data': None})
+    body = client.get('/api/user/onboarding', headers=headers).json
+    assert (body['step_completed'], body['profile_data']) == (0, {})
+
+
+def test_unchanged_save_writes_nothing(client, headers):
+    etag = save(client, headers, {'step': 1, 'profile_data': {'team': 'platform'}}).headers['ETag']
+
+    with profile_queries('unchanged save') as profile:
+        response = client.patch('/api/user/onboarding', headers=headers, json={'profile_data': {'team': 'platform'}})
+
+    assert response.status_code == 200
+    assert response.json['message'] == 'Onboarding unchanged'
+    assert response.headers['ETag'] == etag
+    profile.assert_max_commits(0)
+
+
+def test_profile_data_is_capped(app, client, headers, monkeypatch):
+    monkeypatch.setitem(app.config, 'ONBOARDING_MAX_BYTES', 100)
+    save(client, headers, {'step': 1, 'profile_data': {'bio': 'x' * 40}})
+
+    # Only the merged result counts: each patch is small, together they are over the cap
+    response = client.patch('/api/user/onboarding', headers=headers, json={'profile_data': {'notes': 'y' * 60}})
+    assert response.status_code == 413
+    assert client.get('/api/user/onboarding', headers=headers).json['profile_data'] == {'bio': 'x' * 40}
+
+
+def test_stale_if_match_is_refused(client, headers):
+    stale = save(client, headers, {'step': 1, 'profile_data': {}}).headers['ETag']
+    current = save(client, headers, {'step': 2, 'profile_data': {}}).headers['ETag']
+
+    response = client.patch('/api/user/onboarding', headers={**headers, 'If-Match': stale}, json={'step_completed': 3})
+    assert response.status_code == 412
+    response = client.patch('/api/user/onboarding', headers={**headers, 'If-Match': current},
+                            json={'step_completed': 3})
+    assert response.status_code == 200, response.json
+
+
+def test_concurrent_save_is_refused(client, headers):
+    save(client, headers, {'step': 1, 'profile_data': {'team': 'platform'}})
+
+    def concurrent_save(session, flush_context, instances):
+        # Another worker's save commits between this request's read and its write
+        for onboarding in [obj for obj in session.dirty if isinstance(obj, UserOnboarding)]:
+            session.connection().execute(
+                update(UserOnboarding.__table__).where(UserOnboarding.__table__.c.id == onboarding.id)
+                .values(updated_at=datetime.utcnow() + timedelta(seconds=1))
+            )
+
+    event.listen(db.session, 'before_flush', concurrent_save)
+    try:
+        response = client.patch('/api/user/onboarding', headers=headers, json={'profile_data': {'team': 'identity'}})
+    finally:
+        event.remove(db.session, 'before_flush', concurrent_save)
+
+    assert response.status_code == 412
+    assert client.get('/api/user/onboarding', headers=headers).json['profile_data'] == {'team': 'platform'}
@@ -0,0 +1,18 @@
+# tests/test_password_resets.py
+from app.extensions import db
+from app.services.auth_service import AuthService
+
+
+def test_token_survives_a_rolled_back_reset(app, make_user):
+    user_id, _ = make_user()
+    with app.test_request_context():
+        token = AuthService.generate_password_reset_token(user_id)
+
+        # Consumed in a transaction that is rolled back: neither the row nor the cache is spent
+        assert AuthService.verify_password_reset_token(token, commit=False) == user_id
+        db.session.rollback()
+        assert AuthService.verify_password_reset_token(token, commit=False) == user_id
+        db.session.commit()
+
+        # Spent now, and answered from the cache
+        assert AuthService.verify_password_reset_token(token) is None
@@ -0,0 +1,95 @@
+# tests/test_scim.py
+# SCIM Bulk: an operation that fails leaves nothing of itself behind, and a chunk that
+# only fails at commit is retried one operation at a time.
+import pytest
+from app.extensions import db
+from app.models import User
+from app.services.provisioning_service import SCHEMA_BULK_REQUEST, SCHEMA_PATCH, SCHEMA_USER
+
+
+@pytest.fixture
+def admin_headers(make_user, login):
+    _, email = make_user(role='admin')
+    return {'Authorization': f"Bearer {login(email)['access_token']}"}
+
+
+def bulk(client, headers, *operations):
+    response = client.post('/scim/v2/Bulk', headers=headers,
+                           json={'schemas': [SCHEMA_BULK_REQUEST], 'Operations': list(operations)})
+    assert response.status_code == 200, response.json
+    return response.json['Operations']
+
+
+def stored(app, user_id):
+    with app.app_context():
+        user = db.session.get(User, user_id)
+        return user.email, user.first_name, user.last_name, user.role
+
+
+def test_rejected_put_changes_nothing(app, client, admin_headers, make_user):
+    user_id, email = make_user()
+
+    [result] = bulk(client, admin_headers, {
+        'method': 'PUT', 'path': f'/Users/{user_id}',
+        'data': {'schemas': [SCHEMA_USER], 'userName': f'renamed.{email}',
+                 'name': {'givenName': 'Renamed', 'familyName': 'User'}, 'roles': 'superuser'}
+    })
+
+    assert result['status'] == '400'
+    assert stored(app, user_id) == (email, 'Test', 'User', 'user')
+
+
+def test_rejected_patch_changes_nothing(app, client, admin_headers, make_user):
+    user_id, email = make_user()
+
+    # The first op is valid; the second is not, so neither applies
+    [result] = bulk(client, admin_headers, {
+        'method': 'PATCH', 'path': f'/Users/{user_id}',
+        'data': {'schemas': [SCHEMA_PATCH], 'Operations': [
+            {'op': 'replace', 'path': 'name.givenName', 'value': 'Renamed'},
+            {'op': 'replace', 'path': 'active', 'value': 'maybe'},
+        ]}
+    })
+
+    assert result['status'] == '400'
+    assert stored(app, user_id) == (email, 'Test', 'User', 'user')
+
+
+def test_rejected_operation_does_not_spoil_its_chunk(app, client, admin_headers, make_user):
+    first_id, first_email = make_user()
+    second_id, second_email = make_user()
+
+    results = bulk(client, admin_headers, {
+        'method': 'PUT', 'path': f'/Users/{first_id}',
+        'data': {'userName': first_email, 'name': {'givenName': 'Bad', 'familyName': 'Role'}, 'roles': 'root'}
+    }, {
+        'method': 'PUT', 'path': f'/Users/{second_id}',
+        'data': {'userName': second_email, 'name': {'givenName': 'Good', 'familyName': 'Update'}, 'roles': 'admin'}
+    })
+
+    assert [result['status'] for result in results] == ['400', '200']
+    assert stored(app, first_id) == (first_email, 'Test', 'User', 'user')
+    assert stored(app, second_id) == (second_email, 'Good', 'Update', 'admin')
+
+
+def test_chunk_failing_at_commit_is_retried_per_operation(app, client, admin_headers, make_user):
+    user_id, email = make_user()
+    user_name = f'taken.{email}'
+
+    # Each passes its own checks; together they break the unique email at commit, so
+    # every operation is run again on its own and only the conflicting one fails
+    results = bulk(client, admin_headers, {
+        'method': 'PUT', 'path': f'/Users/{user_id}',
+        'data': {'userName': user_name, 'name': {'givenName': 'Test', 'familyName': 'User'}}
+    }, {
+        'method': 'POST', 'path': '/Users', 'bulkId': 'new',
+        'data': {'userName': user_name, 'name': {'givenName': 'New', 'familyName': 'User'}}
+    }, {
+        'method': 'PATCH', 'path': f'/Users/{user_id}',
+        'data': {'schemas': [SCHEMA_PATCH], 'Operations': [{'op': 'replace', 'path': 'name.familyName', 'value': 'Retried'}]}
+    })
+
+    assert [result['status'] for result in results] == ['200', '409', '200']
+    assert stored(app, user_id) == (user_name, 'Test', 'Retried', 'user')
+    with app.app_context():
+        assert User.query.filter_by(email=user_name).count() == 1
@@ -0,0 +1,79 @@
+# tests/test_tenancy.py
+import pytest
+from flask import g
+from app.extensions import db
+from app.models import User
+from app.utils.tenancy import current_bind_key, shard_scope, tenant_scope
+from tests.conftest import PASSWORD
+
+OTHER_TENANT = 'tenant-b'
+
+
+@pytest.fixture
+def tenant_login(client):
+    """Access token headers for a user of ``tenant`` (logged in through the tenant header)."""
+    def tenant_login(email, tenant):
+        response = client.post('/api/auth/login', json={'email': email, 'password': PASSWORD},
+                               headers={'X-Tenant-ID': tenant})
+        assert response.status_code == 200, response.json
+        return {'Authorization': f"Bearer {response.json['access_token']}"}
+    return tenant_login
+
+
+def test_shard_scope_restores_the_enclosing_scope(app):
+    with app.test_request_context():
+        with shard_scope('shard1'):
+            with shard_scope('shard2'):
+                assert current_bind_key() == 'shard2'
+            assert current_bind_key() == 'shard1'
+        assert not g.shard_override
+
+
+def test_cross_tenant_pages_are_capped(app, client, make_user, login):
+    _, email = make_user(role='super_admin')
+    headers = {'Authorization': f"Bearer {login(email)['access_token']}"}
+    max_rows = app.config['TENANT_FANOUT_MAX_ROWS']
+
+    response = client.get(f'/api/admin/users?page={max_rows // 10 + 1}&per_page=10', headers=headers)
+    assert response.status_code == 400
+    response = client.get(f'/api/admin/audit-logs?page={max_rows // 20 + 1}', headers=headers)
+    assert response.status_code == 400
+
+    response = client.get('/api/admin/users?page=1&per_page=100000', headers=headers)
+    assert response.status_code == 200
+    assert 'unavailable_shards' in response.json
+
+
+def test_admins_only_see_their_own_tenant(app, client, make_user, tenant_login):
+    other_id, other_email = make_user(tenant_id=OTHER_TENANT)
+    _, admin_email = make_user(role='admin')
+    headers = tenant_login(admin_email, app.config['DEFAULT_TENANT'])
+
+    response = client.get(f'/api/admin/users?search={other_email}', headers=headers)
+    assert response.status_code == 200
+    assert response.json['users'] == []
+
+    response = client.put(f'/api/admin/users/{other_id}', headers=headers, json={'first_name': 'Renamed'})
+    assert response.status_code == 404
+    with app.app_context(), tenant_scope(OTHER_TENANT):
+        assert db.session.get(User, other_id).first_name == 'Test'
+
+
+def test_tenant_header_override_needs_a_super_admin(app, client, make_user, tenant_login):
+    _, other_email = make_user(tenant_id=OTHER_TENANT)
+    _, admin_email = make_user(role='admin')
+    admin = {**tenant_login(admin_email, app.config['DEFAULT_TENANT']), 'X-Tenant-ID': OTHER_TENANT}
+    super_admin_id, super_admin_email = make_user(role='super_admin')
+    super_admin = {**tenant_login(super_admin_email, app.config['DEFAULT_TENANT']), 'X-Tenant-ID': OTHER_TENANT}
+
+    assert client.get('/api/admin/users', headers=admin).status_code == 400
+
+    response = client.get(f'/api/admin/users?search={other_email}', headers=super_admin)
+    assert response.status_code == 200
+    assert [user['email'] for user in response.json['users']] == [other_email]
+
+    # Demoted since the token was issued: its role claim no longer counts
+    with app.app_context():
+        db.session.get(User, super_admin_id).role = 'admin'
+        db.session.commit()
+    assert client.get('/api/admin/users', headers=super_admin).status_code == 400
@@ -0,0 +1,198 @@
+# tests/test_webhooks.py
+# Webhook delivery against a real HTTP receiver on localhost: signatures, batching per
+# app, retries with backoff on 5xx and drops on 4xx, and the SSRF guards.
+import hashlib
+import hmac
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+import requests
+from app.extensions import db
+from app.models import CompanyApp, User
+from app.services.webhook_service import SIGNATURE_HEADER, BlockedAddress, PublicOnlyAdapter, WebhookService
+from app.utils.tenancy import current_tenant
+from tests.conftest import PASSWORD
+
+_emails = itertools.count(1)
+
+
+class Receiver:
+    """Records every POST; answers each path with its queued status codes, then 200."""
+
+    def __init__(self):
+        self.requests = []
+        self.statuses = {}
+        self.lock = threading.Lock()
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers['Content-Length']))
+                with receiver.lock:
+                    receiver.requests.append((self.path, dict(self.headers), body, time.monotonic()))
+                    codes = receiver.statuses.get(self.path)
+                    status = codes.pop(0) if codes else 200
+                self.send_response(status)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def received(self, path):
+        with self.lock:
+            return [request for request in self.requests if request[0] == path]
+
+    def wait_for(self, path, count, timeout=10):
+        deadline = time.monotonic() + timeout
+        while len(self.received(path)) < count and time.monotonic() < deadline:
+            time.sleep(0.05)
+        return self.received(path)
+
+
+@pytest.fixture
+def receiver():
+    receiver = Receiver()
+    yield receiver
+    receiver.server.shutdown()
+
+
+@pytest.fixture
+def subscribe(app):
+    """Subscribe a new app to ``url``; every app subscribed is unsubscribed afterwards."""
+    app_ids = []
+
+    def subscribe(url, events=()):
+        with app.app_context():
+            company_app = CompanyApp(
+                name=f'Webhook app {len(app_ids)}', app_url='https://app.example.com',
+                sso_callback_url='https://app.example.com/callback', webhook_url=url, webhook_events=list(events)
+            )
+            db.session.add(company_app)
+            db.session.commit()
+            app_ids.append(company_app.id)
+            WebhookService.invalidate(current_tenant())
+            return company_app.id, company_app.client_secret
+
+    yield subscribe
+    with app.app_context():
+        CompanyApp.query.filter(CompanyApp.id.in_(app_ids)).update({'webhook_url': None}, synchronize_session=False)
+        db.session.commit()
+        WebhookService.invalidate(current_tenant())
+
+
+def create_users(app, count):
+    """Create ``count`` users in one transaction (a user.created event each); returns their ids."""
+    with app.app_context():
+        users = [
+            User(email=f'hooked{next(_emails)}@example.com', first_name='Hooked', last_name='User', role='user')
+            for _ in range(count)
+        ]
+        for user in users:
+            user.set_password(PASSWORD)
+        db.session.add_all(users)
+        db.session.commit()
+        return [user.id for user in users]
+
+
+def wait_until_idle(timeout=10):
+    deadline = time.monotonic() + timeout
+    while WebhookService.pending() and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+
+def test_deliveries_are_signed(app, client, receiver, subscribe):
+    # Starts this process's dispatcher
+    client.get('/api/auth/health')
+    app_id, secret = subscribe(f'{receiver.url}/signed')
+    create_users(app, 1)
+
+    [(_, headers, body, _)] = receiver.wait_for('/signed', 1)
+    timestamp = headers['X-Hub-Timestamp']
+    expected = hmac.new(secret.encode(), f'{timestamp}.'.encode() + body, hashlib.sha256).hexdigest()
+    assert headers[SIGNATURE_HEADER] == f't={timestamp},v1={expected}'
+    assert abs(int(timestamp) - time.time()) < 60
+    payload = json.loads(body)
+    assert payload['app_id'] == app_id
+    assert headers['X-Hub-Delivery'] == payload['delivery_id']
+
+
+def test_events_are_batched_per_app(app, client, receiver, subscribe):
+    client.get('/api/auth/health')
+    first_id, _ = subscribe(f'{receiver.url}/first')
+    second_id, _ = subscribe(f'{receiver.url}/second')
+    user_ids = create_users(app, 3)
+
+    for path, app_id in (('/first', first_id), ('/second', second_id)):
+        [(_, _, body, _)] = receiver.wait_for(path, 1)
+        payload = json.loads(body)
+        assert payload['app_id'] == app_id
+        assert [event['type'] for event in payload['events']] == ['user.created'] * 3
+        assert [event['user']['id'] for event in payload['events']] == user_ids
+    # One POST per app, not one per event
+    wait_until_idle()
+    assert len(receiver.received('/first')) == len(receiver.received('/second')) == 1
+
+
+def test_server_errors_are_retried_with_backoff(app, client, monkeypatch, receiver, subscribe):
+    monkeypatch.setitem(app.config, 'WEBHOOK_RETRY_BASE_DELAY', 0.4)
+    client.get('/api/auth/health')
+    receiver.statuses['/flaky'] = [503, 500]
+    subscribe(f'{receiver.url}/flaky')
+    create_users(app, 1)
+
+    attempts = receiver.wait_for('/flaky', 3)
+    assert len(attempts) == 3
+    # The same delivery, sent again after a randomized, doubling delay (0.5x to 1.5x)
+    assert len({headers['X-Hub-Delivery'] for _, headers, _, _ in attempts}) == 1
+    assert len({body for _, _, body, _ in attempts}) == 1
+    assert attempts[1][3] - attempts[0][3] >= 0.4 * 0.5
+    assert attempts[2][3] - attempts[1][3] >= 0.8 * 0.5
+    wait_until_idle()
+    assert len(receiver.received('/flaky')) == 3
+
+
+def test_client_errors_are_dropped(app, client, monkeypatch, receiver, subscribe):
+    monkeypatch.setitem(app.config, 'WEBHOOK_RETRY_BASE_DELAY', 0.1)
+    client.get('/api/auth/health')
+    receiver.statuses['/gone'] = [410, 410]
+    subscribe(f'{receiver.url}/gone')
+    create_users(app, 1)
+
+    assert len(receiver.wait_for('/gone', 1)) == 1
+    wait_until_idle()
+    # Well past the first retry's delay
+    time.sleep(0.5)
+    assert len(receiver.received('/gone')) == 1
+
+
+def test_non_public_addresses_are_refused(receiver):
+    session = requests.Session()
+    session.mount('http://', PublicOnlyAdapter())
+    for url in (f'{receiver.url}/blocked', f'http://localhost:{receiver.server.server_port}/blocked',
+                'http://169.254.169.254/latest/meta-data', 'http://10.0.0.1/', 'http://[::1]/'):
+        with pytest.raises(BlockedAddress):
+            session.post(url, data=b'{}', timeout=1)
+    assert receiver.received('/blocked') == []
+
+
+def test_webhook_url_must_be_https(app, client, make_user, login, subscribe):
+    _, email = make_user(role='admin')
+    headers = {'Authorization': f"Bearer {login(email)['access_token']}"}
+    app_id, _ = subscribe(None)
+
+    response = client.put(f'/api/admin/apps/{app_id}/webhook', headers=headers,
+                          json={'webhook_url': 'http://hooks.example.com/identity'})
+    assert response.status_code == 400
+    assert response.json['details'] == {'webhook_url': ['Must be an https URL.']}
+
+    response = client.put(f'/api/admin/apps/{app_id}/webhook', headers=headers,
+                          json={'webhook_url': 'https://hooks.example.com/identity'})
+    assert response.status_code == 200, response.json